@@ -0,0 +1,160 @@
+"""Unit tests for the winnan/budget.py module."""
+
+from __future__ import absolute_import
+
+import errno
+import gc
+import os
+import sys
+import threading
+import time
+import unittest
+import warnings
+
+import test.support
+
+from tests.context import winnan
+import winnan.budget
+
+
+class TestFdBudget(unittest.TestCase):
+    """Unit tests for the winnan.FdBudget class."""
+
+    def setUp(self):
+        self.addCleanup(winnan.budget.uninstall)
+        self.addCleanup(test.support.unlink, test.support.TESTFN)
+
+        with open(test.support.TESTFN, "wb") as fileobj:
+            fileobj.write(b"data")
+
+    def test_counts_file_objects(self):  # pylint: disable=missing-docstring
+        budget = winnan.budget.install(winnan.FdBudget(limit=4, policy=winnan.budget.FAIL))
+
+        for (mode, buffering) in (("rb", 0), ("rb", -1), ("r", -1)):
+            fileobj = winnan.open(test.support.TESTFN, mode, buffering=buffering)
+            self.assertEqual(1, budget.in_use)
+            fileobj.close()
+            self.assertEqual(0, budget.in_use)
+
+        stats = winnan.budget.stats()
+        self.assertEqual(4, stats.limit)
+        self.assertEqual(1, stats.peak)
+
+    @unittest.skipIf(sys.version_info < (3, 4), "requires ResourceWarning on garbage collection")
+    def test_leaked_file_warns(self):  # pylint: disable=missing-docstring
+        budget = winnan.budget.install(winnan.FdBudget(limit=4))
+
+        for kwargs in ({"buffering": 0}, {}, {"buffer_pool": True}):
+            fileobj = winnan.open(test.support.TESTFN, "rb", **kwargs)
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter("always", ResourceWarning)
+                del fileobj
+                gc.collect()
+
+            self.assertEqual([ResourceWarning], [warning.category for warning in caught], kwargs)
+            self.assertEqual(0, budget.in_use)
+
+    def test_fail_policy(self):  # pylint: disable=missing-docstring
+        budget = winnan.budget.install(winnan.FdBudget(limit=2, policy=winnan.budget.FAIL))
+
+        with winnan.open(test.support.TESTFN, "rb"), winnan.open(test.support.TESTFN, "rb"):
+            with self.assertRaises(OSError) as ctx:
+                winnan.open(test.support.TESTFN, "rb")
+
+            self.assertEqual(errno.EMFILE, ctx.exception.errno)
+
+        self.assertEqual(0, budget.in_use)
+        self.assertEqual(1, budget.stats().rejected)
+
+        # The slots are available again once the files are closed.
+        winnan.open(test.support.TESTFN, "rb").close()
+
+    def test_failed_open_releases_slot(self):  # pylint: disable=missing-docstring
+        budget = winnan.budget.install(winnan.FdBudget(limit=1, policy=winnan.budget.FAIL))
+
+        with self.assertRaises(OSError):
+            winnan.open(test.support.TESTFN + ".missing", "rb")
+
+        self.assertEqual(0, budget.in_use)
+        winnan.open(test.support.TESTFN, "rb").close()
+
+    def test_timeout_policy(self):  # pylint: disable=missing-docstring
+        winnan.budget.install(winnan.FdBudget(limit=1, policy=winnan.budget.TIMEOUT, timeout=0.05))
+
+        with winnan.open(test.support.TESTFN, "rb"):
+            start = time.time()
+            with self.assertRaises(OSError) as ctx:
+                winnan.open(test.support.TESTFN, "rb")
+
+            self.assertEqual(errno.EMFILE, ctx.exception.errno)
+            self.assertGreaterEqual(time.time() - start, 0.04)
+
+    def test_block_policy(self):  # pylint: disable=missing-docstring
+        budget = winnan.budget.install(winnan.FdBudget(limit=1))
+        opened = threading.Event()
+
+        def open_second():  # pylint: disable=missing-docstring
+            with winnan.open(test.support.TESTFN, "rb"):
+                opened.set()
+
+        first = winnan.open(test.support.TESTFN, "rb")
+        thread = threading.Thread(target=open_second)
+        thread.start()
+
+        deadline = time.time() + 5
+        while budget.stats().waiting != 1 and time.time() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(1, budget.stats().waiting)
+        self.assertFalse(opened.is_set())
+
+        first.close()
+        thread.join(5)
+        self.assertTrue(opened.is_set())
+        self.assertEqual(0, budget.in_use)
+
+    def test_os_shim_close(self):  # pylint: disable=missing-docstring
+        budget = winnan.budget.install(winnan.FdBudget(limit=1, policy=winnan.budget.FAIL))
+
+        fd = winnan.os_open(test.support.TESTFN, os.O_RDONLY)  # pylint: disable=invalid-name
+        self.assertEqual(1, budget.in_use)
+        winnan.os_shim.close(fd)
+        self.assertEqual(0, budget.in_use)
+
+    def test_reconcile(self):  # pylint: disable=missing-docstring
+        budget = winnan.budget.install(winnan.FdBudget(limit=1, policy=winnan.budget.FAIL))
+
+        fd = winnan.os_open(test.support.TESTFN, os.O_RDONLY)  # pylint: disable=invalid-name
+        os.close(fd)
+        self.assertEqual(1, budget.in_use)
+        self.assertEqual(1, budget.reconcile())
+        self.assertEqual(0, budget.in_use)
+
+    def test_default_limit(self):  # pylint: disable=missing-docstring
+        if winnan.budget.resource is None:
+            with self.assertRaises(ValueError):
+                winnan.FdBudget()
+            return
+
+        soft = winnan.budget.resource.getrlimit(winnan.budget.resource.RLIMIT_NOFILE)[0]
+        if soft != winnan.budget.resource.RLIM_INFINITY:
+            self.assertEqual(int(soft * 0.9), winnan.FdBudget().limit)
+
+    def test_invalid_arguments(self):  # pylint: disable=missing-docstring
+        with self.assertRaises(ValueError):
+            winnan.FdBudget(limit=1, policy="drop")
+
+        with self.assertRaises(ValueError):
+            winnan.FdBudget(limit=1, policy=winnan.budget.TIMEOUT)
+
+    def test_uninstall(self):  # pylint: disable=missing-docstring
+        budget = winnan.budget.install(winnan.FdBudget(limit=1, policy=winnan.budget.FAIL))
+        winnan.budget.uninstall()
+        self.assertIsNone(winnan.budget.stats())
+
+        with winnan.open(test.support.TESTFN, "rb"), winnan.open(test.support.TESTFN, "rb"):
+            self.assertEqual(0, budget.in_use)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,223 @@
+"""Unit tests for the winnan/bufferpool.py module."""
+
+from __future__ import absolute_import
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from tests.context import winnan
+import winnan.bufferpool
+
+_DATA = b"".join(("line %d of the test data\n" % i).encode("ascii") for i in range(10000))
+
+
+class BufferPoolTestCase(unittest.TestCase):
+    """Unit tests for the BufferPool class."""
+
+    def test_reuse(self):  # pylint: disable=missing-docstring
+        pool = winnan.BufferPool()
+        buf = pool.acquire(5000)
+        self.assertEqual(8192, len(buf))
+        pool.release(buf)
+        self.assertIs(buf, pool.acquire(6000))
+
+        stats = pool.stats()
+        self.assertEqual((None, 8192, 8192, 0, 1, 1, 0), stats)
+
+    def test_limit(self):  # pylint: disable=missing-docstring
+        pool = winnan.BufferPool(limit=3 * 4096)
+        buffers = [pool.acquire(4096) for _ in range(3)]
+        self.assertIsNone(pool.acquire(4096))
+        self.assertEqual(1, pool.stats().rejected)
+
+        for buf in buffers:
+            pool.release(buf)
+        self.assertEqual(3 * 4096, pool.stats().cached)
+
+        # Cached buffers of another size class are dropped to stay within the limit.
+        self.assertEqual(8192, len(pool.acquire(8192)))
+        stats = pool.stats()
+        self.assertEqual(8192, stats.in_use)
+        self.assertLessEqual(stats.in_use + stats.cached, pool.limit)
+
+    def test_max_cached(self):  # pylint: disable=missing-docstring
+        pool = winnan.BufferPool(max_cached=4096)
+        buffers = [pool.acquire(4096) for _ in range(2)]
+        for buf in buffers:
+            pool.release(buf)
+        self.assertEqual(4096, pool.stats().cached)
+
+        pool.trim()
+        self.assertEqual(0, pool.stats().cached)
+
+    def test_large_buffers_not_cached(self):  # pylint: disable=missing-docstring
+        pool = winnan.BufferPool()
+        size = winnan.bufferpool.MAX_POOLED_SIZE + 1
+        buf = pool.acquire(size)
+        self.assertEqual(size, len(buf))
+        pool.release(buf)
+        self.assertEqual((0, 0), (pool.stats().in_use, pool.stats().cached))
+
+
+class PooledFileTestCase(unittest.TestCase):
+    """Unit tests for winnan.open() with the 'buffer_pool' argument."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.path = os.path.join(self.root, "file")
+        self.pool = winnan.BufferPool()
+
+        with open(self.path, "wb") as fileobj:
+            fileobj.write(_DATA)
+
+    def open(self, mode="rb", **kwargs):  # pylint: disable=missing-docstring
+        kwargs.setdefault("buffering", 4096)
+        return winnan.open(self.path, mode, buffer_pool=self.pool, **kwargs)
+
+    def test_read(self):  # pylint: disable=missing-docstring
+        with self.open() as fileobj:
+            self.assertIsInstance(fileobj, winnan.bufferpool.PooledBufferedReader)
+            self.assertEqual(_DATA[:10], fileobj.read(10))
+            self.assertEqual(4096, self.pool.stats().in_use)
+            self.assertEqual(_DATA[10:10000], fileobj.read(9990))
+            self.assertEqual(_DATA[10000:], fileobj.read())
+            self.assertEqual(b"", fileobj.read(10))
+
+        self.assertEqual(0, self.pool.stats().in_use)
+
+    def test_readinto(self):  # pylint: disable=missing-docstring
+        with self.open() as fileobj:
+            buf = bytearray(100)
+            self.assertEqual(100, fileobj.readinto(buf))
+            self.assertEqual(_DATA[:100], bytes(buf))
+
+            buf = bytearray(len(_DATA))
+            self.assertEqual(len(_DATA) - 100, fileobj.readinto(buf))
+            self.assertEqual(_DATA[100:], bytes(buf[:len(_DATA) - 100]))
+
+    def test_read1_and_peek(self):  # pylint: disable=missing-docstring
+        with self.open() as fileobj:
+            self.assertEqual(_DATA[:4096], fileobj.peek())
+            self.assertEqual(_DATA[:10], fileobj.read1(10))
+            self.assertEqual(_DATA[10:4096], fileobj.read1(10000))
+
+    def test_readline(self):  # pylint: disable=missing-docstring
+        with self.open() as fileobj:
+            self.assertEqual(_DATA.splitlines(True), list(fileobj))
+
+        with self.open() as fileobj:
+            self.assertEqual(_DATA[:5], fileobj.readline(5))
+
+    def test_text(self):  # pylint: disable=missing-docstring
+        with self.open("r") as fileobj:
+            self.assertEqual(_DATA.decode("ascii"), fileobj.read())
+
+        with self.open("w") as fileobj:
+            fileobj.write(u"text\n")
+        with open(self.path, "rb") as fileobj:
+            self.assertEqual(b"text\n", fileobj.read())
+
+    def test_seek_and_tell(self):  # pylint: disable=missing-docstring
+        with self.open() as fileobj:
+            fileobj.read(10)
+            self.assertEqual(10, fileobj.tell())
+            self.assertEqual(15, fileobj.seek(5, io.SEEK_CUR))
+            self.assertEqual(_DATA[15:20], fileobj.read(5))
+            fileobj.seek(-5, io.SEEK_END)
+            self.assertEqual(_DATA[-5:], fileobj.read())
+
+    def test_flush_releases_reader_buffer(self):  # pylint: disable=missing-docstring
+        with self.open() as fileobj:
+            self.assertEqual(_DATA[:10], fileobj.read(10))
+            fileobj.flush()
+            self.assertEqual(0, self.pool.stats().in_use)
+            self.assertEqual(10, fileobj.tell())
+            self.assertEqual(_DATA[10:20], fileobj.read(10))
+
+    def test_write(self):  # pylint: disable=missing-docstring
+        with self.open("wb") as fileobj:
+            self.assertIsInstance(fileobj, winnan.bufferpool.PooledBufferedWriter)
+            self.assertEqual(0, self.pool.stats().in_use)
+            fileobj.write(_DATA[:10])
+            self.assertEqual(4096, self.pool.stats().in_use)
+            self.assertEqual(10, fileobj.tell())
+            fileobj.flush()
+            self.assertEqual(0, self.pool.stats().in_use)
+
+            fileobj.write(_DATA[10:5000])
+            fileobj.write(_DATA[5000:])
+
+        self.assertEqual(0, self.pool.stats().in_use)
+        with open(self.path, "rb") as fileobj:
+            self.assertEqual(_DATA, fileobj.read())
+
+    def test_append(self):  # pylint: disable=missing-docstring
+        with self.open("ab") as fileobj:
+            fileobj.write(b"end\n")
+            self.assertEqual(len(_DATA) + 4, fileobj.tell())
+
+        with open(self.path, "rb") as fileobj:
+            self.assertEqual(_DATA + b"end\n", fileobj.read())
+
+    def test_idle_files_hold_no_buffers(self):  # pylint: disable=missing-docstring
+        files = []
+        try:
+            for _ in range(20):
+                fileobj = self.open()
+                files.append(fileobj)
+                self.assertEqual(len(_DATA.splitlines()), len(fileobj.readlines()))
+            self.assertEqual(0, self.pool.stats().in_use)
+            self.assertEqual(4096, self.pool.stats().peak)
+        finally:
+            for fileobj in files:
+                fileobj.close()
+
+    def test_limit_falls_back_to_unbuffered(self):  # pylint: disable=missing-docstring
+        self.pool.limit = 0
+        with self.open("wb") as fileobj:
+            fileobj.write(_DATA[:10])
+            fileobj.write(_DATA[10:])
+        with self.open() as fileobj:
+            self.assertEqual(_DATA[:10], fileobj.read(10))
+            self.assertEqual(_DATA[10:].splitlines(True), fileobj.readlines())
+
+        self.assertEqual(0, self.pool.stats().peak)
+        self.assertGreater(self.pool.stats().rejected, 0)
+
+    def test_limit_reclaims_oldest_buffers(self):  # pylint: disable=missing-docstring
+        self.pool.limit = 2 * 4096
+        writer = winnan.open(os.path.join(self.root, "other"), "wb", buffering=4096,
+                             buffer_pool=self.pool)
+        self.addCleanup(writer.close)
+        writer.write(b"pending")
+
+        readers = [self.open() for _ in range(3)]
+        for reader in readers:
+            self.addCleanup(reader.close)
+            self.assertEqual(_DATA[:10], reader.read(10))
+
+        stats = self.pool.stats()
+        self.assertEqual((8192, 0), (stats.in_use, stats.rejected))
+
+        # The writer was flushed and the first reader rewound so the last two could borrow buffers.
+        with open(os.path.join(self.root, "other"), "rb") as fileobj:
+            self.assertEqual(b"pending", fileobj.read())
+        self.assertEqual(10, readers[0].tell())
+        self.assertEqual(_DATA[10:20], readers[0].read(10))
+
+    def test_default_pool(self):  # pylint: disable=missing-docstring
+        with winnan.open(self.path, "rb", buffer_pool=True) as fileobj:
+            self.assertEqual(_DATA[:10], fileobj.read(10))
+            self.assertGreater(winnan.bufferpool.stats().in_use, 0)
+
+    def test_read_write_mode_rejected(self):  # pylint: disable=missing-docstring
+        with self.assertRaises(ValueError):
+            self.open("r+b")
+
+
+if __name__ == "__main__":
+    unittest.main()
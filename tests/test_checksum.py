@@ -0,0 +1,127 @@
+"""Unit tests for the winnan/checksum.py module."""
+
+from __future__ import absolute_import
+
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+import zlib
+
+from tests.context import winnan
+import winnan.checksum
+
+_DATA = b"".join(("line %d of the test data\n" % i).encode("ascii") for i in range(50000))
+
+
+class ChecksumTestCase(unittest.TestCase):
+    """Unit tests for winnan.open() with the 'checksum' argument."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.path = os.path.join(self.root, "file")
+
+    def write_file(self, data=_DATA):  # pylint: disable=missing-docstring
+        with open(self.path, "wb") as fileobj:
+            fileobj.write(data)
+
+    def test_write(self):  # pylint: disable=missing-docstring
+        for (name, expected) in (("sha256", hashlib.sha256(_DATA).hexdigest()),
+                                 ("crc32", "%08x" % (zlib.crc32(_DATA) & 0xffffffff, )),
+                                 ("adler32", "%08x" % (zlib.adler32(_DATA) & 0xffffffff, ))):
+            with winnan.open(self.path, "wb", checksum=name) as fileobj:
+                fileobj.write(_DATA[:1000])
+                fileobj.write(_DATA[1000:])
+
+            self.assertEqual(expected, fileobj.checksum.hexdigest(), name)
+            with open(self.path, "rb") as fileobj:
+                self.assertEqual(_DATA, fileobj.read())
+
+    def test_write_text(self):  # pylint: disable=missing-docstring
+        with winnan.open(self.path, "w", encoding="utf-8", checksum="md5") as fileobj:
+            fileobj.write(u"caf\u00e9\n")
+
+        self.assertEqual(hashlib.md5(u"caf\u00e9\n".encode("utf-8")).hexdigest(),
+                         fileobj.checksum.hexdigest())
+
+    def test_read(self):  # pylint: disable=missing-docstring
+        self.write_file()
+        with winnan.open(self.path, "rb", checksum="SHA256") as fileobj:
+            self.assertEqual(_DATA, fileobj.read())
+            self.assertEqual(hashlib.sha256(_DATA).digest(), fileobj.checksum.digest())
+
+    def test_read_unbuffered(self):  # pylint: disable=missing-docstring
+        self.write_file()
+        with winnan.open(self.path, "rb", buffering=0, checksum="crc32") as fileobj:
+            buf = bytearray(len(_DATA) + 1)
+            self.assertEqual(len(_DATA), fileobj.readinto(buf))
+            self.assertEqual(zlib.crc32(_DATA) & 0xffffffff, fileobj.checksum.value)
+
+    def test_verify(self):  # pylint: disable=missing-docstring
+        self.write_file()
+        expected = hashlib.sha256(_DATA).hexdigest()
+        with winnan.open(self.path, "r", checksum="sha256",
+                         expected_checksum=expected.upper()) as fileobj:
+            self.assertEqual(50000, len(fileobj.readlines()))
+
+    def test_verify_mismatch(self):  # pylint: disable=missing-docstring
+        self.write_file(_DATA[:-1] + b"?")
+        expected = hashlib.sha256(_DATA).hexdigest()
+        with winnan.open(self.path, "rb", checksum="sha256",
+                         expected_checksum=expected) as fileobj:
+            with self.assertRaises(IOError):
+                fileobj.read()
+
+    def test_verify_only_at_end(self):  # pylint: disable=missing-docstring
+        self.write_file()
+        with winnan.open(self.path, "rb", checksum="crc32",
+                         expected_checksum="00000000") as fileobj:
+            self.assertEqual(_DATA[:100], fileobj.read(100))
+
+    def test_compressed(self):  # pylint: disable=missing-docstring
+        path = self.path + ".gz"
+        with winnan.open(path, "wb", compression="gzip", checksum="sha1") as fileobj:
+            fileobj.write(_DATA)
+
+        with open(path, "rb") as raw:
+            expected = hashlib.sha1(raw.read()).hexdigest()
+        self.assertEqual(expected, fileobj.checksum.hexdigest())
+
+        with winnan.open(path, "rb", compression="gzip", checksum="sha1",
+                         expected_checksum=expected) as fileobj:
+            self.assertEqual(_DATA, fileobj.read())
+
+        with gzip.open(path, "rb") as fileobj:
+            self.assertEqual(_DATA, fileobj.read())
+
+    def test_not_seekable(self):  # pylint: disable=missing-docstring
+        self.write_file()
+        with winnan.open(self.path, "rb", checksum="crc32") as fileobj:
+            self.assertFalse(fileobj.seekable())
+
+    def test_invalid_arguments(self):  # pylint: disable=missing-docstring
+        with self.assertRaises(ValueError):
+            winnan.open(self.path, "wb", checksum="no-such-checksum")
+        with self.assertRaises(ValueError):
+            winnan.open(self.path, "wb", checksum="crc32", expected_checksum="00000000")
+        with self.assertRaises(ValueError):
+            winnan.open(self.path, "rb", expected_checksum="00000000")
+        with self.assertRaises(ValueError):
+            winnan.open(self.path, "w+b", checksum="crc32")
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_zlib_checksum_copy(self):  # pylint: disable=missing-docstring
+        checksum = winnan.checksum.new("crc32")
+        checksum.update(b"abc")
+        copy = checksum.copy()
+        checksum.update(b"def")
+        self.assertEqual(zlib.crc32(b"abc") & 0xffffffff, copy.value)
+        self.assertEqual(zlib.crc32(b"abcdef") & 0xffffffff, checksum.value)
+        self.assertEqual(4, len(checksum.digest()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+"""Unit tests for the winnan/closer.py module."""
+
+from __future__ import absolute_import
+
+import io
+import os
+import sys
+import threading
+import unittest
+
+import test.support
+
+from tests.context import winnan
+import winnan.closer
+
+
+class TestDeferredCloser(unittest.TestCase):
+    """Unit tests for the winnan.DeferredCloser class."""
+
+    def setUp(self):
+        self.closer = winnan.DeferredCloser(max_in_flight=2)
+        self.addCleanup(self.closer.shutdown)
+        self.addCleanup(test.support.unlink, test.support.TESTFN)
+
+    def assert_closed(self, fd):  # pylint: disable=invalid-name,missing-docstring
+        with self.assertRaises(OSError):
+            os.fstat(fd)
+
+    def test_close_async(self):  # pylint: disable=missing-docstring
+        for (mode, buffering) in (("wb", 0), ("wb", -1), ("w", -1), ("w+", 1)):
+            fileobj = winnan.open(test.support.TESTFN, mode, buffering=buffering,
+                                  close_async=self.closer)
+            self.assertEqual(test.support.TESTFN, fileobj.name)
+            fd = fileobj.fileno()  # pylint: disable=invalid-name
+
+            fileobj.write(b"data" if "b" in mode else u"data")
+            fileobj.close()
+            self.assertTrue(fileobj.closed)
+            self.assertTrue(self.closer.drain(timeout=5))
+            self.assert_closed(fd)
+
+            with open(test.support.TESTFN, "rb") as check:
+                self.assertEqual(b"data", check.read())
+
+    def test_default_closer(self):  # pylint: disable=missing-docstring
+        with winnan.open(test.support.TESTFN, "w", close_async=True) as fileobj:
+            self.assertIsInstance(fileobj, io.TextIOWrapper)
+            fd = fileobj.fileno()  # pylint: disable=invalid-name
+
+            if sys.version_info >= (3, 4):
+                self.assertFalse(os.get_inheritable(fd))  # pylint: disable=no-member
+
+        self.assertTrue(winnan.closer.default_closer().drain(timeout=5))
+        self.assert_closed(fd)
+
+    def test_in_flight_limit(self):  # pylint: disable=missing-docstring
+        gate = threading.Event()
+        real_close = os.close
+
+        def slow_close(fd):  # pylint: disable=invalid-name,missing-docstring
+            gate.wait()
+            real_close(fd)
+
+        fds = [os.open(os.devnull, os.O_RDONLY) for _ in range(3)]
+        os.close = slow_close
+        try:
+            self.closer.submit(fds[0])
+            self.closer.submit(fds[1])
+
+            thread = threading.Thread(target=self.closer.submit, args=(fds[2], ))
+            thread.start()
+            thread.join(0.1)
+            self.assertTrue(thread.is_alive())
+            self.assertFalse(self.closer.drain(timeout=0.01))
+        finally:
+            gate.set()
+            thread.join()
+            self.closer.drain()
+            os.close = real_close
+
+        self.assertEqual(3, self.closer.closed_count)
+        for fd in fds:  # pylint: disable=invalid-name
+            self.assert_closed(fd)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork()")
+    def test_fork(self):  # pylint: disable=missing-docstring
+        gate = threading.Event()
+        parent = os.getpid()
+        real_close = os.close
+
+        def slow_close(fd):  # pylint: disable=invalid-name,missing-docstring
+            if os.getpid() == parent:
+                gate.wait()
+            real_close(fd)
+
+        fds = [os.open(os.devnull, os.O_RDONLY) for _ in range(2)]
+        os.close = slow_close
+        try:
+            # The first file descriptor is being closed and the second one is queued when forking.
+            self.closer.submit(fds[0])
+            self.closer.submit(fds[1])
+
+            pid = os.fork()
+            if pid == 0:
+                status = 1
+                try:
+                    other = os.open(os.devnull, os.O_RDONLY)
+                    self.closer.submit(other)
+                    if self.closer.drain(timeout=5):
+                        status = 0
+                        for fd in (fds[1], other):  # pylint: disable=invalid-name
+                            try:
+                                os.fstat(fd)
+                                status = 2
+                            except OSError:
+                                pass
+                finally:
+                    os._exit(status)  # pylint: disable=protected-access
+
+            (_, status) = os.waitpid(pid, 0)
+            self.assertEqual(0, os.WEXITSTATUS(status))
+        finally:
+            gate.set()
+            self.closer.drain()
+            os.close = real_close
+
+        for fd in fds:  # pylint: disable=invalid-name
+            self.assert_closed(fd)
+
+    def test_rejects_closefd_false(self):  # pylint: disable=missing-docstring
+        with open(test.support.TESTFN, "w") as fileobj:
+            with self.assertRaises(ValueError):
+                winnan.open(fileobj.fileno(), "w", closefd=False, close_async=True)
@@ -0,0 +1,197 @@
+"""Unit tests for the winnan/compression.py module."""
+
+from __future__ import absolute_import
+
+import bz2
+import gzip
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+try:
+    import lzma
+except ImportError:
+    lzma = None  # pylint: disable=invalid-name
+
+from tests.context import winnan
+import winnan.compression
+
+_DATA = b"".join(("line %d of the test data\n" % i).encode("ascii") for i in range(50000))
+
+
+class CompressionTestCase(unittest.TestCase):
+    """Unit tests for winnan.open() with the 'compression' argument."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def formats(self):  # pylint: disable=missing-docstring
+        formats = [("gzip", ".gz", gzip.open), ("bz2", ".bz2", bz2.BZ2File)]
+        if lzma is not None:
+            formats.append(("xz", ".xz", lzma.open))
+        return formats
+
+    def test_write_readable_by_stdlib(self):  # pylint: disable=missing-docstring
+        for (kind, ext, stdlib_open) in self.formats():
+            path = os.path.join(self.root, "file" + ext)
+            with winnan.open(path, "wb", compression=kind) as fileobj:
+                fileobj.write(_DATA[:1000])
+                fileobj.write(_DATA[1000:])
+
+            with stdlib_open(path, "rb") as fileobj:
+                self.assertEqual(_DATA, fileobj.read(), kind)
+
+    def test_read_written_by_stdlib(self):  # pylint: disable=missing-docstring
+        for (kind, ext, stdlib_open) in self.formats():
+            path = os.path.join(self.root, "file" + ext)
+            with stdlib_open(path, "wb") as fileobj:
+                fileobj.write(_DATA)
+
+            with winnan.open(path, "rb", compression=kind) as fileobj:
+                self.assertEqual(_DATA, fileobj.read(), kind)
+
+    def test_multiple_blocks(self):  # pylint: disable=missing-docstring
+        for (kind, ext, stdlib_open) in self.formats():
+            path = os.path.join(self.root, "file" + ext)
+            raw = winnan.open(path, "wb", buffering=0)
+            with winnan.compression.CompressingWriter(raw, kind, level=1,
+                                                      block_size=4096) as fileobj:
+                fileobj.write(_DATA)
+
+            with stdlib_open(path, "rb") as fileobj:
+                self.assertEqual(_DATA, fileobj.read(), kind)
+
+            with winnan.open(path, "rb", compression=kind) as fileobj:
+                self.assertEqual(_DATA, fileobj.read(), kind)
+
+    def test_empty_file(self):  # pylint: disable=missing-docstring
+        for (kind, ext, stdlib_open) in self.formats():
+            path = os.path.join(self.root, "file" + ext)
+            winnan.open(path, "wb", compression=kind).close()
+
+            with stdlib_open(path, "rb") as fileobj:
+                self.assertEqual(b"", fileobj.read(), kind)
+
+            with winnan.open(path, "rb", compression=kind) as fileobj:
+                self.assertEqual(b"", fileobj.read(), kind)
+
+    def test_append(self):  # pylint: disable=missing-docstring
+        for (kind, ext, _) in self.formats():
+            path = os.path.join(self.root, "file" + ext)
+            with winnan.open(path, "wb", compression=kind) as fileobj:
+                fileobj.write(b"first\n")
+            with winnan.open(path, "ab", compression=kind) as fileobj:
+                fileobj.write(b"second\n")
+
+            with winnan.open(path, "rb", compression=kind) as fileobj:
+                self.assertEqual(b"first\nsecond\n", fileobj.read(), kind)
+
+    def test_auto(self):  # pylint: disable=missing-docstring
+        for (_, ext, stdlib_open) in self.formats():
+            path = os.path.join(self.root, "file" + ext)
+            with winnan.open(path, "w", compression="auto") as fileobj:
+                fileobj.write(u"text\n")
+
+            with stdlib_open(path, "rb") as fileobj:
+                self.assertEqual(b"text\n", fileobj.read().replace(b"\r\n", b"\n"))
+
+            with winnan.open(path, "r", compression="auto") as fileobj:
+                self.assertEqual(u"text\n", fileobj.read())
+
+        plain = os.path.join(self.root, "plain.txt")
+        with open(plain, "wb") as fileobj:
+            fileobj.write(_DATA)
+
+        with winnan.open(plain, "rb", compression="auto") as fileobj:
+            self.assertEqual(_DATA, fileobj.read())
+
+        with self.assertRaises(ValueError):
+            winnan.open(os.path.join(self.root, "unknown.bin"), "wb", compression="auto")
+
+    def test_readline(self):  # pylint: disable=missing-docstring
+        path = os.path.join(self.root, "file.gz")
+        with gzip.open(path, "wb") as fileobj:
+            fileobj.write(_DATA)
+
+        with winnan.open(path, "rb", compression="gzip") as fileobj:
+            self.assertEqual(_DATA.splitlines(True), list(fileobj))
+
+    def test_truncated(self):  # pylint: disable=missing-docstring
+        path = os.path.join(self.root, "file.gz")
+        with gzip.open(path, "wb") as fileobj:
+            fileobj.write(_DATA)
+
+        with open(path, "r+b") as fileobj:
+            fileobj.truncate(os.path.getsize(path) // 2)
+
+        with winnan.open(path, "rb", compression="gzip") as fileobj:
+            with self.assertRaises(EOFError):
+                fileobj.read()
+
+    def test_gzip_zero_padding(self):  # pylint: disable=missing-docstring
+        path = os.path.join(self.root, "file.gz")
+        with gzip.open(path, "wb") as fileobj:
+            fileobj.write(_DATA[:1000])
+        with open(path, "ab") as fileobj:
+            fileobj.write(b"\0" * 16)
+        with gzip.open(path, "ab") as fileobj:
+            fileobj.write(_DATA[1000:])
+        with open(path, "ab") as fileobj:
+            fileobj.write(b"\0" * 16)
+
+        with winnan.open(path, "rb", compression="gzip") as fileobj:
+            self.assertEqual(_DATA, fileobj.read())
+
+    def test_bounded_chunks(self):  # pylint: disable=missing-docstring
+        data = b"\0" * (16 * 1024 * 1024)
+        for (kind, ext, stdlib_open) in self.formats():
+            path = os.path.join(self.root, "file" + ext)
+            with stdlib_open(path, "wb") as fileobj:
+                fileobj.write(data)
+
+            sizes = []
+            reader = winnan.compression.DecompressingReader(winnan.open(path, "rb"), kind)
+            put = reader._put  # pylint: disable=protected-access
+
+            def recording_put(item, put=put):  # pylint: disable=missing-docstring
+                if isinstance(item, bytes):
+                    sizes.append(len(item))
+                return put(item)
+
+            reader._put = recording_put  # pylint: disable=protected-access
+            with io.BufferedReader(reader) as fileobj:
+                self.assertEqual(len(data), len(fileobj.read()), kind)
+
+            if kind == "gzip" or sys.version_info >= (3, 5):
+                self.assertLessEqual(max(sizes), 1024 * 1024, kind)
+
+    def test_close_without_reading_everything(self):  # pylint: disable=missing-docstring
+        path = os.path.join(self.root, "file.gz")
+        with gzip.open(path, "wb") as fileobj:
+            fileobj.write(_DATA * 10)
+
+        with winnan.open(path, "rb", compression="gzip") as fileobj:
+            self.assertEqual(_DATA[:10], fileobj.read(10))
+
+    def test_invalid_arguments(self):  # pylint: disable=missing-docstring
+        path = os.path.join(self.root, "file.gz")
+        with self.assertRaises(ValueError):
+            winnan.open(path, "w+b", compression="gzip")
+
+        with self.assertRaises(ValueError):
+            winnan.open(path, "wb", compression="zip")
+        self.assertFalse(os.path.exists(path))
+
+    def test_detect(self):  # pylint: disable=missing-docstring
+        self.assertEqual("gzip", winnan.compression.detect(b"\x1f\x8b\x08"))
+        self.assertEqual("bz2", winnan.compression.detect(b"BZh9"))
+        self.assertEqual("xz", winnan.compression.detect(b"\xfd7zXZ\x00\x00"))
+        self.assertIsNone(winnan.compression.detect(b"plain"))
+
+
+if __name__ == "__main__":
+    unittest.main()
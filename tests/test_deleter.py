@@ -0,0 +1,150 @@
+"""Unit tests for the winnan/deleter.py module."""
+
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from tests.context import winnan
+import winnan.deleter
+
+
+class TestDeletionQueue(unittest.TestCase):
+    """Unit tests for the winnan.deleter.DeletionQueue class."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+        self.queue = winnan.deleter.DeletionQueue(batch_size=4, backoff=0.001)
+        self.addCleanup(self.queue.shutdown)
+
+    def make_files(self, count, subdir=""):
+        """Creates 'count' empty files and returns their paths."""
+        directory = os.path.join(self.root, subdir)
+        if not os.path.isdir(directory):
+            os.mkdir(directory)
+
+        paths = []
+        for i in range(count):
+            path = os.path.join(directory, "file%d" % (i, ))
+            with open(path, "w"):
+                pass
+            paths.append(path)
+
+        return paths
+
+    def test_deletes_in_batches(self):  # pylint: disable=missing-docstring
+        paths = self.make_files(10) + self.make_files(3, "sub")
+
+        for path in paths:
+            self.queue.schedule(path)
+
+        self.assertTrue(self.queue.flush(timeout=5))
+        self.assertEqual([], [path for path in paths if os.path.exists(path)])
+
+        stats = self.queue.stats()
+        self.assertEqual((0, 13, 0, 0), stats[:4])
+        self.assertGreater(stats.throughput, 0)
+
+    def test_deletes_open_files(self):  # pylint: disable=missing-docstring
+        (path, ) = self.make_files(1)
+
+        with winnan.open(path, "r"):
+            self.queue.schedule(path)
+            self.assertTrue(self.queue.flush(timeout=5))
+
+        self.assertFalse(os.path.exists(path))
+
+    def test_missing_and_failed(self):  # pylint: disable=missing-docstring
+        self.queue.schedule(os.path.join(self.root, "missing"))
+        os.mkdir(os.path.join(self.root, "directory"))
+        self.queue.schedule(os.path.join(self.root, "directory"))
+
+        self.assertTrue(self.queue.flush(timeout=5))
+        self.assertEqual((0, 1, 1), self.queue.stats()[:3])
+        self.assertIsInstance(self.queue.last_error, OSError)
+
+    def test_retries(self):  # pylint: disable=missing-docstring
+        (path, ) = self.make_files(1)
+        real_unlink = os.unlink
+        failures = []
+
+        def flaky_unlink(*args, **kwargs):  # pylint: disable=missing-docstring
+            if len(failures) < 2:
+                err = OSError(13, "Access is denied")
+                err.winerror = 5
+                failures.append(err)
+                raise err
+            return real_unlink(*args, **kwargs)
+
+        retry_winerrors = winnan.deleter._RETRY_WINERRORS  # pylint: disable=protected-access
+        winnan.deleter._RETRY_WINERRORS = frozenset([5])  # pylint: disable=protected-access
+        os.unlink = flaky_unlink
+        try:
+            self.queue.schedule(path)
+            self.assertTrue(self.queue.flush(timeout=5))
+        finally:
+            os.unlink = real_unlink
+            winnan.deleter._RETRY_WINERRORS = retry_winerrors  # pylint: disable=protected-access
+
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual((0, 1, 0, 2), self.queue.stats()[:4])
+
+    def test_relative_paths(self):  # pylint: disable=missing-docstring
+        (path, ) = self.make_files(1)
+        other = os.path.join(self.root, "other")
+        os.mkdir(other)
+        with open(os.path.join(other, "file0"), "w"):
+            pass
+
+        cwd = os.getcwd()
+        self.addCleanup(os.chdir, cwd)
+        os.chdir(self.root)
+        self.queue.schedule("file0")
+        os.chdir(other)
+        self.assertTrue(self.queue.flush(timeout=5))
+
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(os.path.exists(os.path.join(other, "file0")))
+
+    def test_throughput_window(self):  # pylint: disable=missing-docstring
+        for path in self.make_files(5):
+            self.queue.schedule(path)
+        self.assertTrue(self.queue.flush(timeout=5))
+        self.assertGreater(self.queue.stats().throughput, 0)
+
+        # The unlinks fall out of the window once the queue has been idle long enough.
+        window = winnan.deleter._THROUGHPUT_WINDOW  # pylint: disable=protected-access
+        self.addCleanup(setattr, winnan.deleter, "_THROUGHPUT_WINDOW", window)
+        winnan.deleter._THROUGHPUT_WINDOW = 0.001  # pylint: disable=protected-access
+        time.sleep(0.01)
+        self.assertEqual((5, 0.0), (self.queue.stats().deleted, self.queue.stats().throughput))
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork()")
+    def test_fork(self):  # pylint: disable=missing-docstring
+        (path, ) = self.make_files(1)
+        self.queue.schedule(self.make_files(1, "sub")[0])
+        self.assertTrue(self.queue.flush(timeout=5))
+
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                self.queue.schedule(path)
+                if self.queue.flush(timeout=5) and not os.path.exists(path):
+                    status = 0
+            finally:
+                os._exit(status)  # pylint: disable=protected-access
+
+        (_, status) = os.waitpid(pid, 0)
+        self.assertEqual(0, os.WEXITSTATUS(status))
+
+    def test_schedule_delete(self):  # pylint: disable=missing-docstring
+        (path, ) = self.make_files(1)
+        winnan.schedule_delete(path)
+        self.assertTrue(winnan.deleter.default_queue().flush(timeout=5))
+        self.assertFalse(os.path.exists(path))
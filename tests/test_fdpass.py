@@ -0,0 +1,142 @@
+"""Unit tests for the winnan/fdpass.py module."""
+
+from __future__ import absolute_import
+
+import os
+import pickle
+import shutil
+import socket
+import tempfile
+import unittest
+
+try:
+    import concurrent.futures
+except ImportError:
+    # The concurrent.futures module was added in Python 3.2.
+    concurrent = None  # pylint: disable=invalid-name
+
+from tests.context import winnan
+import winnan.fdpass
+
+_SUPPORTED = hasattr(socket.socket, "sendmsg") and hasattr(socket, "SCM_RIGHTS")
+
+
+def _read_shared(fileobj):
+    """Returns the remaining contents of the received 'fileobj' along with its name."""
+    with fileobj:
+        return (fileobj.name, fileobj.read())
+
+
+@unittest.skipUnless(_SUPPORTED, "requires socket.sendmsg() and SCM_RIGHTS")
+class FdPassTestCase(unittest.TestCase):
+    """Unit tests for the winnan.send_files() and winnan.recv_files() functions."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.path = os.path.join(self.root, "file")
+        with open(self.path, "wb") as fileobj:
+            fileobj.write(b"line one\nline two\n")
+
+        (self.sender, self.receiver) = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(self.sender.close)
+        self.addCleanup(self.receiver.close)
+
+    def transfer(self, fileobjs):  # pylint: disable=missing-docstring
+        winnan.send_files(self.sender, fileobjs)
+        received = winnan.recv_files(self.receiver)
+        for fileobj in received:
+            if isinstance(fileobj, int):
+                self.addCleanup(os.close, fileobj)
+            else:
+                self.addCleanup(fileobj.close)
+        return received
+
+    def test_binary(self):  # pylint: disable=missing-docstring
+        with winnan.open(self.path, "rb") as fileobj:
+            fileobj.readline()
+            (received, ) = self.transfer([fileobj])
+
+        self.assertEqual(self.path, received.name)
+        self.assertEqual("rb", received.mode)
+        self.assertEqual(9, received.tell())
+        self.assertEqual(b"line two\n", received.read())
+
+    def test_sender_keeps_reading(self):  # pylint: disable=missing-docstring
+        data = bytes(bytearray(i % 251 for i in range(64 * 1024)))
+        with open(self.path, "wb") as fileobj:
+            fileobj.write(data)
+
+        with winnan.open(self.path, "rb") as fileobj:
+            self.assertEqual(data[:1], fileobj.read(1))
+            (received, ) = self.transfer([fileobj])
+            self.assertEqual(1, received.tell())
+            self.assertEqual(data[1:], fileobj.read())
+
+    def test_text_and_unbuffered(self):  # pylint: disable=missing-docstring
+        with winnan.open(self.path, "r", encoding="ascii") as text:
+            with winnan.open(self.path, "rb", buffering=0) as raw:
+                (received_text, received_raw) = self.transfer([text, raw])
+
+        self.assertEqual("ascii", received_text.encoding)
+        self.assertEqual(u"line one\nline two\n", received_text.read())
+        self.assertIsInstance(received_raw, type(raw))
+
+    def test_flushes_writer(self):  # pylint: disable=missing-docstring
+        with winnan.open(self.path, "ab") as fileobj:
+            fileobj.write(b"line three\n")
+            (received, ) = self.transfer([fileobj])
+
+        received.write(b"line four\n")
+        received.flush()
+        with open(self.path, "rb") as fileobj:
+            self.assertEqual(b"line one\nline two\nline three\nline four\n", fileobj.read())
+
+    def test_file_descriptor(self):  # pylint: disable=missing-docstring
+        fd = os.open(self.path, os.O_RDONLY)  # pylint: disable=invalid-name
+        self.addCleanup(os.close, fd)
+        (received, ) = self.transfer([fd])
+        self.assertNotEqual(fd, received)
+        self.assertEqual(b"line", os.read(received, 4))
+
+    def test_not_inheritable(self):  # pylint: disable=missing-docstring
+        fd = os.open(self.path, os.O_RDONLY)  # pylint: disable=invalid-name
+        self.addCleanup(os.close, fd)
+        if hasattr(os, "set_inheritable"):
+            os.set_inheritable(fd, True)  # pylint: disable=no-member
+
+        (received, ) = self.transfer([fd])
+        if hasattr(os, "get_inheritable"):
+            self.assertFalse(os.get_inheritable(received))  # pylint: disable=no-member
+
+    def test_empty(self):  # pylint: disable=missing-docstring
+        self.assertEqual([], self.transfer([]))
+
+    def test_connection_closed(self):  # pylint: disable=missing-docstring
+        self.sender.close()
+        with self.assertRaises(EOFError):
+            winnan.recv_files(self.receiver)
+
+    def test_shared_file_in_process(self):  # pylint: disable=missing-docstring
+        with winnan.open(self.path, "rb") as fileobj:
+            data = pickle.dumps(winnan.fdpass.SharedFile(fileobj))
+        # The file descriptor was duplicated when pickling, so closing the file doesn't matter.
+        self.assertEqual((self.path, b"line one\nline two\n"), _read_shared(pickle.loads(data)))
+
+        # Each pickling can only be received once.
+        with self.assertRaises(OSError):
+            pickle.loads(data)
+
+    @unittest.skipIf(concurrent is None, "requires concurrent.futures")
+    def test_shared_file_process_pool(self):  # pylint: disable=missing-docstring
+        with winnan.open(self.path, "rb") as fileobj:
+            fileobj.readline()
+            shared = winnan.fdpass.SharedFile(fileobj)
+            with concurrent.futures.ProcessPoolExecutor(max_workers=1) as executor:
+                result = executor.submit(_read_shared, shared).result()
+
+        self.assertEqual((self.path, b"line two\n"), result)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,252 @@
+"""Unit tests for the winnan/handlepool.py module."""
+
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from tests.context import winnan
+import winnan.handlepool
+
+
+class HandlePoolTestCase(unittest.TestCase):
+    """Unit tests for the winnan.HandlePool class."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.path = os.path.join(self.root, "file")
+        with open(self.path, "wb") as fileobj:
+            fileobj.write(b"".join(b"line %d\n" % (i, ) for i in range(10)))
+
+    def make_pool(self, *args, **kwargs):  # pylint: disable=missing-docstring
+        pool = winnan.HandlePool(*args, **kwargs)
+        self.addCleanup(pool.close)
+        return pool
+
+    def fork_and_read(self, handle, size):
+        """Reads 'size' bytes from 'handle' in a child process and returns them."""
+        (read_fd, write_fd) = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.close(read_fd)
+                os.write(write_fd, handle.read(size))
+            finally:
+                os._exit(0)  # pylint: disable=protected-access
+
+        os.close(write_fd)
+        try:
+            with os.fdopen(read_fd, "rb") as pipe:
+                data = pipe.read()
+        finally:
+            os.waitpid(pid, 0)
+        return data
+
+    def test_get_shares_handles(self):  # pylint: disable=missing-docstring
+        pool = self.make_pool()
+        handle = pool.get(self.path)
+        self.assertIs(handle, pool.get(self.path))
+        self.assertIn(self.path, pool)
+        self.assertEqual(1, len(pool))
+        self.assertEqual(b"line 0\n", handle.readline())
+        self.assertEqual(b"line 1\n", next(iter(handle)))
+
+        handle.close()
+        self.assertNotIn(self.path, pool)
+        self.assertIsNot(handle, pool.get(self.path))
+
+    def test_text_mode(self):  # pylint: disable=missing-docstring
+        pool = self.make_pool("r", encoding="ascii")
+        self.assertEqual(u"line 0\n", pool.get(self.path).readline())
+
+    def test_missing_file(self):  # pylint: disable=missing-docstring
+        pool = self.make_pool()
+        with self.assertRaises(EnvironmentError):
+            pool.get(os.path.join(self.root, "missing"))
+
+    def test_invalid_arguments(self):  # pylint: disable=missing-docstring
+        with self.assertRaises(ValueError):
+            winnan.HandlePool(after_fork="share")
+        with self.assertRaises(ValueError):
+            winnan.HandlePool("ab", after_fork=winnan.handlepool.PREAD)
+
+    def test_pread_seek(self):  # pylint: disable=missing-docstring
+        pool = self.make_pool(after_fork=winnan.handlepool.PREAD)
+        handle = pool.get(self.path)
+        handle.seek(-7, os.SEEK_END)
+        self.assertEqual(b"line 9\n", handle.read())
+        handle.seek(7)
+        self.assertEqual(b"line 1\n", handle.readline())
+        self.assertEqual(14, handle.tell())
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork()")
+    def test_reopen_after_fork(self):  # pylint: disable=missing-docstring
+        pool = self.make_pool(buffering=0)
+        handle = pool.get(self.path)
+        self.assertEqual(b"line 0\n", handle.read(7))
+
+        # Without reopening, the child's read would move the position the parent reads from.
+        self.assertEqual(b"line 1\nline 2\n", self.fork_and_read(handle, 14))
+        self.assertEqual(b"line 1\n", handle.read(7))
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork()")
+    def test_reopen_buffered_after_fork(self):  # pylint: disable=missing-docstring
+        pool = self.make_pool()
+        handle = pool.get(self.path)
+        self.assertEqual(b"line 0\n", handle.readline())
+        self.assertEqual(b"line 1\n", self.fork_and_read(handle, 7))
+        self.assertEqual(b"line 1\n", handle.readline())
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork()")
+    def test_writer_flushed_before_fork(self):  # pylint: disable=missing-docstring
+        path = os.path.join(self.root, "log")
+        pool = self.make_pool("ab")
+        handle = pool.get(path)
+        handle.write(b"parent\n")
+
+        pid = os.fork()
+        if pid == 0:
+            try:
+                handle.write(b"child\n")
+                handle.flush()
+            finally:
+                os._exit(0)  # pylint: disable=protected-access
+        os.waitpid(pid, 0)
+
+        handle.flush()
+        with open(path, "rb") as fileobj:
+            self.assertEqual(b"parent\nchild\n", fileobj.read())
+
+    def write_in_child(self, handle, data):
+        """Writes 'data' to 'handle' in a child process."""
+        pid = os.fork()
+        if pid == 0:
+            try:
+                handle.write(data)
+                handle.flush()
+            finally:
+                os._exit(0)  # pylint: disable=protected-access
+        os.waitpid(pid, 0)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork()")
+    def test_writer_not_truncated_after_fork(self):  # pylint: disable=missing-docstring
+        for mode in ("wb", "xb"):
+            path = os.path.join(self.root, mode)
+            pool = self.make_pool(mode)
+            handle = pool.get(path)
+            handle.write(b"p" * 100)
+
+            self.write_in_child(handle, b"c")
+            handle.flush()
+            with open(path, "rb") as fileobj:
+                self.assertEqual(b"p" * 100 + b"c", fileobj.read())
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork()")
+    def test_read_write_after_fork(self):  # pylint: disable=missing-docstring
+        pool = self.make_pool("r+b")
+        handle = pool.get(self.path)
+        self.assertEqual(b"line 0\n", handle.readline())
+
+        # The child writes at the parent's position without moving it, and without truncating the
+        # file.
+        self.write_in_child(handle, b"LINE 1\n")
+        self.assertEqual(b"LINE 1\n" + b"".join(b"line %d\n" % (i, ) for i in range(2, 10)),
+                         handle.read())
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork()")
+    def test_unflushed_writer_after_fork(self):  # pylint: disable=missing-docstring
+        path = os.path.join(self.root, "log")
+        pool = self.make_pool("wb")
+        handle = pool.get(path)
+        handle.write(b"parent\n")
+
+        # The writer can't be flushed before forking while another thread holds the handle, so the
+        # child's copy of the buffer must be discarded rather than written a second time.
+        (locked, release) = (threading.Event(), threading.Event())
+
+        def hold_lock():
+            with handle._lock:  # pylint: disable=protected-access
+                locked.set()
+                release.wait()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        try:
+            locked.wait()
+            self.write_in_child(handle, b"child\n")
+        finally:
+            release.set()
+            thread.join()
+
+        handle.flush()
+        with open(path, "rb") as fileobj:
+            self.assertEqual(b"parent\nchild\n", fileobj.read())
+
+    def exit_status_in_child(self, func):
+        """Returns the exit status of a child process that calls func() and exits with 0 if it
+        returns, or with 1 if it raises EnvironmentError.
+        """
+        pid = os.fork()
+        if pid == 0:
+            status = 2
+            try:
+                func()
+                status = 0
+            except EnvironmentError:
+                status = 1
+            finally:
+                os._exit(status)  # pylint: disable=protected-access
+        return os.WEXITSTATUS(os.waitpid(pid, 0)[1])
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork()")
+    def test_append_not_created_after_fork(self):  # pylint: disable=missing-docstring
+        path = os.path.join(self.root, "log")
+        pool = self.make_pool("ab")
+        handle = pool.get(path)
+        handle.write(b"parent\n")
+        handle.flush()
+        os.unlink(path)
+
+        self.assertEqual(1, self.exit_status_in_child(lambda: handle.write(b"child\n")))
+        self.assertFalse(os.path.exists(path))
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork()")
+    def test_pool_locked_during_fork(self):  # pylint: disable=missing-docstring
+        pool = self.make_pool()
+        (locked, release) = (threading.Event(), threading.Event())
+
+        def hold_lock():
+            with pool._lock:  # pylint: disable=protected-access
+                locked.set()
+                release.wait()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        try:
+            locked.wait()
+            status = self.exit_status_in_child(lambda: pool.get(self.path).read())
+        finally:
+            release.set()
+            thread.join()
+
+        self.assertEqual(0, status)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork()")
+    def test_pread_after_fork(self):  # pylint: disable=missing-docstring
+        pool = self.make_pool(buffering=0, after_fork=winnan.handlepool.PREAD)
+        handle = pool.get(self.path)
+        fileobj = handle.file
+        self.assertEqual(b"line 0\n", handle.read(7))
+        self.assertEqual(b"line 1\nline 2\n", self.fork_and_read(handle, 14))
+        self.assertEqual(b"line 1\n", handle.read(7))
+
+        # The file is never reopened since its position isn't shared.
+        self.assertIs(fileobj, handle.file)
+
+
+if __name__ == "__main__":
+    unittest.main()
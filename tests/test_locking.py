@@ -0,0 +1,172 @@
+"""Unit tests for the winnan/locking.py module."""
+
+from __future__ import absolute_import
+
+import errno
+import os
+import shutil
+import tempfile
+import unittest
+
+from tests.context import winnan
+import winnan.locking
+
+
+class LockRangeTestCase(unittest.TestCase):
+    """Unit tests for the winnan.lock_range() function."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.path = os.path.join(self.root, "file")
+        with open(self.path, "wb") as fileobj:
+            fileobj.write(b"\0" * 100)
+
+    def open_file(self):  # pylint: disable=missing-docstring
+        fileobj = winnan.open(self.path, "r+b")
+        self.addCleanup(fileobj.close)
+        return fileobj
+
+    def try_lock_in_child(self, offset, length, shared=False):
+        """Returns whether a child process could lock the byte range without blocking."""
+        pid = os.fork()
+        if pid == 0:
+            status = 2
+            try:
+                with winnan.open(self.path, "r+b") as fileobj:
+                    try:
+                        winnan.lock_range(fileobj, offset, length, shared=shared,
+                                          blocking=False).release()
+                        status = 0
+                    except OSError as err:
+                        status = 1 if err.errno == errno.EAGAIN else 2
+            finally:
+                os._exit(status)  # pylint: disable=protected-access
+
+        (_, status) = os.waitpid(pid, 0)
+        self.assertIn(os.WEXITSTATUS(status), (0, 1))
+        return os.WEXITSTATUS(status) == 0
+
+    def test_context_manager(self):  # pylint: disable=missing-docstring
+        fileobj = self.open_file()
+        with winnan.lock_range(fileobj, 10, 20) as lock:
+            self.assertTrue(lock.locked)
+            self.assertEqual((10, 20, False), (lock.offset, lock.length, lock.shared))
+        self.assertFalse(lock.locked)
+
+        # Releasing again does nothing.
+        lock.release()
+
+        # Closing the file releases the lock along with it.
+        lock = winnan.lock_range(fileobj, 0, 10)
+        fileobj.close()
+        lock.release()
+
+    def test_release_flushes(self):  # pylint: disable=missing-docstring
+        fileobj = self.open_file()
+        with winnan.lock_range(fileobj, 0, 5):
+            fileobj.write(b"hello")
+
+        with open(self.path, "rb") as other:
+            self.assertEqual(b"hello", other.read(5))
+
+    def test_file_descriptor(self):  # pylint: disable=missing-docstring
+        fd = os.open(self.path, os.O_RDWR)  # pylint: disable=invalid-name
+        self.addCleanup(os.close, fd)
+        with winnan.lock_range(fd, 0, 0, shared=True) as lock:
+            self.assertTrue(lock.locked)
+
+    def test_invalid_arguments(self):  # pylint: disable=missing-docstring
+        fileobj = self.open_file()
+        with self.assertRaises(ValueError):
+            winnan.lock_range(fileobj, -1, 10)
+        with self.assertRaises(ValueError):
+            winnan.lock_range(fileobj, 0, -10)
+        with self.assertRaises(OverflowError):
+            winnan.lock_range(fileobj, 2**63, 0)
+        with self.assertRaises(OverflowError):
+            winnan.lock_range(fileobj, 0, 2**63 + 1)
+        with self.assertRaises(OverflowError):
+            winnan.lock_range(fileobj, 2**63 - 10, 11)
+
+        winnan.lock_range(fileobj, 2**63 - 10, 10).release()
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork()")
+    def test_exclusive_conflicts(self):  # pylint: disable=missing-docstring
+        fileobj = self.open_file()
+        with winnan.lock_range(fileobj, 10, 20):
+            self.assertFalse(self.try_lock_in_child(25, 10))
+            self.assertFalse(self.try_lock_in_child(0, 15, shared=True))
+
+            # Writers to a different range of the file aren't held up.
+            self.assertTrue(self.try_lock_in_child(30, 10))
+            self.assertTrue(self.try_lock_in_child(0, 10))
+
+        self.assertTrue(self.try_lock_in_child(10, 20))
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork()")
+    def test_shared_locks(self):  # pylint: disable=missing-docstring
+        fileobj = self.open_file()
+        with winnan.lock_range(fileobj, 0, 50, shared=True):
+            self.assertTrue(self.try_lock_in_child(0, 50, shared=True))
+            self.assertFalse(self.try_lock_in_child(40, 20))
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork()")
+    def test_to_end_of_file(self):  # pylint: disable=missing-docstring
+        fileobj = self.open_file()
+        with winnan.lock_range(fileobj, 50, 0):
+            self.assertFalse(self.try_lock_in_child(1000, 10))
+            self.assertTrue(self.try_lock_in_child(0, 50))
+
+    @unittest.skipUnless(winnan.locking._OFD_SUPPORTED,  # pylint: disable=protected-access
+                         "requires open file description locks")
+    def test_open_file_description_locks(self):  # pylint: disable=missing-docstring
+        # Unlike fcntl() record locks, separately opened file objects conflict in the same process.
+        first = self.open_file()
+        second = self.open_file()
+        with winnan.lock_range(first, 0, 10):
+            with self.assertRaises(OSError) as ctx:
+                winnan.lock_range(second, 5, 10, blocking=False)
+            self.assertEqual(errno.EAGAIN, ctx.exception.errno)
+
+            with winnan.lock_range(second, 10, 10, blocking=False):
+                pass
+
+            # Closing another file object for the file keeps the lock.
+            with winnan.open(self.path, "rb"):
+                pass
+            with self.assertRaises(OSError):
+                winnan.lock_range(second, 0, 1, blocking=False)
+
+        winnan.lock_range(second, 0, 10, blocking=False).release()
+
+    @unittest.skipUnless(winnan.locking._OFD_SUPPORTED,  # pylint: disable=protected-access
+                         "requires open file description locks")
+    def test_released_by_acquiring_mechanism(self):  # pylint: disable=missing-docstring
+        first = self.open_file()
+        lock = winnan.lock_range(first, 0, 10)
+
+        # Falling back to fcntl() record locks afterwards doesn't keep the existing lock held.
+        original = winnan.locking._OFD_SUPPORTED  # pylint: disable=protected-access
+        winnan.locking._OFD_SUPPORTED = False  # pylint: disable=protected-access
+        self.addCleanup(setattr, winnan.locking, "_OFD_SUPPORTED", original)
+        lock.release()
+
+        winnan.locking._OFD_SUPPORTED = original  # pylint: disable=protected-access
+        winnan.lock_range(self.open_file(), 0, 10, blocking=False).release()
+
+    def test_posix_fallback(self):  # pylint: disable=missing-docstring
+        original = winnan.locking._OFD_SUPPORTED  # pylint: disable=protected-access
+        winnan.locking._OFD_SUPPORTED = False  # pylint: disable=protected-access
+        self.addCleanup(setattr, winnan.locking, "_OFD_SUPPORTED", original)
+
+        fileobj = self.open_file()
+        with winnan.lock_range(fileobj, 0, 10):
+            if hasattr(os, "fork"):
+                self.assertFalse(self.try_lock_in_child(0, 10))
+        if hasattr(os, "fork"):
+            self.assertTrue(self.try_lock_in_child(0, 10))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+"""Unit tests for the winnan/logging.py module."""
+
+from __future__ import absolute_import
+
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from tests.context import winnan
+import winnan.logging
+
+
+class HandlerTestCase(unittest.TestCase):
+    """Base class for the unit tests of the log handlers."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.filename = os.path.join(self.root, "test.log")
+
+        self.logger = logging.Logger("winnan.test")
+
+    def add_handler(self, handler):  # pylint: disable=missing-docstring
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self.logger.addHandler(handler)
+        self.addCleanup(handler.close)
+        return handler
+
+    def read(self, filename):  # pylint: disable=missing-docstring
+        with open(filename, "r") as fileobj:
+            return fileobj.read()
+
+
+class TestRotatingFileHandler(HandlerTestCase):
+    """Unit tests for the winnan.logging.RotatingFileHandler class."""
+
+    def test_write(self):  # pylint: disable=missing-docstring
+        handler = self.add_handler(winnan.logging.RotatingFileHandler(self.filename))
+
+        for i in range(100):
+            self.logger.info("message %d", i)
+
+        handler.flush()
+        self.assertEqual("".join("message %d\n" % i for i in range(100)), self.read(self.filename))
+
+    def test_formats_on_calling_thread(self):  # pylint: disable=missing-docstring
+        handler = self.add_handler(winnan.logging.RotatingFileHandler(self.filename))
+
+        args = ["before"]
+        self.logger.info("value %s", args)
+        args[0] = "after"
+
+        handler.flush()
+        self.assertEqual("value ['before']\n", self.read(self.filename))
+
+    def test_writes_on_background_thread(self):  # pylint: disable=missing-docstring
+        handler = self.add_handler(winnan.logging.RotatingFileHandler(self.filename))
+        threads = []
+
+        real_write_batch = handler._write_batch  # pylint: disable=protected-access
+
+        def write_batch(batch):  # pylint: disable=missing-docstring
+            threads.append(threading.current_thread())
+            real_write_batch(batch)
+
+        handler._write_batch = write_batch  # pylint: disable=protected-access
+        self.logger.info("message")
+        handler.flush()
+
+        self.assertTrue(threads)
+        self.assertNotIn(threading.current_thread(), threads)
+
+    def test_rollover(self):  # pylint: disable=missing-docstring
+        handler = self.add_handler(
+            winnan.logging.RotatingFileHandler(self.filename, maxBytes=100, backupCount=2))
+
+        for i in range(30):
+            self.logger.info("message %02d", i)
+
+        handler.flush()
+
+        # Each line is 11 bytes long, so each file holds 9 lines.
+        self.assertEqual("".join("message %02d\n" % i for i in range(27, 30)),
+                         self.read(self.filename))
+        self.assertEqual("".join("message %02d\n" % i for i in range(18, 27)),
+                         self.read(self.filename + ".1"))
+        self.assertEqual("".join("message %02d\n" % i for i in range(9, 18)),
+                         self.read(self.filename + ".2"))
+        self.assertFalse(os.path.exists(self.filename + ".3"))
+
+    def test_rollover_counts_bytes(self):  # pylint: disable=missing-docstring
+        handler = self.add_handler(
+            winnan.logging.RotatingFileHandler(self.filename, maxBytes=100, backupCount=5,
+                                               encoding="utf-8"))
+
+        for i in range(30):
+            self.logger.info(u"\u00e9t\u00e9 \u00e9t\u00e9 %02d", i)
+
+        handler.flush()
+        self.assertTrue(os.path.exists(self.filename + ".2"))
+        for suffix in ("", ".1", ".2"):
+            self.assertLessEqual(os.path.getsize(self.filename + suffix), 100)
+
+    def test_rollover_while_file_open(self):  # pylint: disable=missing-docstring
+        handler = self.add_handler(
+            winnan.logging.RotatingFileHandler(self.filename, maxBytes=100, backupCount=1))
+
+        self.logger.info("first")
+        handler.flush()
+
+        # A reader holding the log file open doesn't prevent it from being rotated.
+        with winnan.open(self.filename, "r") as reader:
+            for i in range(20):
+                self.logger.info("message %02d", i)
+            handler.flush()
+            self.assertEqual("first\n", reader.readline())
+
+        self.assertTrue(os.path.exists(self.filename + ".1"))
+
+    def test_close_writes_queued_records(self):  # pylint: disable=missing-docstring
+        handler = self.add_handler(winnan.logging.RotatingFileHandler(self.filename, delay=True))
+
+        for i in range(10):
+            self.logger.info("message %d", i)
+
+        handler.close()
+        self.assertEqual("".join("message %d\n" % i for i in range(10)), self.read(self.filename))
+
+    def test_bounded_queue(self):  # pylint: disable=missing-docstring
+        handler = self.add_handler(
+            winnan.logging.RotatingFileHandler(self.filename, max_queued=1))
+
+        for i in range(50):
+            self.logger.info("message %d", i)
+
+        handler.flush()
+        self.assertEqual(50, len(self.read(self.filename).splitlines()))
+
+
+class TestTimedRotatingFileHandler(HandlerTestCase):
+    """Unit tests for the winnan.logging.TimedRotatingFileHandler class."""
+
+    def test_rollover(self):  # pylint: disable=missing-docstring
+        handler = self.add_handler(
+            winnan.logging.TimedRotatingFileHandler(self.filename, when="S", backupCount=5))
+
+        self.logger.info("first")
+        handler.flush()
+
+        handler.rolloverAt = int(time.time()) - 1
+        self.logger.info("second")
+        handler.flush()
+
+        self.assertEqual("second\n", self.read(self.filename))
+
+        rotated = [name for name in os.listdir(self.root) if name != "test.log"]
+        self.assertEqual(1, len(rotated))
+        self.assertEqual("first\n", self.read(os.path.join(self.root, rotated[0])))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+"""Unit tests for the winnan/memfd.py module."""
+
+from __future__ import absolute_import
+
+import io
+import os
+import subprocess
+import sys
+import unittest
+
+from tests.context import winnan
+import winnan.memfd
+
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "requires memfd_create()")
+class TestMemfdOpen(unittest.TestCase):
+    """Unit tests for the winnan.memfd_open() function."""
+
+    def test_binary_roundtrip(self):  # pylint: disable=missing-docstring
+        with winnan.memfd_open("artifact") as fileobj:
+            self.assertIsInstance(fileobj, io.BufferedRandom)
+            self.assertEqual("artifact", fileobj.name)
+
+            fileobj.write(b"hello world")
+            fileobj.seek(0)
+            self.assertEqual(b"hello world", fileobj.read())
+
+    def test_text_mode(self):  # pylint: disable=missing-docstring
+        with winnan.memfd_open("artifact", "w+", encoding="utf-8") as fileobj:
+            self.assertIsInstance(fileobj, io.TextIOWrapper)
+            fileobj.write(u"caf\xe9")
+            fileobj.seek(0)
+            self.assertEqual(u"caf\xe9", fileobj.read())
+
+    def test_non_inheritable(self):  # pylint: disable=missing-docstring
+        with winnan.memfd_open("artifact") as fileobj:
+            if sys.version_info >= (3, 4):
+                self.assertFalse(os.get_inheritable(fileobj.fileno()))  # pylint: disable=no-member
+
+    def test_seals(self):  # pylint: disable=missing-docstring
+        with winnan.memfd_open("artifact", allow_sealing=True) as fileobj:
+            fileobj.write(b"frozen")
+            winnan.memfd.add_seals(fileobj, winnan.memfd.F_SEAL_WRITE | winnan.memfd.F_SEAL_SHRINK
+                                   | winnan.memfd.F_SEAL_GROW)
+            self.assertTrue(winnan.memfd.get_seals(fileobj) & winnan.memfd.F_SEAL_WRITE)
+
+            with self.assertRaises(OSError):
+                os.write(fileobj.fileno(), b"thawed")
+
+        with winnan.memfd_open("artifact") as fileobj:
+            with self.assertRaises(OSError):
+                winnan.memfd.add_seals(fileobj, winnan.memfd.F_SEAL_WRITE)
+
+    @unittest.skipUnless(sys.version_info >= (3, 2), "requires subprocess pass_fds")
+    def test_pass_fds(self):  # pylint: disable=missing-docstring
+        with winnan.memfd_open("artifact") as fileobj:
+            fileobj.write(b"from parent")
+            (fd, ) = winnan.memfd.pass_fds(fileobj)  # pylint: disable=invalid-name
+
+            output = subprocess.check_output(
+                [sys.executable, "-c",
+                 "import os, sys; os.lseek(%d, 0, 0); sys.stdout.write(os.read(%d, 100).decode())"
+                 % (fd, fd)], pass_fds=(fd, ))
+
+            self.assertEqual(b"from parent", output)
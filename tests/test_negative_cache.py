@@ -0,0 +1,124 @@
+"""Unit tests for the winnan/negative_cache.py module."""
+
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from tests.context import winnan
+from winnan import _inotify
+import winnan.negative_cache
+
+
+class NegativeCacheTests(object):
+    """Unit tests for the winnan.negative_cache module."""
+
+    USE_INOTIFY = None
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.path = os.path.join(self.root, "missing")
+
+        self.cache = winnan.negative_cache.enable(ttl=60, max_entries=2,
+                                                  use_inotify=self.USE_INOTIFY)
+        self.addCleanup(winnan.negative_cache.disable)
+
+    def assert_missing(self, path, flags=os.O_RDONLY):  # pylint: disable=missing-docstring
+        with self.assertRaises(EnvironmentError):
+            winnan.os_open(path, flags)
+
+    def wait_for(self, predicate):
+        """Waits up to 5 seconds for the inotify thread to make 'predicate' true."""
+        deadline = time.time() + 5
+        while not predicate() and time.time() < deadline:
+            time.sleep(0.01)
+
+    def test_repeated_misses_hit_the_cache(self):  # pylint: disable=missing-docstring
+        self.assert_missing(self.path)
+        self.assert_missing(self.path)
+        self.assert_missing(self.path)
+
+        stats = winnan.negative_cache.stats()
+        self.assertEqual((2, 1, 1), (stats.hits, stats.misses, stats.entries))
+
+    def test_creation_invalidates(self):  # pylint: disable=missing-docstring
+        self.assert_missing(self.path)
+
+        # The file is created by something other than winnan.
+        with open(self.path, "w"):
+            pass
+
+        if self.USE_INOTIFY:
+            self.wait_for(lambda: not winnan.negative_cache.stats().entries)
+        else:
+            # Ensure the parent directory's modification time differs on file systems with coarse
+            # timestamps.
+            os.utime(self.root, (0, 0))
+
+            # The modification time of the directory is only checked again after the recheck
+            # interval has passed.
+            self.cache.recheck_interval = 60
+            self.assert_missing(self.path)
+            self.cache.recheck_interval = 0
+
+        fd = winnan.os_open(self.path, os.O_RDONLY)  # pylint: disable=invalid-name
+        os.close(fd)
+
+    def test_only_missing_files_are_cached(self):  # pylint: disable=missing-docstring
+        with open(self.path, "w"):
+            pass
+
+        if hasattr(os, "O_DIRECTORY"):
+            # The file exists, so the failure is caused by the flags rather than by the path.
+            self.assert_missing(self.path, os.O_RDONLY | os.O_DIRECTORY)
+        self.assert_missing(os.path.join(self.path, "child"), os.O_RDONLY)
+        self.assertEqual(0, winnan.negative_cache.stats().entries)
+
+        fd = winnan.os_open(self.path, os.O_RDONLY)  # pylint: disable=invalid-name
+        os.close(fd)
+
+    def test_relative_paths(self):  # pylint: disable=missing-docstring
+        cwd = os.getcwd()
+        self.addCleanup(os.chdir, cwd)
+        os.chdir(self.root)
+        self.assert_missing("missing")
+        self.assert_missing(self.path)
+        self.assertEqual((1, 1), winnan.negative_cache.stats()[:2])
+
+        # The relative path resolves to a different file in another working directory.
+        os.mkdir("other")
+        with open(os.path.join("other", "missing"), "w"):
+            pass
+        os.chdir("other")
+        fd = winnan.os_open("missing", os.O_RDONLY)  # pylint: disable=invalid-name
+        os.close(fd)
+
+    def test_winnan_create_invalidates(self):  # pylint: disable=missing-docstring
+        self.assert_missing(self.path)
+        with winnan.open(self.path, "w"):
+            pass
+        with winnan.open(self.path, "r"):
+            pass
+
+    def test_ttl_and_lru(self):  # pylint: disable=missing-docstring
+        for name in ("a", "b", "c"):
+            self.assert_missing(os.path.join(self.root, name))
+        self.assertEqual(2, winnan.negative_cache.stats().entries)
+
+        self.cache.ttl = 0
+        self.assert_missing(os.path.join(self.root, "d"))
+        self.assert_missing(os.path.join(self.root, "d"))
+        self.assertEqual(0, winnan.negative_cache.stats().hits)
+
+
+class MtimeNegativeCacheTests(NegativeCacheTests, unittest.TestCase):  # pylint: disable=missing-docstring
+    USE_INOTIFY = False
+
+
+@unittest.skipUnless(_inotify.is_supported(), "requires inotify")
+class InotifyNegativeCacheTests(NegativeCacheTests, unittest.TestCase):  # pylint: disable=missing-docstring
+    USE_INOTIFY = True
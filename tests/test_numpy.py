@@ -0,0 +1,86 @@
+"""Unit tests for the winnan/numpy.py module."""
+
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # pylint: disable=invalid-name
+
+from tests.context import winnan
+
+if numpy is not None:
+    import winnan.numpy
+
+
+@unittest.skipIf(numpy is None, "requires numpy")
+class NumpyTestCase(unittest.TestCase):
+    """Unit tests for the winnan.numpy.fromfile() and winnan.numpy.memmap() functions."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.path = os.path.join(self.root, "array")
+
+        self.array = numpy.arange(100000, dtype=numpy.float64)
+        self.array.tofile(self.path)
+
+    def test_fromfile(self):  # pylint: disable=missing-docstring
+        array = winnan.numpy.fromfile(self.path, dtype=numpy.float64)
+        numpy.testing.assert_array_equal(self.array, array)
+
+    def test_fromfile_count_and_offset(self):  # pylint: disable=missing-docstring
+        array = winnan.numpy.fromfile(self.path, dtype=numpy.float64, count=10, offset=8 * 5)
+        numpy.testing.assert_array_equal(self.array[5:15], array)
+
+        # Asking for more items than the file holds returns the items that were read.
+        array = winnan.numpy.fromfile(self.path, dtype=numpy.float64, count=200000)
+        numpy.testing.assert_array_equal(self.array, array)
+
+    def test_fromfile_file_object(self):  # pylint: disable=missing-docstring
+        with winnan.open(self.path, "rb") as fileobj:
+            array = winnan.numpy.fromfile(fileobj, dtype="<f8", offset=8)
+            self.assertEqual(0, fileobj.tell())
+        numpy.testing.assert_array_equal(self.array[1:], array)
+
+    def test_fromfile_threads(self):  # pylint: disable=missing-docstring
+        original = winnan.oneshot._MIN_PARALLEL_SIZE  # pylint: disable=protected-access
+        winnan.oneshot._MIN_PARALLEL_SIZE = 4096  # pylint: disable=protected-access
+        self.addCleanup(setattr, winnan.oneshot, "_MIN_PARALLEL_SIZE", original)
+
+        array = winnan.numpy.fromfile(self.path, dtype=numpy.float64, threads=4)
+        numpy.testing.assert_array_equal(self.array, array)
+
+    def test_memmap(self):  # pylint: disable=missing-docstring
+        array = winnan.numpy.memmap(self.path, dtype=numpy.float64, mode="r")
+        try:
+            numpy.testing.assert_array_equal(self.array, array)
+            self.assertEqual(os.path.abspath(self.path), array.filename)
+        finally:
+            del array
+
+    def test_memmap_write(self):  # pylint: disable=missing-docstring
+        path = os.path.join(self.root, "new")
+        array = winnan.numpy.memmap(path, dtype=numpy.int32, mode="w+", shape=(4, ))
+        array[:] = [1, 2, 3, 4]
+        array.flush()
+        del array
+
+        numpy.testing.assert_array_equal([1, 2, 3, 4], numpy.fromfile(path, dtype=numpy.int32))
+
+    def test_memmap_invalid_arguments(self):  # pylint: disable=missing-docstring
+        path = os.path.join(self.root, "new")
+        with self.assertRaises(ValueError):
+            winnan.numpy.memmap(path, mode="w+")
+        with self.assertRaises(ValueError):
+            winnan.numpy.memmap(path, mode="x")
+        self.assertFalse(os.path.exists(path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+"""Unit tests for the winnan/oneshot.py module."""
+
+from __future__ import absolute_import
+
+import array
+import os
+import unittest
+
+import test.support
+
+from tests.context import winnan
+import winnan.oneshot
+
+
+class TestOneShot(unittest.TestCase):
+    """Unit tests for the winnan.read_bytes(), winnan.read_text(), winnan.write_bytes(), and
+    winnan.write_text() functions.
+    """
+
+    def setUp(self):
+        self.addCleanup(test.support.unlink, test.support.TESTFN)
+
+    def test_bytes_roundtrip(self):  # pylint: disable=missing-docstring
+        for size in (0, 1, 4096, 1024 * 1024 + 1):
+            data = os.urandom(size)
+            self.assertEqual(size, winnan.write_bytes(test.support.TESTFN, data))
+            self.assertEqual(data, winnan.read_bytes(test.support.TESTFN))
+
+            with open(test.support.TESTFN, "rb") as fileobj:
+                self.assertEqual(data, fileobj.read())
+
+    def test_write_truncates(self):  # pylint: disable=missing-docstring
+        winnan.write_bytes(test.support.TESTFN, b"a much longer line")
+        winnan.write_bytes(test.support.TESTFN, bytearray(b"short"))
+        self.assertEqual(b"short", winnan.read_bytes(test.support.TESTFN))
+
+    def test_text_roundtrip(self):  # pylint: disable=missing-docstring
+        text = u"caf\xe9\nline two\n"
+        self.assertEqual(len(text), winnan.write_text(test.support.TESTFN, text, encoding="utf-8"))
+
+        with open(test.support.TESTFN, "rb") as fileobj:
+            self.assertEqual(text.replace(u"\n", os.linesep).encode("utf-8"), fileobj.read())
+
+        self.assertEqual(text, winnan.read_text(test.support.TESTFN, encoding="utf-8"))
+
+    def test_text_newlines(self):  # pylint: disable=missing-docstring
+        winnan.write_bytes(test.support.TESTFN, b"a\r\nb\rc\n")
+        self.assertEqual(u"a\nb\nc\n", winnan.read_text(test.support.TESTFN, encoding="ascii"))
+
+        winnan.write_text(test.support.TESTFN, u"a\nb\n", encoding="ascii", newline=u"\r\n")
+        self.assertEqual(b"a\r\nb\r\n", winnan.read_bytes(test.support.TESTFN))
+
+    def test_matches_open(self):  # pylint: disable=missing-docstring
+        winnan.write_bytes(test.support.TESTFN, b"x\r\ny\n")
+
+        with winnan.open(test.support.TESTFN, "r") as fileobj:
+            self.assertEqual(fileobj.read(), winnan.read_text(test.support.TESTFN))
+
+    def test_missing_file(self):  # pylint: disable=missing-docstring
+        with self.assertRaises(OSError):
+            winnan.read_bytes(test.support.TESTFN)
+
+
+class TestReadintoAll(unittest.TestCase):
+    """Unit tests for the winnan.readinto_all() function."""
+
+    def setUp(self):
+        self.addCleanup(test.support.unlink, test.support.TESTFN)
+        self.data = os.urandom(256 * 1024 + 3)
+        winnan.write_bytes(test.support.TESTFN, self.data)
+
+    def test_path(self):  # pylint: disable=missing-docstring
+        buf = bytearray(len(self.data))
+        self.assertEqual(len(self.data), winnan.readinto_all(test.support.TESTFN, buf))
+        self.assertEqual(self.data, bytes(buf))
+
+    def test_offset_and_short_read(self):  # pylint: disable=missing-docstring
+        buf = bytearray(len(self.data))
+        self.assertEqual(len(self.data) - 100, winnan.readinto_all(test.support.TESTFN, buf, 100))
+        self.assertEqual(self.data[100:], bytes(buf[:len(self.data) - 100]))
+
+    def test_file_object_position_unchanged(self):  # pylint: disable=missing-docstring
+        with winnan.open(test.support.TESTFN, "rb") as fileobj:
+            fileobj.seek(10)
+            buf = bytearray(100)
+            self.assertEqual(100, winnan.readinto_all(fileobj, buf, offset=1000))
+            self.assertEqual(self.data[1000:1100], bytes(buf))
+            self.assertEqual(self.data[10:20], fileobj.read(10))
+
+            self.assertEqual(100, winnan.readinto_all(fileobj.fileno(), memoryview(buf), 5))
+            self.assertEqual(self.data[5:105], bytes(buf))
+
+    def test_flushes_file_object(self):  # pylint: disable=missing-docstring
+        with winnan.open(test.support.TESTFN, "w+b") as fileobj:
+            fileobj.write(b"buffered")
+            buf = bytearray(8)
+            self.assertEqual(8, winnan.readinto_all(fileobj, buf))
+            self.assertEqual(b"buffered", bytes(buf))
+
+    def test_typed_buffer(self):  # pylint: disable=missing-docstring
+        buf = array.array("i", [0] * 10)
+        self.assertEqual(buf.itemsize * 10, winnan.readinto_all(test.support.TESTFN, buf))
+        self.assertEqual(self.data[:buf.itemsize * 10], buf.tobytes())
+
+    def test_threads(self):  # pylint: disable=missing-docstring
+        original = winnan.oneshot._MIN_PARALLEL_SIZE  # pylint: disable=protected-access
+        winnan.oneshot._MIN_PARALLEL_SIZE = 1024  # pylint: disable=protected-access
+        self.addCleanup(setattr, winnan.oneshot, "_MIN_PARALLEL_SIZE", original)
+
+        for extra in (0, 5000):
+            buf = bytearray(len(self.data) + extra)
+            self.assertEqual(len(self.data),
+                             winnan.readinto_all(test.support.TESTFN, buf, threads=4))
+            self.assertEqual(self.data, bytes(buf[:len(self.data)]))
+
+    def test_read_only_buffer(self):  # pylint: disable=missing-docstring
+        with self.assertRaises(TypeError):
+            winnan.readinto_all(test.support.TESTFN, b"immutable")
@@ -0,0 +1,138 @@
+"""Unit tests for the winnan/prefetcher.py module."""
+
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from tests.context import winnan
+import winnan.prefetcher
+
+
+class TestPrefetch(unittest.TestCase):
+    """Unit tests for the winnan.prefetch() function."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+        self.paths = []
+        for i in range(10):
+            path = os.path.join(self.root, "file%d" % i)
+            with open(path, "wb") as fileobj:
+                fileobj.write(("data%d" % i).encode("ascii"))
+            self.paths.append(path)
+
+    def count_open_fds(self):  # pylint: disable=missing-docstring
+        if not os.path.isdir("/proc/self/fd"):
+            self.skipTest("requires /proc/self/fd")
+        return len(os.listdir("/proc/self/fd"))
+
+    def test_yields_in_order(self):  # pylint: disable=missing-docstring
+        self.assertEqual(self.paths, list(winnan.prefetch(iter(self.paths), depth=3)))
+        self.assertEqual([], list(winnan.prefetch([], depth=3)))
+
+    def test_consumes_lazily(self):  # pylint: disable=missing-docstring
+        consumed = []
+
+        def generate():  # pylint: disable=missing-docstring
+            for path in self.paths:
+                consumed.append(path)
+                yield path
+
+        iterator = winnan.prefetch(generate(), depth=3)
+        self.assertEqual(self.paths[0], next(iterator))
+        self.assertEqual(4, len(consumed))
+        iterator.close()
+
+    def test_keep_open_hands_off_fd(self):  # pylint: disable=missing-docstring
+        opened = []
+
+        def record_open(next_open, file, flags, mode, share_flags):  # pylint: disable=redefined-builtin,too-many-arguments,missing-docstring
+            opened.append(file)
+            return next_open(file, flags, mode, share_flags)
+
+        # The hook is installed before prefetch() installs its own hook, so it only sees the opens
+        # that actually reach the operating system.
+        winnan.os_shim.add_open_hook(record_open)
+        self.addCleanup(winnan.os_shim.remove_open_hook, record_open)
+
+        for (i, path) in enumerate(winnan.prefetch(self.paths, depth=2, keep_open=True)):
+            with winnan.open(path, "rb") as fileobj:
+                self.assertEqual(("data%d" % i).encode("ascii"), fileobj.read())
+                self.assertEqual(path, fileobj.name)
+
+        self.assertEqual(self.paths, opened)
+
+    def test_keep_open_closes_unclaimed(self):  # pylint: disable=missing-docstring
+        before = self.count_open_fds()
+
+        iterator = winnan.prefetch(self.paths, depth=4, keep_open=True)
+        for path in iterator:
+            if path == self.paths[5]:
+                break
+
+        iterator.close()
+        self.assertEqual(before, self.count_open_fds())
+        self.assertEqual([], winnan.prefetcher._HANDOFFS)  # pylint: disable=protected-access
+
+    def test_write_open_not_handed_off(self):  # pylint: disable=missing-docstring
+        with winnan.prefetcher.Prefetcher(workers=1, keep_open=True) as prefetcher:
+            handle = prefetcher.submit(self.paths[0])
+            handle.done.wait()
+
+            with winnan.open(self.paths[0], "ab") as fileobj:
+                self.assertNotEqual(handle.fd, fileobj.fileno())
+
+            with winnan.open(self.paths[0], "rb") as fileobj:
+                self.assertEqual(b"data0", fileobj.read())
+
+    def test_other_flags_not_handed_off(self):  # pylint: disable=missing-docstring
+        if not hasattr(os, "O_DIRECTORY"):
+            self.skipTest("requires os.O_DIRECTORY")
+
+        with winnan.prefetcher.Prefetcher(workers=1, keep_open=True) as prefetcher:
+            handle = prefetcher.submit(self.paths[0])
+            handle.done.wait()
+
+            with self.assertRaises(OSError):
+                winnan.os_open(self.paths[0], os.O_RDONLY | os.O_DIRECTORY)
+
+            # The prefetched file descriptor is still available to a plain read-only open().
+            fd = winnan.os_open(self.paths[0], os.O_RDONLY)  # pylint: disable=invalid-name
+            self.assertEqual(handle.fd, fd)
+            os.close(fd)
+
+    def test_replaced_file_not_handed_off(self):  # pylint: disable=missing-docstring
+        with winnan.prefetcher.Prefetcher(workers=1, keep_open=True) as prefetcher:
+            handle = prefetcher.submit(self.paths[0])
+            handle.done.wait()
+
+            os.rename(self.paths[1], self.paths[0])
+            with winnan.open(self.paths[0], "rb") as fileobj:
+                self.assertEqual(b"data1", fileobj.read())
+
+    def test_missing_file(self):  # pylint: disable=missing-docstring
+        missing = os.path.join(self.root, "missing")
+        for path in winnan.prefetch([missing] + self.paths[:1], keep_open=True):
+            if path == missing:
+                with self.assertRaises(EnvironmentError):
+                    winnan.open(path, "rb")
+
+    def test_warm_preserves_position(self):  # pylint: disable=missing-docstring
+        fd = os.open(self.paths[0], os.O_RDONLY)  # pylint: disable=invalid-name
+        self.addCleanup(os.close, fd)
+        os.lseek(fd, 2, os.SEEK_SET)
+
+        winnan.prefetcher.warm(fd)
+        self.assertEqual(2, os.lseek(fd, 0, os.SEEK_CUR))
+
+    def test_invalid_depth(self):  # pylint: disable=missing-docstring
+        with self.assertRaises(ValueError):
+            list(winnan.prefetch(self.paths, depth=0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+"""Unit tests for the winnan/read_cache.py module."""
+
+from __future__ import absolute_import
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from tests.context import winnan
+import winnan.read_cache
+
+
+class TestReadCached(unittest.TestCase):
+    """Unit tests for the winnan.read_cached() function."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.cache = winnan.read_cache.ReadCache(max_entries=2, max_bytes=100)
+
+    def write(self, name, data):
+        """Atomically replaces the file 'name' with 'data' and returns its path."""
+        path = os.path.join(self.root, name)
+        with open(path + ".tmp", "wb") as fileobj:
+            fileobj.write(data)
+
+        if hasattr(os, "replace"):
+            os.replace(path + ".tmp", path)  # pylint: disable=no-member
+        else:
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(path + ".tmp", path)
+
+        return path
+
+    def test_hits_until_replaced(self):  # pylint: disable=missing-docstring
+        path = self.write("config.json", b'{"a": 1}')
+        loads = lambda data: json.loads(data.decode("utf-8"))
+
+        self.assertEqual({"a": 1}, winnan.read_cached(path, loads, cache=self.cache))
+        self.assertIs(
+            winnan.read_cached(path, loads, cache=self.cache),
+            winnan.read_cached(path, loads, cache=self.cache))
+        self.assertEqual((2, 1), self.cache.info()[:2])
+
+        self.write("config.json", b'{"a": 2}')
+        self.assertEqual({"a": 2}, winnan.read_cached(path, loads, cache=self.cache))
+        self.assertEqual(b'{"a": 2}', winnan.read_cached(path, cache=self.cache))
+        self.assertEqual((2, 3, 2, 16), tuple(self.cache.info()))
+
+    def test_lru_and_size_eviction(self):  # pylint: disable=missing-docstring
+        paths = [self.write("file%d" % (i, ), b"x" * 40) for i in range(3)]
+
+        for path in paths:
+            self.cache.get(path)
+        self.assertEqual(2, self.cache.info().entries)
+        self.assertEqual(80, self.cache.info().nbytes)
+
+        big = self.write("big", b"y" * 70)
+        self.cache.get(big)
+        self.assertEqual((1, 70), self.cache.info()[2:])
+
+        huge = self.write("huge", b"z" * 200)
+        self.assertEqual(b"z" * 200, self.cache.get(huge))
+        self.assertEqual((1, 70), self.cache.info()[2:])
+
+        self.cache.invalidate(big)
+        self.assertEqual((0, 0), self.cache.info()[2:])
+
+    def test_missing_file(self):  # pylint: disable=missing-docstring
+        with self.assertRaises(OSError):
+            winnan.read_cached(os.path.join(self.root, "missing"), cache=self.cache)
@@ -0,0 +1,81 @@
+"""Unit tests for the winnan/registry.py module."""
+
+from __future__ import absolute_import
+
+import os
+import unittest
+
+import test.support
+
+from tests.context import winnan
+import winnan.registry
+
+
+class TestRegistry(unittest.TestCase):
+    """Unit tests for the winnan.registry module."""
+
+    def setUp(self):
+        with open(test.support.TESTFN, "w+"):
+            self.addCleanup(os.remove, test.support.TESTFN)
+
+        winnan.registry.enable()
+        self.addCleanup(winnan.registry.disable)
+
+    def test_disabled_by_default_has_no_hook(self):  # pylint: disable=missing-docstring
+        winnan.registry.disable()
+        self.assertFalse(winnan.registry.ENABLED)
+        self.assertIsNone(winnan.os_shim._open_hook)  # pylint: disable=protected-access
+
+    def test_records_io_open(self):  # pylint: disable=missing-docstring
+        with winnan.open(test.support.TESTFN, "rb") as fileobj:
+            self.assertEqual(1, winnan.registry.count(prefix=test.support.TESTFN))
+            self.assertEqual({"rb": 1}, winnan.registry.counts_by_mode(prefix=test.support.TESTFN))
+
+            (handle, ) = winnan.registry.oldest()
+            self.assertEqual(fileobj.fileno(), handle.fd)
+            self.assertEqual(test.support.TESTFN, handle.path)
+            self.assertIsNone(handle.stack)
+
+        # The closed file object is still referenced but its file descriptor is no longer counted.
+        self.assertEqual(0, winnan.registry.count())
+        del fileobj
+        self.assertEqual(0, winnan.registry.count())
+
+    def test_records_os_open(self):  # pylint: disable=missing-docstring
+        fd = winnan.os_open(test.support.TESTFN, os.O_RDWR)  # pylint: disable=invalid-name
+        self.assertEqual(1, winnan.registry.count(mode="r+"))
+
+        winnan.os_shim.close(fd)
+        self.assertEqual(0, winnan.registry.count())
+        self.assertEqual({}, winnan.registry.counts_by_mode())
+        self.assertEqual([], winnan.registry.oldest())
+
+    def test_prune_after_os_close(self):  # pylint: disable=missing-docstring
+        fd = winnan.os_open(test.support.TESTFN, os.O_RDONLY)  # pylint: disable=invalid-name
+        os.close(fd)
+
+        # Counting doesn't check whether each file descriptor is still open.
+        self.assertEqual(1, winnan.registry.count())
+        self.assertEqual(1, winnan.registry.prune())
+        self.assertEqual(0, winnan.registry.count())
+        self.assertEqual({}, winnan.registry.counts_by_mode())
+
+    def test_oldest_is_ordered(self):  # pylint: disable=missing-docstring
+        with winnan.open(test.support.TESTFN, "r") as fileobj1:
+            with winnan.open(test.support.TESTFN, "w") as fileobj2:
+                handles = winnan.registry.oldest(limit=1)
+                self.assertEqual([fileobj1.fileno()], [handle.fd for handle in handles])
+                self.assertEqual(2, len(winnan.registry.oldest()))
+                self.assertEqual(1, winnan.registry.count(mode="w"))
+                self.assertNotEqual(fileobj1.fileno(), fileobj2.fileno())
+
+    def test_stack_sampling(self):  # pylint: disable=missing-docstring
+        winnan.registry.enable(stack_sample_rate=1.0)
+
+        with winnan.open(test.support.TESTFN, "r"):
+            (handle, ) = winnan.registry.oldest()
+            self.assertTrue(handle.stack)
+            self.assertEqual(__file__.rstrip("c"), handle.stack[-1][0])
+
+        with self.assertRaises(ValueError):
+            winnan.registry.enable(stack_sample_rate=2.0)
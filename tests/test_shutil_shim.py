@@ -0,0 +1,213 @@
+"""Unit tests for the winnan/shutil_shim.py module."""
+
+from __future__ import absolute_import
+
+import errno
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from tests.context import winnan
+import winnan.shutil_shim
+
+
+def make_tree(root, depth, width, files):
+    """Creates a directory tree of the given depth and width with 'files' files per directory and
+    returns the total number of entries created beneath 'root'.
+    """
+    created = 0
+
+    for i in range(files):
+        with open(os.path.join(root, "file%d" % (i, )), "w") as fileobj:
+            fileobj.write("x")
+        created += 1
+
+    if depth:
+        for i in range(width):
+            subdir = os.path.join(root, "dir%d" % (i, ))
+            os.mkdir(subdir)
+            created += 1 + make_tree(subdir, depth - 1, width, files)
+
+    return created
+
+
+class TestRmtree(unittest.TestCase):
+    """Unit tests for the winnan.rmtree() function."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+
+    def test_removes_tree(self):  # pylint: disable=missing-docstring
+        for workers in (1, 4):
+            os.mkdir(os.path.join(self.root, "tree"))
+            created = make_tree(os.path.join(self.root, "tree"), depth=3, width=3, files=2)
+
+            removed = []
+            winnan.rmtree(os.path.join(self.root, "tree"), workers=workers, progress=removed.append)
+
+            self.assertFalse(os.path.exists(os.path.join(self.root, "tree")))
+            self.assertEqual(created + 1, len(removed))
+            self.assertEqual(os.path.join(self.root, "tree"), removed[-1])
+
+    def test_removes_open_files(self):  # pylint: disable=missing-docstring
+        make_tree(self.root, depth=1, width=2, files=1)
+
+        with winnan.open(os.path.join(self.root, "dir0", "file0"), "r+") as fileobj:
+            winnan.rmtree(self.root, workers=2)
+            self.assertEqual("x", fileobj.read())
+
+        self.assertFalse(os.path.exists(self.root))
+
+    def test_does_not_follow_symlinks(self):  # pylint: disable=missing-docstring
+        if not hasattr(os, "symlink"):
+            raise unittest.SkipTest("requires os.symlink")
+
+        outside = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, outside)
+        make_tree(outside, depth=0, width=0, files=1)
+
+        os.mkdir(os.path.join(self.root, "tree"))
+        os.symlink(outside, os.path.join(self.root, "tree", "link"))
+        winnan.rmtree(os.path.join(self.root, "tree"))
+
+        self.assertTrue(os.path.exists(os.path.join(outside, "file0")))
+
+        os.symlink(outside, os.path.join(self.root, "link"))
+        with self.assertRaises(OSError):
+            winnan.rmtree(os.path.join(self.root, "link"))
+
+    def test_missing_path(self):  # pylint: disable=missing-docstring
+        # Matches shutil.rmtree(), which raises FileNotFoundError on Python 3.
+        with self.assertRaises(OSError) as cm:  # pylint: disable=invalid-name
+            winnan.rmtree(os.path.join(self.root, "missing"))
+        self.assertEqual(errno.ENOENT, cm.exception.errno)
+
+        reported = []
+        winnan.rmtree(os.path.join(self.root, "missing"),
+                      onerror=lambda *args: reported.append(args))
+        self.assertEqual(1, len(reported))
+
+    def test_callback_exceptions(self):  # pylint: disable=missing-docstring
+        for workers in (1, 4):
+            tree = os.path.join(self.root, "tree%d" % (workers, ))
+            os.mkdir(tree)
+            make_tree(tree, depth=2, width=3, files=2)
+            raised = []
+
+            def progress(path):  # pylint: disable=missing-docstring,unused-argument
+                raised.append(ValueError("stop"))
+                raise raised[-1]
+
+            # The removal is run on a separate thread so a hang fails the test rather than blocking.
+            thread = threading.Thread(target=self._rmtree_catching,
+                                      args=(tree, workers, progress, raised))
+            thread.daemon = True
+            thread.start()
+            thread.join(30)
+            self.assertFalse(thread.is_alive())
+            self.assertIs(raised[0], raised[-1])
+
+    @staticmethod
+    def _rmtree_catching(path, workers, progress, raised):
+        """Calls winnan.rmtree() and records the exception it raises at the end of 'raised'."""
+        try:
+            winnan.rmtree(path, workers=workers, progress=progress)
+        except ValueError as err:
+            raised.append(err)
+
+    def test_errors_do_not_abort(self):  # pylint: disable=missing-docstring
+        make_tree(self.root, depth=1, width=2, files=1)
+        errors = []
+        real_unlink = os.unlink
+
+        def failing_unlink(path, *args, **kwargs):  # pylint: disable=missing-docstring
+            if path == "file0" and not errors:
+                errors.append(path)
+                raise OSError(13, "Permission denied", path)
+            return real_unlink(path, *args, **kwargs)
+
+        reported = []
+        os.unlink = failing_unlink
+        try:
+            winnan.rmtree(self.root, workers=1, onerror=lambda *args: reported.append(args))
+        finally:
+            os.unlink = real_unlink
+
+        if winnan.shutil_shim._HAVE_DIR_FD:  # pylint: disable=protected-access
+            # Only the directories containing the file that couldn't be unlinked are left behind.
+            self.assertEqual([failing_unlink], [args[0] for args in reported])
+            self.assertEqual(1, sum(len(files) for (_, _, files) in os.walk(self.root)))
+            self.assertTrue(os.path.isdir(self.root))
+
+
+class TestClone(unittest.TestCase):
+    """Unit tests for the winnan.clone() function."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+        self.src = os.path.join(self.root, "src")
+        self.dst = os.path.join(self.root, "dst")
+        self.data = os.urandom(3 * 1024 * 1024 + 17)
+
+        with open(self.src, "wb") as fileobj:
+            fileobj.write(self.data)
+
+    def assert_cloned(self, strategy):  # pylint: disable=missing-docstring
+        self.assertIn(strategy, (winnan.shutil_shim.CLONE, winnan.shutil_shim.COPY_FILE_RANGE,
+                                 winnan.shutil_shim.COPY))
+
+        with open(self.dst, "rb") as fileobj:
+            self.assertEqual(self.data, fileobj.read())
+
+    def test_clone(self):  # pylint: disable=missing-docstring
+        self.assert_cloned(winnan.clone(self.src, self.dst))
+
+    def test_same_file(self):  # pylint: disable=missing-docstring
+        # shutil.SameFileError is a subclass of shutil.Error.
+        with self.assertRaises(shutil.Error):
+            winnan.clone(self.src, self.src)
+
+        if hasattr(os, "link"):
+            os.link(self.src, self.dst)
+            with self.assertRaises(shutil.Error):
+                winnan.clone(self.src, self.dst)
+
+        with open(self.src, "rb") as fileobj:
+            self.assertEqual(self.data, fileobj.read())
+
+    def test_clone_overwrites(self):  # pylint: disable=missing-docstring
+        with open(self.dst, "wb") as fileobj:
+            fileobj.write(b"x" * (len(self.data) * 2))
+
+        self.assert_cloned(winnan.clone(self.src, self.dst))
+
+    def test_buffered_copy_fallback(self):  # pylint: disable=missing-docstring
+        with open(self.dst, "wb"):
+            pass
+
+        src_fd = os.open(self.src, os.O_RDONLY)
+        self.addCleanup(os.close, src_fd)
+        dst_fd = os.open(self.dst, os.O_WRONLY)
+        self.addCleanup(os.close, dst_fd)
+
+        winnan.shutil_shim._copy_fd(src_fd, dst_fd)  # pylint: disable=protected-access
+        self.assert_cloned(winnan.shutil_shim.COPY)
+
+    @unittest.skipUnless(os.path.exists("/proc/version"), "requires procfs")
+    def test_zero_size_source(self):  # pylint: disable=missing-docstring
+        # Files in procfs report a size of 0 despite having contents.
+        with open("/proc/version", "rb") as fileobj:
+            self.data = fileobj.read()
+
+        self.assert_cloned(winnan.clone("/proc/version", self.dst))
+
+    def test_missing_source(self):  # pylint: disable=missing-docstring
+        with self.assertRaises(OSError):
+            winnan.clone(os.path.join(self.root, "missing"), self.dst)
+
+        self.assertFalse(os.path.exists(self.dst))
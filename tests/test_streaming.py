@@ -0,0 +1,120 @@
+"""Unit tests for the winnan/streaming.py module."""
+
+from __future__ import absolute_import
+
+import errno
+import os
+import unittest
+
+import test.support
+
+from tests.context import winnan
+import winnan.streaming
+
+_WINDOW_SIZE = 64 * 1024
+
+
+class TestStreamingWriter(unittest.TestCase):
+    """Unit tests for the winnan.StreamingWriter class."""
+
+    def setUp(self):
+        self.addCleanup(test.support.unlink, test.support.TESTFN)
+
+    def record_calls(self, module, name, error=None):  # pylint: disable=missing-docstring
+        calls = []
+
+        def record(*args):  # pylint: disable=missing-docstring
+            calls.append(args)
+            if error is not None:
+                raise error
+
+        self.addCleanup(setattr, module, name, getattr(module, name))
+        setattr(module, name, record)
+        return calls
+
+    def write_windows(self, fileobj, count):  # pylint: disable=missing-docstring
+        chunk = b"x" * 4096
+        for _ in range(count * _WINDOW_SIZE // len(chunk)):
+            fileobj.write(chunk)
+
+    def test_write(self):  # pylint: disable=missing-docstring
+        with winnan.StreamingWriter(test.support.TESTFN, window_size=_WINDOW_SIZE) as fileobj:
+            self.assertEqual(test.support.TESTFN, fileobj.name)
+            self.write_windows(fileobj, 3)
+            fileobj.write(b"tail")
+
+        self.assertEqual(3, fileobj.windows_written)
+        self.assertTrue(fileobj.closed)
+
+        with open(test.support.TESTFN, "rb") as fileobj:
+            data = fileobj.read()
+
+        self.assertEqual(3 * _WINDOW_SIZE + 4, len(data))
+        self.assertTrue(data.endswith(b"xtail"))
+
+    def test_writeback_calls(self):  # pylint: disable=missing-docstring
+        syscalls = winnan._syscalls  # pylint: disable=protected-access
+        sync_file_range = self.record_calls(syscalls, "sync_file_range")
+        posix_fadvise = self.record_calls(syscalls, "posix_fadvise")
+
+        with winnan.StreamingWriter(test.support.TESTFN, window_size=_WINDOW_SIZE) as fileobj:
+            fd = fileobj.fileno()  # pylint: disable=invalid-name
+            self.write_windows(fileobj, 3)
+
+        wait_and_write = winnan.streaming._WAIT_AND_WRITE  # pylint: disable=protected-access
+        self.assertEqual([
+            (fd, 0, _WINDOW_SIZE, syscalls.SYNC_FILE_RANGE_WRITE),
+            (fd, _WINDOW_SIZE, _WINDOW_SIZE, syscalls.SYNC_FILE_RANGE_WRITE),
+            (fd, 0, _WINDOW_SIZE, wait_and_write),
+            (fd, 2 * _WINDOW_SIZE, _WINDOW_SIZE, syscalls.SYNC_FILE_RANGE_WRITE),
+            (fd, _WINDOW_SIZE, _WINDOW_SIZE, wait_and_write),
+        ], sync_file_range)
+
+        self.assertEqual([
+            (fd, 0, _WINDOW_SIZE, syscalls.POSIX_FADV_DONTNEED),
+            (fd, _WINDOW_SIZE, _WINDOW_SIZE, syscalls.POSIX_FADV_DONTNEED),
+        ], posix_fadvise)
+
+    def test_fallback_without_sync_file_range(self):  # pylint: disable=missing-docstring
+        syscalls = winnan._syscalls  # pylint: disable=protected-access
+        self.record_calls(syscalls, "sync_file_range", OSError(errno.ENOSYS, "not supported"))
+        posix_fadvise = self.record_calls(syscalls, "posix_fadvise")
+        fdatasync = self.record_calls(os, "fdatasync" if hasattr(os, "fdatasync") else "fsync")
+
+        with winnan.StreamingWriter(test.support.TESTFN, window_size=_WINDOW_SIZE) as fileobj:
+            self.write_windows(fileobj, 2)
+
+        self.assertEqual(2, len(fdatasync))
+        self.assertEqual(2, len(posix_fadvise))
+
+    def test_append(self):  # pylint: disable=missing-docstring
+        with open(test.support.TESTFN, "wb") as fileobj:
+            fileobj.write(b"head")
+
+        syscalls = winnan._syscalls  # pylint: disable=protected-access
+        sync_file_range = self.record_calls(syscalls, "sync_file_range")
+
+        with winnan.StreamingWriter(test.support.TESTFN, "ab", window_size=_WINDOW_SIZE) as fileobj:
+            fd = fileobj.fileno()  # pylint: disable=invalid-name
+            self.write_windows(fileobj, 1)
+
+        self.assertEqual([(fd, 4, _WINDOW_SIZE, syscalls.SYNC_FILE_RANGE_WRITE)], sync_file_range)
+
+    def test_unlink_while_open(self):  # pylint: disable=missing-docstring
+        with winnan.StreamingWriter(test.support.TESTFN, window_size=_WINDOW_SIZE) as fileobj:
+            os.unlink(test.support.TESTFN)
+            self.write_windows(fileobj, 2)
+
+        self.assertFalse(os.path.exists(test.support.TESTFN))
+
+    def test_invalid_arguments(self):  # pylint: disable=missing-docstring
+        for mode in ("w", "rb", "w+b"):
+            with self.assertRaises(ValueError):
+                winnan.StreamingWriter(test.support.TESTFN, mode)
+
+        with self.assertRaises(ValueError):
+            winnan.StreamingWriter(test.support.TESTFN, window_size=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
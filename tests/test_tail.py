@@ -0,0 +1,134 @@
+"""Unit tests for the winnan/tail.py module."""
+
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from tests.context import winnan
+from winnan import _inotify
+
+
+class FollowTestCase(unittest.TestCase):
+    """Unit tests for the winnan.follow() function."""
+
+    use_inotify = False
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.path = os.path.join(self.root, "app.log")
+
+    def follow(self, **kwargs):  # pylint: disable=missing-docstring
+        kwargs.setdefault("idle_timeout", 2)
+        generator = winnan.follow(self.path, poll_interval=0.01, use_inotify=self.use_inotify,
+                                  **kwargs)
+        self.addCleanup(generator.close)
+        return generator
+
+    def append(self, data, path=None):  # pylint: disable=missing-docstring
+        with open(path or self.path, "ab") as fileobj:
+            fileobj.write(data)
+
+    def append_later(self, data, delay=0.1):  # pylint: disable=missing-docstring
+        timer = threading.Timer(delay, self.append, [data])
+        timer.start()
+        self.addCleanup(timer.join)
+
+    def test_existing_lines(self):  # pylint: disable=missing-docstring
+        self.append(b"one\ntwo\nthr")
+        lines = self.follow()
+
+        self.assertEqual(b"one\n", next(lines))
+        self.assertEqual(b"two\n", next(lines))
+
+        self.append(b"ee\n")
+        self.assertEqual(b"three\n", next(lines))
+
+    def test_start_at_end(self):  # pylint: disable=missing-docstring
+        self.append(b"old\n")
+        lines = self.follow(start_at_end=True)
+
+        self.append_later(b"new\n")
+        self.assertEqual(b"new\n", next(lines))
+
+    def test_waits_for_appended_data(self):  # pylint: disable=missing-docstring
+        self.append(b"")
+        lines = self.follow()
+
+        self.append_later(b"late\n")
+        self.assertEqual(b"late\n", next(lines))
+
+    def test_waits_for_file_to_exist(self):  # pylint: disable=missing-docstring
+        lines = self.follow()
+
+        self.append_later(b"created\n")
+        self.assertEqual(b"created\n", next(lines))
+
+    def test_rotation_by_rename(self):  # pylint: disable=missing-docstring
+        self.append(b"first\n")
+        lines = self.follow()
+        self.assertEqual(b"first\n", next(lines))
+
+        self.append(b"last in old\npartial")
+        os.rename(self.path, self.path + ".1")
+        self.append(b"first in new\n")
+
+        self.assertEqual([b"last in old\n", b"partial", b"first in new\n"],
+                         [next(lines) for _ in range(3)])
+
+    def test_rotation_by_unlink(self):  # pylint: disable=missing-docstring
+        self.append(b"first\n")
+        lines = self.follow()
+        self.assertEqual(b"first\n", next(lines))
+
+        self.append(b"second\n")
+        os.unlink(self.path)
+        self.assertEqual(b"second\n", next(lines))
+
+        self.append_later(b"recreated\n")
+        self.assertEqual(b"recreated\n", next(lines))
+
+    def test_truncation(self):  # pylint: disable=missing-docstring
+        self.append(b"before truncation\n")
+        lines = self.follow()
+        self.assertEqual(b"before truncation\n", next(lines))
+
+        with open(self.path, "wb") as fileobj:
+            fileobj.write(b"after\n")
+
+        self.assertEqual(b"after\n", next(lines))
+
+    def test_idle_timeout(self):  # pylint: disable=missing-docstring
+        self.append(b"only\n")
+        self.assertEqual([b"only\n"], list(self.follow(idle_timeout=0.1)))
+
+    def test_idle_timeout_partial_line(self):  # pylint: disable=missing-docstring
+        self.append(b"one\ntwo")
+        self.assertEqual([b"one\n", b"two"], list(self.follow(idle_timeout=0.1)))
+
+
+@unittest.skipUnless(_inotify.is_supported(), "requires inotify")
+class InotifyFollowTestCase(FollowTestCase):
+    """Unit tests for the winnan.follow() function using inotify."""
+
+    use_inotify = True
+
+    def test_wakes_without_polling(self):  # pylint: disable=missing-docstring
+        self.append(b"")
+        lines = winnan.follow(self.path, poll_interval=60, use_inotify=True, idle_timeout=5)
+        self.addCleanup(lines.close)
+
+        start = time.time()
+        self.append(b"unrelated\n", os.path.join(self.root, "other.log"))
+        self.append_later(b"wanted\n")
+        self.assertEqual(b"wanted\n", next(lines))
+        self.assertLess(time.time() - start, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
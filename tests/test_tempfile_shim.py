@@ -0,0 +1,70 @@
+"""Unit tests for the winnan/tempfile_shim.py module."""
+
+from __future__ import absolute_import
+
+import os
+import unittest
+
+from tests.context import winnan
+import winnan.tempfile_shim
+
+
+class TestSpooledTemporaryFile(unittest.TestCase):
+    """Unit tests for the winnan.SpooledTemporaryFile class."""
+
+    def test_stays_in_memory(self):  # pylint: disable=missing-docstring
+        with winnan.SpooledTemporaryFile(max_size=10) as fileobj:
+            fileobj.write(b"0123456789")
+            self.assertFalse(fileobj._rolled)  # pylint: disable=protected-access
+            self.assertIsNone(fileobj.name)
+
+            fileobj.seek(0)
+            self.assertEqual(b"0123456789", fileobj.read())
+
+    def test_rolls_over_past_max_size(self):  # pylint: disable=missing-docstring
+        with winnan.SpooledTemporaryFile(max_size=10) as fileobj:
+            fileobj.write(b"0123456789")
+            fileobj.write(b"abc")
+            self.assertTrue(fileobj._rolled)  # pylint: disable=protected-access
+            self.assertEqual(13, fileobj.tell())
+
+            # The file doesn't have a directory entry.
+            self.assertEqual(0, os.fstat(fileobj.fileno()).st_nlink)
+
+            fileobj.seek(0)
+            self.assertEqual(b"0123456789abc", fileobj.read())
+
+    def test_text_mode(self):  # pylint: disable=missing-docstring
+        with winnan.SpooledTemporaryFile(max_size=10, mode="w+", encoding="utf-8") as fileobj:
+            fileobj.write(u"caf\xe9\n")
+            fileobj.rollover()
+            fileobj.write(u"bar\n")
+
+            fileobj.seek(0)
+            self.assertEqual([u"caf\xe9\n", u"bar\n"], list(fileobj))
+            self.assertEqual("w+", fileobj.mode)
+
+    def test_fileno_rolls_over(self):  # pylint: disable=missing-docstring
+        with winnan.SpooledTemporaryFile() as fileobj:
+            fileobj.write(b"data")
+            os.lseek(fileobj.fileno(), 0, os.SEEK_SET)
+            self.assertEqual(b"data", os.read(fileobj.fileno(), 10))
+
+    def test_memory_budget(self):  # pylint: disable=missing-docstring
+        winnan.tempfile_shim.set_memory_budget(15)
+        self.addCleanup(winnan.tempfile_shim.set_memory_budget, None)
+
+        with winnan.SpooledTemporaryFile(max_size=100) as fileobj1:
+            with winnan.SpooledTemporaryFile(max_size=100) as fileobj2:
+                fileobj1.write(b"x" * 10)
+                self.assertEqual(10, winnan.tempfile_shim.memory_in_use())
+
+                fileobj2.write(b"y" * 10)
+                self.assertTrue(fileobj2._rolled)  # pylint: disable=protected-access
+                self.assertFalse(fileobj1._rolled)  # pylint: disable=protected-access
+                self.assertEqual(10, winnan.tempfile_shim.memory_in_use())
+
+        self.assertEqual(0, winnan.tempfile_shim.memory_in_use())
+
+        with self.assertRaises(ValueError):
+            winnan.tempfile_shim.set_memory_budget(-1)
@@ -0,0 +1,164 @@
+"""Unit tests for the winnan/watcher.py module."""
+
+from __future__ import absolute_import
+
+import errno
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from tests.context import winnan
+from winnan import _inotify
+import winnan.watcher
+from winnan.watcher import CREATED, DELETED, MODIFIED, OVERFLOW, Event
+
+
+class WatcherTestCase(unittest.TestCase):
+    """Unit tests for the winnan.watch() function using periodic os.stat() calls."""
+
+    use_inotify = False
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def path(self, name):  # pylint: disable=missing-docstring
+        return os.path.join(self.root, name)
+
+    def write(self, name, data=b"data"):  # pylint: disable=missing-docstring
+        with open(self.path(name), "ab") as fileobj:
+            fileobj.write(data)
+
+    def watch(self, paths, **kwargs):  # pylint: disable=missing-docstring
+        kwargs.setdefault("debounce", 0.05)
+        watcher = winnan.watch(paths, use_inotify=self.use_inotify, poll_interval=0.02, **kwargs)
+        self.addCleanup(watcher.close)
+        return watcher
+
+    def settle(self):  # pylint: disable=missing-docstring
+        if not self.use_inotify:
+            # Modification times may have a coarse granularity, and a file modified within the same
+            # tick as the previous scan would look unchanged.
+            time.sleep(0.05)
+
+    def test_directory_events(self):  # pylint: disable=missing-docstring
+        self.write("existing")
+        watcher = self.watch(self.root)
+        self.settle()
+
+        self.write("new")
+        self.write("existing", b"more")
+        os.unlink(self.path("existing"))
+        self.write("new", b"more")
+
+        self.assertEqual(
+            sorted([Event(self.path("new"), CREATED), Event(self.path("existing"), DELETED)]),
+            sorted(watcher.read(timeout=5)))
+
+    def test_file_events(self):  # pylint: disable=missing-docstring
+        self.write("watched")
+        self.write("ignored")
+        watcher = self.watch([self.path("watched")])
+        self.settle()
+
+        self.write("ignored", b"more")
+        self.write("watched", b"more")
+
+        self.assertEqual([Event(self.path("watched"), MODIFIED)], watcher.read(timeout=5))
+        self.assertEqual([], watcher.read(timeout=0.1))
+
+    def test_recreated_file_is_modified(self):  # pylint: disable=missing-docstring
+        self.write("file")
+        watcher = self.watch(self.root, debounce=0.2)
+        self.settle()
+
+        os.unlink(self.path("file"))
+        self.write("file", b"replacement")
+
+        self.assertEqual([Event(self.path("file"), MODIFIED)], watcher.read(timeout=5))
+
+    def test_timeout(self):  # pylint: disable=missing-docstring
+        watcher = self.watch(self.root)
+
+        start = time.time()
+        self.assertEqual([], watcher.read(timeout=0.1))
+        self.assertGreaterEqual(time.time() - start, 0.09)
+
+    def test_overflow(self):  # pylint: disable=missing-docstring
+        watcher = self.watch(self.root, max_pending=3, debounce=0.2)
+        self.settle()
+
+        for i in range(10):
+            self.write("file%d" % i)
+
+        self.assertEqual([Event(None, OVERFLOW)], watcher.read(timeout=5))
+
+    def test_iterate(self):  # pylint: disable=missing-docstring
+        watcher = self.watch(self.root)
+        self.settle()
+        self.write("file")
+
+        for batch in watcher:
+            self.assertEqual([Event(self.path("file"), CREATED)], batch)
+            watcher.close()
+
+    def test_coalesce(self):  # pylint: disable=missing-docstring
+        watcher = winnan.watcher.Watcher(self.root, use_inotify=False)
+        self.addCleanup(watcher.close)
+
+        for (kinds, expected) in (((CREATED, MODIFIED, MODIFIED), CREATED),
+                                  ((MODIFIED, DELETED), DELETED),
+                                  ((DELETED, CREATED), MODIFIED),
+                                  ((CREATED, DELETED), None)):
+            for kind in kinds:
+                watcher._add("path", kind)  # pylint: disable=protected-access
+
+            batch = watcher._take()  # pylint: disable=protected-access
+            self.assertEqual([Event("path", expected)] if expected else [], batch)
+
+    def test_missing_directory(self):  # pylint: disable=missing-docstring
+        watcher = self.watch(self.path(os.path.join("later", "file")))
+        os.mkdir(self.path("later"))
+        self.write(os.path.join("later", "file"))
+        self.assertEqual([Event(self.path(os.path.join("later", "file")), CREATED)],
+                         watcher.read(timeout=5))
+
+
+@unittest.skipUnless(_inotify.is_supported(), "requires inotify")
+class InotifyWatcherTestCase(WatcherTestCase):
+    """Unit tests for the winnan.watch() function using inotify."""
+
+    use_inotify = True
+
+    def test_watches_directories(self):  # pylint: disable=missing-docstring
+        for i in range(100):
+            self.write("file%d" % i)
+
+        watcher = self.watch([self.path("file%d" % i) for i in range(100)])
+        self.assertEqual(1, len(watcher._backend._watches))  # pylint: disable=protected-access
+
+    def test_watch_limit(self):  # pylint: disable=missing-docstring
+        original = _inotify.Inotify.add_watch
+
+        def add_watch(inotify, path, mask):
+            if os.path.basename(path) == "limited":
+                raise OSError(errno.ENOSPC, "No space left on device")
+            return original(inotify, path, mask)
+
+        _inotify.Inotify.add_watch = add_watch
+        self.addCleanup(setattr, _inotify.Inotify, "add_watch", original)
+
+        os.mkdir(self.path("limited"))
+        watcher = self.watch([self.root, self.path("limited")])
+        self.write(os.path.join("limited", "file"))
+        self.write("file")
+        self.assertEqual(
+            sorted([Event(self.path(os.path.join("limited", "file")), CREATED),
+                    Event(self.path("file"), CREATED)]),
+            sorted(watcher.read(timeout=5)))
+
+
+if __name__ == "__main__":
+    unittest.main()
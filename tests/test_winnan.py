@@ -134,3 +134,74 @@ class BasicTestSuite(unittest.TestCase):
                     with winnan.open(fileno, mode, buffering=buffering, closefd=False) as fileobj2:
                         self.assertEqual(fileno, fileobj2.name)
                         self.assertEqual(fileno, fileobj2.fileno())
+
+
+class TryOpenTestSuite(unittest.TestCase):
+    """Unit tests for the winnan.try_open() and winnan.os_shim.try_open() functions."""
+
+    def setUp(self):
+        self.addCleanup(test.support.unlink, test.support.TESTFN)
+
+    def test_missing_file(self):  # pylint: disable=missing-docstring
+        self.assertIsNone(winnan.try_open(test.support.TESTFN, "r"))
+        self.assertIsNone(winnan.try_open(test.support.TESTFN, "rb", buffering=0))
+        self.assertIsNone(winnan.os_shim.try_open(test.support.TESTFN, os.O_RDONLY))
+        self.assertIsNone(
+            winnan.try_open(os.path.join(test.support.TESTFN, "child"), "w"))
+
+    def test_existing_file(self):  # pylint: disable=missing-docstring
+        with winnan.try_open(test.support.TESTFN, "x") as fileobj:
+            fileobj.write("data")
+            self.assertEqual(test.support.TESTFN, fileobj.name)
+
+        self.assertIsNone(winnan.try_open(test.support.TESTFN, "x"))
+        self.assertIsNone(
+            winnan.os_shim.try_open(test.support.TESTFN, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+
+        with winnan.try_open(test.support.TESTFN, "r") as fileobj:
+            self.assertEqual("data", fileobj.read())
+
+        fd = winnan.os_shim.try_open(test.support.TESTFN, os.O_RDONLY)  # pylint: disable=invalid-name
+        self.addCleanup(os.close, fd)
+        self.assertEqual(b"data", os.read(fd, 10))
+
+    def test_other_errors_raise(self):  # pylint: disable=missing-docstring
+        with self.assertRaises(ValueError):
+            winnan.try_open(test.support.TESTFN, "rw")
+
+        with open(test.support.TESTFN, "w"):
+            pass
+
+        # A path beneath a regular file can't exist and is therefore treated as a miss.
+        self.assertIsNone(winnan.try_open(os.path.join(test.support.TESTFN, "child"), "r"))
+        self.assertIsNone(winnan.try_open(os.path.join(test.support.TESTFN, "child"), "w"))
+
+        with self.assertRaises(OSError):
+            winnan.try_open(os.path.dirname(os.path.abspath(test.support.TESTFN)), "w")
+
+    @unittest.skipUnless(hasattr(os, "symlink"), "requires os.symlink()")
+    def test_symlink_loop_raises(self):  # pylint: disable=missing-docstring
+        os.symlink(test.support.TESTFN, test.support.TESTFN)
+        with self.assertRaises(OSError) as ctx:
+            winnan.os_shim.try_open(test.support.TESTFN, os.O_RDONLY)
+        self.assertEqual(errno.ELOOP, ctx.exception.errno)
+
+    def test_layered(self):  # pylint: disable=missing-docstring
+        self.assertIsNone(winnan.try_open(test.support.TESTFN, "rb", compression="gzip"))
+        self.assertIsNone(winnan.try_open(test.support.TESTFN, "rb", checksum="crc32"))
+
+        with winnan.try_open(test.support.TESTFN, "wb", compression="gzip", compresslevel=1,
+                             checksum="crc32") as fileobj:
+            fileobj.write(b"data")
+
+        with winnan.try_open(test.support.TESTFN, "rb", compression="gzip") as fileobj:
+            self.assertEqual(b"data", fileobj.read())
+        self.assertIsNone(winnan.try_open(test.support.TESTFN, "xb", compression="gzip"))
+
+    def test_custom_opener(self):  # pylint: disable=missing-docstring
+        def opener(file, flags, mode, share_flags):  # pylint: disable=redefined-builtin
+            return winnan.os_open(file, flags, mode=mode, share_flags=share_flags)
+
+        self.assertIsNone(winnan.try_open(test.support.TESTFN, "r", opener=opener))
+        with winnan.try_open(test.support.TESTFN, "w", opener=opener) as fileobj:
+            self.assertEqual(test.support.TESTFN, fileobj.name)
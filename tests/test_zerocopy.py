@@ -0,0 +1,165 @@
+"""Unit tests for the winnan/zerocopy.py module."""
+
+from __future__ import absolute_import
+
+import errno
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+from tests.context import winnan
+import winnan.zerocopy
+
+_DATA = bytes(bytearray(range(256))) * 4096
+
+
+class TestTransfer(unittest.TestCase):
+    """Unit tests for the winnan.transfer() function."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+        self.src = os.path.join(self.root, "src")
+        with open(self.src, "wb") as fileobj:
+            fileobj.write(_DATA)
+
+    def make_pipe(self):  # pylint: disable=missing-docstring
+        (read_fd, write_fd) = os.pipe()
+        self.addCleanup(os.close, read_fd)
+        self.addCleanup(os.close, write_fd)
+        return (read_fd, write_fd)
+
+    def read_all(self, read, expected_size):  # pylint: disable=missing-docstring
+        chunks = []
+        received = 0
+        while received < expected_size:
+            chunk = read(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            received += len(chunk)
+        return b"".join(chunks)
+
+    def transfer_in_thread(self, *args, **kwargs):  # pylint: disable=missing-docstring
+        result = []
+        thread = threading.Thread(
+            target=lambda: result.append(winnan.transfer(*args, **kwargs)))
+        thread.start()
+        self.addCleanup(thread.join)
+        return (thread, result)
+
+    def test_socket(self):  # pylint: disable=missing-docstring
+        (left, right) = socket.socketpair()
+        self.addCleanup(left.close)
+        self.addCleanup(right.close)
+
+        (thread, result) = self.transfer_in_thread(self.src, left, offset=10, count=500000)
+        data = self.read_all(right.recv, 500000)
+        thread.join()
+
+        self.assertEqual([500000], result)
+        self.assertEqual(_DATA[10:500010], data)
+
+    def test_pipe(self):  # pylint: disable=missing-docstring
+        (read_fd, write_fd) = self.make_pipe()
+
+        (thread, result) = self.transfer_in_thread(self.src, write_fd)
+        data = self.read_all(lambda size: os.read(read_fd, size), len(_DATA))
+        thread.join()
+
+        self.assertEqual([len(_DATA)], result)
+        self.assertEqual(_DATA, data)
+
+    def test_regular_file(self):  # pylint: disable=missing-docstring
+        dst = os.path.join(self.root, "dst")
+        with open(dst, "wb") as fileobj:
+            self.assertEqual(100, winnan.transfer(self.src, fileobj, offset=len(_DATA) - 100))
+
+        with open(dst, "rb") as fileobj:
+            self.assertEqual(_DATA[-100:], fileobj.read())
+
+    def test_file_object_position(self):  # pylint: disable=missing-docstring
+        (read_fd, write_fd) = self.make_pipe()
+
+        with winnan.open(self.src, "rb") as fileobj:
+            fileobj.seek(1000)
+            self.assertEqual(24, winnan.transfer(fileobj, write_fd, count=24))
+            self.assertEqual(1024, fileobj.tell())
+            self.assertEqual(_DATA[1024:1028], fileobj.read(4))
+
+        self.assertEqual(_DATA[1000:1024], os.read(read_fd, 100))
+
+    def test_buffered_fallback(self):  # pylint: disable=missing-docstring
+        (read_fd, write_fd) = self.make_pipe()
+
+        def unsupported(*args, **kwargs):  # pylint: disable=unused-argument,missing-docstring
+            raise OSError(errno.ENOSYS, "not supported")
+
+        syscalls = winnan._syscalls  # pylint: disable=protected-access
+        self.addCleanup(setattr, syscalls, "splice", syscalls.splice)
+        syscalls.splice = unsupported
+
+        (thread, result) = self.transfer_in_thread(self.src, write_fd, offset=5)
+        data = self.read_all(lambda size: os.read(read_fd, size), len(_DATA) - 5)
+        thread.join()
+
+        self.assertEqual([len(_DATA) - 5], result)
+        self.assertEqual(_DATA[5:], data)
+
+    def test_buffered_fallback_keeps_position(self):  # pylint: disable=missing-docstring
+        (read_fd, write_fd) = self.make_pipe()
+
+        def unsupported(*args, **kwargs):  # pylint: disable=unused-argument,missing-docstring
+            raise OSError(errno.ENOSYS, "not supported")
+
+        syscalls = winnan._syscalls  # pylint: disable=protected-access
+        self.addCleanup(setattr, syscalls, "splice", syscalls.splice)
+        syscalls.splice = unsupported
+
+        if hasattr(os, "preadv"):
+            # Older versions of Python call pread() through ctypes instead.
+            self.addCleanup(setattr, os, "preadv", os.preadv)  # pylint: disable=no-member
+            del os.preadv
+
+        src_fd = os.open(self.src, os.O_RDONLY)
+        self.addCleanup(os.close, src_fd)
+        os.lseek(src_fd, 10, os.SEEK_SET)
+
+        for has_pread in (syscalls.has_pread, lambda: False):
+            self.addCleanup(setattr, syscalls, "has_pread", syscalls.has_pread)
+            syscalls.has_pread = has_pread
+
+            self.assertEqual(24, winnan.transfer(src_fd, write_fd, offset=1000, count=24))
+            self.assertEqual(_DATA[1000:1024], os.read(read_fd, 100))
+            self.assertEqual(10, os.lseek(src_fd, 0, os.SEEK_CUR))
+
+    def test_non_blocking_timeout(self):  # pylint: disable=missing-docstring
+        (left, right) = socket.socketpair()
+        self.addCleanup(left.close)
+        self.addCleanup(right.close)
+        left.setblocking(False)
+
+        # Nobody reads from the other end, so the transfer stops once the socket buffers are full.
+        sent = winnan.transfer(self.src, left, timeout=0.05)
+        self.assertGreater(sent, 0)
+        self.assertLess(sent, len(_DATA))
+
+        right.setblocking(True)
+        self.assertEqual(_DATA[:sent], self.read_all(right.recv, sent))
+
+    def test_count_past_end(self):  # pylint: disable=missing-docstring
+        with open(os.path.join(self.root, "dst"), "wb") as fileobj:
+            self.assertEqual(len(_DATA), winnan.transfer(self.src, fileobj, count=2 * len(_DATA)))
+            self.assertEqual(0, winnan.transfer(self.src, fileobj, offset=len(_DATA)))
+
+    def test_invalid_count(self):  # pylint: disable=missing-docstring
+        with self.assertRaises(ValueError):
+            winnan.transfer(self.src, 1, count=-1)
+
+
+if __name__ == "__main__":
+    unittest.main()
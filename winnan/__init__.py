@@ -2,9 +2,29 @@
 
 from __future__ import absolute_import
 
+from winnan.budget import FdBudget
+from winnan.bufferpool import BufferPool
+from winnan.closer import DeferredCloser
+from winnan.deleter import schedule_delete
+from winnan.fdpass import recv_files, send_files
+from winnan.handlepool import HandlePool
 from winnan.flags import (FILE_SHARE_VALID_FLAGS, O_BINARY, O_CLOEXEC, O_NOINHERIT)
 from winnan.io_shim import open as io_open
+from winnan.io_shim import try_open
+from winnan.locking import lock_range
+from winnan.memfd import memfd_open
+from winnan import negative_cache
+from winnan.oneshot import read_bytes, read_text, readinto_all, write_bytes, write_text
 from winnan.os_shim import open as os_open
+from winnan.prefetcher import prefetch
+from winnan.read_cache import read_cached
+from winnan import registry
+from winnan.shutil_shim import clone, rmtree
+from winnan.streaming import StreamingWriter
+from winnan.tail import follow
+from winnan.tempfile_shim import SpooledTemporaryFile
+from winnan.watcher import watch
+from winnan.zerocopy import transfer
 
 try:
     from winnan._version import version as __version__
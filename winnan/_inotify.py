@@ -0,0 +1,135 @@
+"""Module that provides a minimal ctypes wrapper around the Linux inotify API.
+
+The inotify API is only used when it is available and callers are expected to fall back to polling
+otherwise. See is_supported().
+"""
+
+from __future__ import absolute_import
+
+import collections
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+
+# Constants from <sys/inotify.h>.
+IN_ACCESS = 0x00000001
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_MASK_ADD = 0x20000000
+IN_ISDIR = 0x40000000
+
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+Event = collections.namedtuple("Event", ["wd", "mask", "cookie", "name"])
+
+_LIBC = None
+
+
+def _libc():
+    """Returns the ctypes handle to the C library, loading it on first use."""
+    global _LIBC  # pylint: disable=global-statement
+
+    if _LIBC is None:
+        _LIBC = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+
+    return _LIBC
+
+
+def is_supported():
+    """Returns True if the inotify API is available on this platform."""
+    if not sys.platform.startswith("linux"):
+        return False
+
+    try:
+        return hasattr(_libc(), "inotify_init1")
+    except OSError:
+        return False
+
+
+def _check(result):
+    """Raises an OSError from errno if 'result' indicates the C function failed."""
+    if result < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+
+    return result
+
+
+class Inotify(object):
+    """Non-inheritable, non-blocking inotify instance."""
+
+    def __init__(self):
+        self._fd = _check(_libc().inotify_init1(IN_CLOEXEC | IN_NONBLOCK))
+
+    def fileno(self):
+        """Returns the file descriptor of the inotify instance."""
+        return self._fd
+
+    def add_watch(self, path, mask):
+        """Starts watching 'path' for the events in 'mask' and returns the watch descriptor."""
+        if not isinstance(path, bytes):
+            path = path.encode(sys.getfilesystemencoding())
+
+        return _check(_libc().inotify_add_watch(self._fd, path, mask))
+
+    def rm_watch(self, wd):  # pylint: disable=invalid-name
+        """Stops watching the watch descriptor 'wd', ignoring watches that are already gone."""
+        try:
+            _check(_libc().inotify_rm_watch(self._fd, wd))
+        except OSError as err:
+            if err.errno != errno.EINVAL:
+                raise
+
+    def read_events(self, timeout=None):
+        """Returns the list of pending events, waiting up to 'timeout' seconds for one to arrive."""
+        (readable, _, _) = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except OSError as err:
+            if err.errno == errno.EAGAIN:
+                return []
+            raise
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            (wd, mask, cookie, length) = _EVENT_HEADER.unpack_from(data, offset)  # pylint: disable=invalid-name
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            events.append(Event(wd, mask, cookie, os.fsdecode(name) if hasattr(os, "fsdecode")
+                                else name))
+
+        return events
+
+    def close(self):
+        """Closes the inotify instance, which removes all of its watches."""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
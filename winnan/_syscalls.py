@@ -0,0 +1,175 @@
+"""Module that provides ctypes wrappers around Linux system calls the os module doesn't expose.
+
+Each wrapper raises OSError with ENOSYS when the system call isn't available so callers can fall
+back to a portable implementation.
+"""
+
+from __future__ import absolute_import
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import sys
+
+# Constants from <fcntl.h>.
+POSIX_FADV_NORMAL = getattr(os, "POSIX_FADV_NORMAL", 0)
+POSIX_FADV_SEQUENTIAL = getattr(os, "POSIX_FADV_SEQUENTIAL", 2)
+POSIX_FADV_WILLNEED = getattr(os, "POSIX_FADV_WILLNEED", 3)
+POSIX_FADV_DONTNEED = getattr(os, "POSIX_FADV_DONTNEED", 4)
+
+SYNC_FILE_RANGE_WAIT_BEFORE = 1
+SYNC_FILE_RANGE_WRITE = 2
+SYNC_FILE_RANGE_WAIT_AFTER = 4
+
+_LIBC = None
+
+
+def _libc_function(name, argtypes, restype=ctypes.c_int):
+    """Returns the C library function 'name', or None if it isn't available on this platform."""
+    global _LIBC  # pylint: disable=global-statement
+
+    if not sys.platform.startswith("linux"):
+        return None
+
+    if _LIBC is None:
+        try:
+            _LIBC = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        except OSError:
+            return None
+
+    func = getattr(_LIBC, name, None)
+    if func is not None:
+        func.argtypes = argtypes
+        func.restype = restype
+
+    return func
+
+
+def _raise_enosys(name):
+    """Raises OSError with ENOSYS for the system call 'name'."""
+    raise OSError(errno.ENOSYS, "%s() is not supported on this platform" % name)
+
+
+def sync_file_range(fd, offset, nbytes, flags):  # pylint: disable=invalid-name
+    """Wrapper around the Linux sync_file_range() system call."""
+    func = _libc_function("sync_file_range",
+                          [ctypes.c_int, ctypes.c_int64, ctypes.c_int64, ctypes.c_uint])
+    if func is None:
+        _raise_enosys("sync_file_range")
+
+    if func(fd, offset, nbytes, flags) < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+
+
+def posix_fadvise(fd, offset, length, advice):  # pylint: disable=invalid-name
+    """Wrapper around os.posix_fadvise() that calls into libc directly on older versions of
+    Python.
+    """
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(fd, offset, length, advice)  # pylint: disable=no-member
+        return
+
+    func = _libc_function("posix_fadvise64",
+                          [ctypes.c_int, ctypes.c_int64, ctypes.c_int64, ctypes.c_int])
+    if func is None:
+        _raise_enosys("posix_fadvise")
+
+    # Unlike most functions, posix_fadvise() returns the error number rather than setting errno.
+    err = func(fd, offset, length, advice)
+    if err:
+        raise OSError(err, os.strerror(err))
+
+
+def readahead(fd, offset, count):  # pylint: disable=invalid-name
+    """Wrapper around the Linux readahead() system call."""
+    func = _libc_function("readahead", [ctypes.c_int, ctypes.c_int64, ctypes.c_size_t],
+                          restype=ctypes.c_ssize_t)
+    if func is None:
+        _raise_enosys("readahead")
+
+    if func(fd, offset, count) < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+
+
+def sendfile(out_fd, in_fd, offset, count):
+    """Wrapper around os.sendfile() that calls into libc directly on older versions of Python."""
+    if hasattr(os, "sendfile"):
+        return os.sendfile(out_fd, in_fd, offset, count)  # pylint: disable=no-member
+
+    func = _libc_function("sendfile64", [
+        ctypes.c_int, ctypes.c_int, ctypes.POINTER(ctypes.c_int64), ctypes.c_size_t
+    ], restype=ctypes.c_ssize_t)
+    if func is None:
+        _raise_enosys("sendfile")
+
+    result = func(out_fd, in_fd, ctypes.byref(ctypes.c_int64(offset)), count)
+    if result < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+
+    return result
+
+
+def splice(src, dst, count, offset_src=None):
+    """Wrapper around os.splice() that calls into libc directly on older versions of Python."""
+    if hasattr(os, "splice"):
+        return os.splice(src, dst, count, offset_src=offset_src)  # pylint: disable=no-member
+
+    func = _libc_function("splice", [
+        ctypes.c_int, ctypes.POINTER(ctypes.c_int64), ctypes.c_int,
+        ctypes.POINTER(ctypes.c_int64), ctypes.c_size_t, ctypes.c_uint
+    ], restype=ctypes.c_ssize_t)
+    if func is None:
+        _raise_enosys("splice")
+
+    off_in = None if offset_src is None else ctypes.byref(ctypes.c_int64(offset_src))
+    result = func(src, off_in, dst, None, count, 0)
+    if result < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+
+    return result
+
+
+def _pread_function():
+    """Returns the C library's pread() function, or None if it isn't available."""
+    return _libc_function("pread64", [ctypes.c_int, ctypes.c_void_p, ctypes.c_size_t,
+                                      ctypes.c_int64], restype=ctypes.c_ssize_t)
+
+
+def has_pread():
+    """Returns True if pread_into() is supported on this platform."""
+    return hasattr(os, "preadv") or _pread_function() is not None
+
+
+def pread_into(fd, buf, offset):  # pylint: disable=invalid-name
+    """Reads from 'fd' at 'offset' into the writable buffer 'buf' without changing the position of
+    'fd', and returns the number of bytes read. Uses os.preadv() when available and calls into libc
+    directly on older versions of Python.
+    """
+    if hasattr(os, "preadv"):
+        return os.preadv(fd, [buf], offset)  # pylint: disable=no-member
+
+    func = _pread_function()
+    if func is None:
+        _raise_enosys("pread")
+
+    size = len(buf)
+    if not size:
+        return 0
+
+    array = (ctypes.c_char * size).from_buffer(buf)
+    try:
+        while True:
+            result = func(fd, ctypes.addressof(array), size, offset)
+            if result >= 0:
+                return result
+
+            err = ctypes.get_errno()
+            if err != errno.EINTR:
+                raise OSError(err, os.strerror(err))
+    finally:
+        del array
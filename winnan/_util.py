@@ -0,0 +1,28 @@
+"""Module that provides small helpers shared by the other winnan modules."""
+
+from __future__ import absolute_import
+
+import os
+import sys
+
+
+def fspath(path):
+    """Returns the file system representation of 'path'."""
+    if sys.version_info >= (3, 6):
+        return os.fspath(path)  # pylint: disable=no-member
+    return path
+
+
+def byte_view(data):
+    """Returns a memoryview of 'data' indexed by byte."""
+    view = memoryview(data)
+    if view.itemsize != 1 or view.ndim != 1:
+        # The cast() method was added in Python 3.3.
+        view = view.cast("B")
+    return view
+
+
+def raw_of(fileobj):
+    """Returns the raw file object underneath 'fileobj'."""
+    fileobj = getattr(fileobj, "buffer", fileobj)
+    return getattr(fileobj, "raw", fileobj)
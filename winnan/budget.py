@@ -0,0 +1,205 @@
+"""Module that provides a budget for the number of file descriptors opened through winnan.
+
+When a FdBudget is installed, every winnan.os_shim.open() call must first obtain a slot from the
+budget, and the slot is returned when the file descriptor is closed through winnan.os_shim.close()
+or by closing the file object returned by winnan.open(). Depending on the policy, an open() that
+finds the budget exhausted waits for a slot, waits up to a timeout, or fails immediately with
+EMFILE. This turns a burst of opens into queueing rather than a cascade of EMFILE errors from the
+operating system.
+"""
+
+from __future__ import absolute_import
+
+import collections
+import errno
+import os
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    # The resource module isn't available on Windows.
+    resource = None  # pylint: disable=invalid-name
+
+import winnan.os_shim
+
+BLOCK = "block"
+TIMEOUT = "timeout"
+FAIL = "fail"
+
+BudgetStats = collections.namedtuple("BudgetStats",
+                                     ["limit", "in_use", "peak", "waiting", "rejected"])
+
+ACTIVE = None
+
+
+def raise_nofile_limit():
+    """Raises the soft RLIMIT_NOFILE limit to the hard limit and returns the new soft limit, or
+    returns None if the platform doesn't support resource limits.
+    """
+    if resource is None:
+        return None
+
+    (soft, hard) = resource.getrlimit(resource.RLIMIT_NOFILE)
+
+    if hard == resource.RLIM_INFINITY:
+        # macOS reports an infinite hard limit but refuses soft limits above OPEN_MAX.
+        hard = max(soft, 10240)
+
+    if soft != resource.RLIM_INFINITY and soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+            soft = hard
+        except (ValueError, OSError):
+            pass
+
+    return soft
+
+
+class FdBudget(object):  # pylint: disable=too-many-instance-attributes
+    """Counting semaphore that gates the file descriptors opened through winnan.
+
+    If 'limit' is None, it defaults to 90% of the soft RLIMIT_NOFILE limit, leaving headroom for
+    sockets and other file descriptors not opened through winnan. If 'raise_rlimit' is True, the
+    soft limit is first raised to the hard limit. The 'policy' must be one of BLOCK, TIMEOUT, or
+    FAIL, where TIMEOUT waits up to 'timeout' seconds.
+    """
+
+    def __init__(self, limit=None, policy=BLOCK, timeout=None, raise_rlimit=False):
+        if policy not in (BLOCK, TIMEOUT, FAIL):
+            raise ValueError("invalid policy: %r" % (policy, ))
+
+        if policy == TIMEOUT and timeout is None:
+            raise ValueError("the timeout policy requires a timeout")
+
+        nofile = raise_nofile_limit() if raise_rlimit else None
+        if limit is None:
+            if nofile is None and resource is not None:
+                nofile = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+            if nofile is None or nofile == getattr(resource, "RLIM_INFINITY", None):
+                raise ValueError("a limit is required on this platform")
+
+            limit = max(1, int(nofile * 0.9))
+
+        self.limit = limit
+        self.policy = policy
+        self.timeout = timeout
+
+        self._cond = threading.Condition(threading.Lock())
+        self._admitted = set()
+        self._reserved = 0
+        self._peak = 0
+        self._waiting = 0
+        self._rejected = 0
+
+    def _acquire(self, file):  # pylint: disable=redefined-builtin
+        """Reserves a slot according to the policy or raises OSError with EMFILE."""
+        with self._cond:
+            if self._in_use() >= self.limit and self.policy != FAIL:
+                deadline = None if self.policy == BLOCK else time.time() + self.timeout
+                self._waiting += 1
+                try:
+                    while self._in_use() >= self.limit:
+                        remaining = None if deadline is None else deadline - time.time()
+                        if remaining is not None and remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            if self._in_use() >= self.limit:
+                self._rejected += 1
+                raise OSError(errno.EMFILE, "File descriptor budget of %d exhausted" % self.limit,
+                              file)
+
+            self._reserved += 1
+            self._peak = max(self._peak, self._in_use())
+
+    def _in_use(self):
+        """Returns the number of slots taken. The lock must be held."""
+        return len(self._admitted) + self._reserved
+
+    def open_hook(self, next_open, file, flags, mode, share_flags):  # pylint: disable=redefined-builtin,too-many-arguments
+        """Hook for winnan.os_shim.add_open_hook() that gates open() behind the budget."""
+        self._acquire(file)
+
+        fd = None  # pylint: disable=invalid-name
+        try:
+            fd = next_open(file, flags, mode, share_flags)  # pylint: disable=invalid-name
+        finally:
+            with self._cond:
+                self._reserved -= 1
+                if fd is None:
+                    self._cond.notify()
+                else:
+                    self._admitted.add(fd)
+
+        return fd
+
+    def release(self, fd):  # pylint: disable=invalid-name
+        """Returns the slot held by 'fd'. Unknown file descriptors are ignored."""
+        with self._cond:
+            if fd in self._admitted:
+                self._admitted.discard(fd)
+                self._cond.notify()
+
+    def reconcile(self):
+        """Returns the slots held by file descriptors that were closed without notifying the budget,
+        such as by calling os.close() directly, and returns how many were reclaimed.
+        """
+        with self._cond:
+            admitted = list(self._admitted)
+
+        stale = []
+        for fd in admitted:  # pylint: disable=invalid-name
+            try:
+                os.fstat(fd)
+            except OSError as err:
+                if err.errno == errno.EBADF:
+                    stale.append(fd)
+
+        for fd in stale:  # pylint: disable=invalid-name
+            self.release(fd)
+
+        return len(stale)
+
+    def stats(self):
+        """Returns a BudgetStats instance describing the current usage of the budget."""
+        with self._cond:
+            return BudgetStats(self.limit, self._in_use(), self._peak, self._waiting,
+                               self._rejected)
+
+    @property
+    def in_use(self):
+        """The number of file descriptors currently counted against the budget."""
+        with self._cond:
+            return self._in_use()
+
+
+def install(budget):
+    """Gates every file descriptor opened through winnan behind 'budget' and returns it."""
+    global ACTIVE  # pylint: disable=global-statement
+
+    uninstall()
+    winnan.os_shim.add_open_hook(budget.open_hook)
+    winnan.os_shim.add_close_hook(budget.release)
+    ACTIVE = budget
+    return budget
+
+
+def uninstall():
+    """Removes the budget installed by install(), if any."""
+    global ACTIVE  # pylint: disable=global-statement
+
+    if ACTIVE is not None:
+        winnan.os_shim.remove_open_hook(ACTIVE.open_hook)
+        winnan.os_shim.remove_close_hook(ACTIVE.release)
+        ACTIVE = None
+
+
+def stats():
+    """Returns the BudgetStats of the installed FdBudget, or None if there isn't one."""
+    budget = ACTIVE
+    return budget.stats() if budget is not None else None
@@ -0,0 +1,556 @@
+"""Module that provides a process-wide pool of I/O buffers and the file objects that borrow them.
+
+The buffered file objects returned by io.open() each allocate their buffer when they are created and
+keep it until they are closed, so a process holding many mostly idle files also holds as many
+mostly idle buffers. The PooledBufferedReader and PooledBufferedWriter returned by
+winnan.open(..., buffer_pool=True) instead borrow a buffer from a BufferPool only while it holds
+data. A reader returns its buffer once the data in it has been consumed, and a writer returns its
+buffer when it is flushed.
+
+Buffers are pooled in power-of-two size classes. A BufferPool with a 'limit' never lets the buffers
+in use plus the buffers cached for reuse exceed 'limit' bytes. Once the limit is reached, the
+buffers borrowed the longest ago are reclaimed from files that aren't in the middle of an operation:
+a writer is flushed, and a reader moves the position of its file back to the first byte that wasn't
+read. A file object refused a buffer reads or writes directly to its raw file object instead.
+"""
+
+from __future__ import absolute_import
+
+import collections
+import errno
+import io
+import itertools
+import os
+import threading
+import weakref
+
+from winnan import _util
+
+PoolStats = collections.namedtuple(
+    "PoolStats", ["limit", "in_use", "peak", "cached", "hits", "misses", "rejected"])
+
+MIN_BUFFER_SIZE = 4 * 1024
+
+# Buffers larger than this are allocated for each request and never cached.
+MAX_POOLED_SIZE = 4 * 1024 * 1024
+
+DEFAULT_MAX_CACHED = 64 * 1024 * 1024
+
+# The most holders asked to give up their buffer for a single acquire() call.
+_MAX_RECLAIMS = 16
+
+
+def _size_class(size):
+    """Returns the size of the buffers pooled for a request of 'size' bytes."""
+    if size <= MIN_BUFFER_SIZE:
+        return MIN_BUFFER_SIZE
+    if size > MAX_POOLED_SIZE:
+        return size
+    return 1 << (size - 1).bit_length()
+
+
+class BufferPool(object):  # pylint: disable=too-many-instance-attributes
+    """Pool of bytearray buffers shared by the file objects opened with it.
+
+    At most 'limit' bytes of buffers are in use or cached at a time, unless it is None, and at most
+    'max_cached' bytes of released buffers are kept for reuse.
+    """
+
+    def __init__(self, limit=None, max_cached=DEFAULT_MAX_CACHED):
+        self.limit = limit
+        self.max_cached = max_cached
+
+        self._lock = threading.Lock()
+        self._free = collections.defaultdict(list)
+        # Maps id(holder) to a weak reference to each file object holding a buffer, in the order
+        # the buffers were borrowed.
+        self._holders = collections.OrderedDict()
+        self._in_use = 0
+        self._peak = 0
+        self._cached = 0
+        self._hits = 0
+        self._misses = 0
+        self._rejected = 0
+
+    def acquire(self, size, holder=None):
+        """Returns a buffer of at least 'size' bytes, or None if the pool's limit doesn't allow
+        for another one.
+
+        If 'holder' is specified, the pool may later call holder.reclaim() to ask for the buffer
+        back. The reclaim() method must return True if it released the buffer.
+        """
+        size = _size_class(size)
+        reclaimed = False
+        while True:
+            with self._lock:
+                free = self._free.get(size)
+                if free:
+                    buf = free.pop()
+                    self._cached -= size
+                    self._hits += 1
+                    self._borrow(size, holder)
+                    return buf
+
+                if self.limit is None or self._in_use + size <= self.limit:
+                    if self.limit is not None:
+                        self._evict(self.limit - self._in_use - size)
+                    self._misses += 1
+                    self._borrow(size, holder)
+                    break
+
+                if reclaimed or not self._holders:
+                    self._rejected += 1
+                    return None
+
+                holders = list(itertools.islice(self._holders.values(), _MAX_RECLAIMS))
+
+            # The holders are asked outside of the lock since reclaiming calls release().
+            reclaimed = True
+            for ref in holders:
+                other = ref()
+                if other is not None and other is not holder and other.reclaim():
+                    if self._in_use + size <= self.limit:
+                        break
+
+        return bytearray(size)
+
+    def _borrow(self, size, holder):
+        """Accounts for a buffer of 'size' bytes being lent to 'holder'."""
+        self._in_use += size
+        self._peak = max(self._peak, self._in_use)
+        if holder is not None:
+            self._holders[id(holder)] = weakref.ref(holder)
+
+    def release(self, buf, holder=None):
+        """Returns 'buf', which was acquired from the pool, to the pool."""
+        size = len(buf)
+        with self._lock:
+            self._in_use -= size
+            if holder is not None:
+                self._holders.pop(id(holder), None)
+
+            space = self.max_cached
+            if self.limit is not None:
+                space = min(space, self.limit - self._in_use)
+
+            if size <= MAX_POOLED_SIZE and self._cached + size <= space:
+                self._free[size].append(buf)
+                self._cached += size
+
+    def _evict(self, max_cached):
+        """Drops cached buffers, largest first, until at most 'max_cached' bytes are cached."""
+        for size in sorted(self._free, reverse=True):
+            free = self._free[size]
+            while free and self._cached > max_cached:
+                free.pop()
+                self._cached -= size
+
+    def trim(self):
+        """Drops all of the cached buffers."""
+        with self._lock:
+            self._free.clear()
+            self._cached = 0
+
+    def stats(self):
+        """Returns a PoolStats instance describing the current usage of the pool."""
+        with self._lock:
+            return PoolStats(self.limit, self._in_use, self._peak, self._cached, self._hits,
+                             self._misses, self._rejected)
+
+
+_DEFAULT_POOL = None
+_DEFAULT_POOL_LOCK = threading.Lock()
+
+
+def default_pool():
+    """Returns the BufferPool used by winnan.open(..., buffer_pool=True)."""
+    global _DEFAULT_POOL  # pylint: disable=global-statement
+
+    with _DEFAULT_POOL_LOCK:
+        if _DEFAULT_POOL is None:
+            _DEFAULT_POOL = BufferPool()
+
+        return _DEFAULT_POOL
+
+
+def set_limit(limit):
+    """Sets the limit, in bytes, of the default BufferPool. None removes the limit."""
+    pool = default_pool()
+    with pool._lock:  # pylint: disable=protected-access
+        pool.limit = limit
+        if limit is not None:
+            pool._evict(limit - pool._in_use)  # pylint: disable=protected-access
+
+
+def stats():
+    """Returns a PoolStats instance describing the current usage of the default BufferPool."""
+    return default_pool().stats()
+
+
+class _PooledBufferedBase(io.BufferedIOBase):
+    """Base class for the buffered file objects that borrow their buffer from a BufferPool."""
+
+    def __init__(self, raw, buffer_size, pool):
+        super(_PooledBufferedBase, self).__init__()
+        if buffer_size <= 0:
+            raise ValueError("invalid buffer size")
+
+        self._raw = raw
+        self.buffer_size = buffer_size
+        self._pool = pool
+        self._lock = threading.RLock()
+
+        # The borrowed buffer and a memoryview of it. The buffer isn't from the pool if
+        # '_pooled' is False.
+        self._buf = None
+        self._view = None
+        self._pooled = False
+
+    @property
+    def raw(self):  # pylint: disable=missing-docstring
+        return self._raw
+
+    def _dealloc_warn(self, source):
+        """Forwards to the raw file object, like the buffered objects of the io module."""
+        dealloc_warn = getattr(self._raw, "_dealloc_warn", None)
+        if dealloc_warn is not None:
+            dealloc_warn(source)
+
+    if hasattr(io.BufferedIOBase, "__del__"):
+        # The __del__() method of io.IOBase was added in Python 3.4.
+        def __del__(self):
+            if not self.closed:
+                self._dealloc_warn(self)
+            super(_PooledBufferedBase, self).__del__()
+
+    @property
+    def name(self):  # pylint: disable=missing-docstring
+        return self._raw.name
+
+    @property
+    def mode(self):  # pylint: disable=missing-docstring
+        return self._raw.mode
+
+    @property
+    def closed(self):  # pylint: disable=missing-docstring
+        return self._raw.closed
+
+    def fileno(self):
+        return self._raw.fileno()
+
+    def isatty(self):
+        return self._raw.isatty()
+
+    def readable(self):
+        return self._raw.readable()
+
+    def writable(self):
+        return self._raw.writable()
+
+    def seekable(self):
+        return self._raw.seekable()
+
+    def _check_closed(self):
+        if self._raw.closed:
+            raise ValueError("I/O operation on closed file")
+
+    def _acquire(self):
+        """Borrows a buffer from the pool. Returns False if the pool refused."""
+        buf = self._pool.acquire(self.buffer_size, self)
+        if buf is None:
+            return False
+
+        self._buf = buf
+        self._view = memoryview(buf)[:self.buffer_size]
+        self._pooled = True
+        return True
+
+    def _release(self):
+        """Returns the borrowed buffer, if any, to the pool."""
+        if self._buf is not None:
+            buf = self._buf
+            pooled = self._pooled
+            self._buf = None
+            self._view = None
+            self._pooled = False
+            if pooled:
+                self._pool.release(buf, self)
+
+    def reclaim(self):
+        """Returns the borrowed buffer to the pool unless the file object is in use by another
+        thread or can't give up its buffer. Returns True if the buffer was returned.
+        """
+        if not self._lock.acquire(False):
+            return False
+
+        try:
+            if self._raw.closed or not self._pooled:
+                return False
+            self.flush()
+            return self._buf is None
+        except (EnvironmentError, ValueError):
+            return False
+        finally:
+            self._lock.release()
+
+    def close(self):
+        with self._lock:
+            if self._raw.closed:
+                return
+
+            try:
+                self._release()
+            finally:
+                self._raw.close()
+
+
+class PooledBufferedReader(_PooledBufferedBase):
+    """Replacement for io.BufferedReader that borrows its buffer from 'pool' only while the buffer
+    holds data that hasn't been read yet. Calling flush() returns the buffer early by moving the
+    position of a seekable 'raw' back to the first byte that hasn't been read.
+    """
+
+    def __init__(self, raw, buffer_size=io.DEFAULT_BUFFER_SIZE, pool=None):
+        super(PooledBufferedReader, self).__init__(raw, buffer_size, pool or default_pool())
+        self._pos = 0
+        self._end = 0
+
+    def _fill(self):
+        """Reads the next chunk of the file into a buffer and returns its size. Returns None if
+        'raw' is non-blocking and has no data available.
+        """
+        self._release()
+        self._pos = self._end = 0
+
+        if self._acquire():
+            size = self._raw.readinto(self._view)
+        else:
+            # The chunk is only needed until it has been consumed, so it doesn't count towards the
+            # pool's limit while the file is idle.
+            data = self._raw.read(self.buffer_size)
+            size = None if data is None else len(data)
+            if size:
+                self._buf = data
+                self._view = memoryview(data)
+
+        if size:
+            self._end = size
+        else:
+            self._release()
+        return size
+
+    def _copy_buffered(self, view):
+        """Copies the buffered data into 'view' and returns the number of bytes copied."""
+        size = min(self._end - self._pos, len(view))
+        if size:
+            view[:size] = self._view[self._pos:self._pos + size]
+            self._pos += size
+            if self._pos == self._end:
+                self._release()
+        return size
+
+    def _readinto(self, b, read1):  # pylint: disable=invalid-name
+        """Implements readinto() and readinto1()."""
+        view = _util.byte_view(b)
+        with self._lock:
+            self._check_closed()
+            total = self._copy_buffered(view)
+            while total < len(view):
+                if read1 and total:
+                    break
+
+                if len(view) - total >= self.buffer_size:
+                    # Large reads go directly into the caller's buffer.
+                    size = self._raw.readinto(view[total:])
+                    if size and read1:
+                        total += size
+                        break
+                else:
+                    size = self._fill()
+                    if size:
+                        size = self._copy_buffered(view[total:])
+
+                if not size:
+                    if size is None and not total:
+                        return None
+                    break
+                total += size
+
+            return total
+
+    def readinto(self, b):  # pylint: disable=invalid-name
+        return self._readinto(b, read1=False)
+
+    def readinto1(self, b):  # pylint: disable=invalid-name
+        return self._readinto(b, read1=True)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            with self._lock:
+                self._check_closed()
+                chunks = []
+                if self._pos < self._end:
+                    chunks.append(self._view[self._pos:self._end].tobytes())
+                    self._release()
+                    self._pos = self._end = 0
+
+                data = self._raw.readall()
+                if data is None and not chunks:
+                    return None
+                chunks.append(data or b"")
+                return b"".join(chunks)
+
+        buf = bytearray(size)
+        size = self._readinto(buf, read1=False)
+        if size is None:
+            return None
+        del buf[size:]
+        return bytes(buf)
+
+    def read1(self, size=-1):
+        if size is None or size < 0:
+            size = self.buffer_size
+        buf = bytearray(size)
+        size = self._readinto(buf, read1=True)
+        if size is None:
+            return None
+        del buf[size:]
+        return bytes(buf)
+
+    def peek(self, size=0):  # pylint: disable=unused-argument
+        """Returns the buffered data without advancing the position, reading a chunk of the file
+        first if nothing is buffered.
+        """
+        with self._lock:
+            self._check_closed()
+            if self._pos == self._end:
+                self._fill()
+            return self._view[self._pos:self._end].tobytes() if self._buf is not None else b""
+
+    def readline(self, size=-1):
+        if size is None:
+            size = -1
+
+        with self._lock:
+            self._check_closed()
+            chunks = []
+            length = 0
+            while size < 0 or length < size:
+                if self._pos == self._end and not self._fill():
+                    break
+
+                end = self._end if size < 0 else min(self._end, self._pos + size - length)
+                newline = self._buf.find(b"\n", self._pos, end)
+                if newline >= 0:
+                    end = newline + 1
+
+                chunks.append(self._view[self._pos:end].tobytes())
+                length += end - self._pos
+                self._pos = end
+                if self._pos == self._end:
+                    self._release()
+                if newline >= 0:
+                    break
+
+            return b"".join(chunks)
+
+    def tell(self):
+        with self._lock:
+            return self._raw.tell() - (self._end - self._pos)
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        with self._lock:
+            self._check_closed()
+            if whence == io.SEEK_CUR:
+                pos -= self._end - self._pos
+            self._release()
+            self._pos = self._end = 0
+            return self._raw.seek(pos, whence)
+
+    def flush(self):
+        with self._lock:
+            if self._pos < self._end and self._raw.seekable():
+                self._raw.seek(self._pos - self._end, io.SEEK_CUR)
+                self._release()
+                self._pos = self._end = 0
+
+
+class PooledBufferedWriter(_PooledBufferedBase):
+    """Replacement for io.BufferedWriter that borrows its buffer from 'pool' when data is first
+    written to it and returns the buffer when it is flushed.
+    """
+
+    def __init__(self, raw, buffer_size=io.DEFAULT_BUFFER_SIZE, pool=None):
+        super(PooledBufferedWriter, self).__init__(raw, buffer_size, pool or default_pool())
+        self._len = 0
+
+    def _write_all(self, view):
+        """Writes all of 'view' to the raw file object."""
+        written = 0
+        while written < len(view):
+            size = self._raw.write(view[written:])
+            if size is None:
+                raise io.BlockingIOError(errno.EAGAIN, os.strerror(errno.EAGAIN), written)
+            written += size
+
+    def _flush_buffer(self):
+        """Writes the buffered data to the raw file object, keeping the buffer."""
+        if self._len:
+            self._write_all(self._view[:self._len])
+            self._len = 0
+
+    def write(self, b):  # pylint: disable=invalid-name
+        view = _util.byte_view(b)
+        size = len(view)
+        with self._lock:
+            self._check_closed()
+            if self._buf is not None and self._len + size > self.buffer_size:
+                self._flush_buffer()
+
+            if size >= self.buffer_size or (self._buf is None and not self._acquire()):
+                # Large writes, or writes the pool has no buffer for, go directly to the file.
+                self._write_all(view)
+                return size
+
+            self._view[self._len:self._len + size] = view
+            self._len += size
+            if self._len == self.buffer_size:
+                self._flush_buffer()
+
+            return size
+
+    def flush(self):
+        with self._lock:
+            self._check_closed()
+            try:
+                self._flush_buffer()
+            finally:
+                if not self._len:
+                    self._release()
+
+    def tell(self):
+        with self._lock:
+            return self._raw.tell() + self._len
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        with self._lock:
+            self.flush()
+            return self._raw.seek(pos, whence)
+
+    def truncate(self, pos=None):
+        with self._lock:
+            self.flush()
+            if pos is None:
+                pos = self._raw.tell()
+            return self._raw.truncate(pos)
+
+    def close(self):
+        with self._lock:
+            if self._raw.closed:
+                return
+
+            try:
+                self._flush_buffer()
+            finally:
+                self._release()
+                self._raw.close()
@@ -0,0 +1,130 @@
+"""Module that provides the checksumming file objects returned by winnan.open(..., checksum=...).
+
+The checksum is updated with each chunk of data as it passes between the buffered file object and
+the file descriptor, so computing it requires neither a second pass over the file nor copying the
+data. The buffered layer hands large reads and writes to the raw file object directly, and both
+hashlib and zlib release the GIL while processing buffers of more than a few kilobytes.
+
+Any algorithm supported by hashlib.new() can be used, as well as "crc32" and "adler32".
+"""
+
+from __future__ import absolute_import
+
+import hashlib
+import io
+import struct
+import zlib
+
+from winnan import _util
+
+CRC32 = "crc32"
+ADLER32 = "adler32"
+
+# Maps each checksum provided by the zlib module to its function and initial value.
+_ZLIB_CHECKSUMS = {CRC32: (zlib.crc32, 0), ADLER32: (zlib.adler32, 1)}
+
+
+class _ZlibChecksum(object):
+    """Checksum computed using zlib.crc32() or zlib.adler32() with the interface of a hashlib
+    object. The digest is the 32-bit value in big-endian byte order.
+    """
+
+    digest_size = 4
+    block_size = 1
+
+    def __init__(self, name, value=None):
+        self.name = name
+        (self._func, initial) = _ZLIB_CHECKSUMS[name]
+        self.value = initial if value is None else value
+
+    def update(self, data):  # pylint: disable=missing-docstring
+        self.value = self._func(data, self.value) & 0xffffffff
+
+    def copy(self):  # pylint: disable=missing-docstring
+        return _ZlibChecksum(self.name, self.value)
+
+    def digest(self):  # pylint: disable=missing-docstring
+        return struct.pack(">I", self.value)
+
+    def hexdigest(self):  # pylint: disable=missing-docstring
+        return "%08x" % (self.value, )
+
+
+def new(name):
+    """Returns a new hashlib-like object computing the checksum 'name'. Raises ValueError if the
+    checksum isn't supported.
+    """
+    name = name.lower()
+    if name in _ZLIB_CHECKSUMS:
+        return _ZlibChecksum(name)
+    return hashlib.new(name)
+
+
+class ChecksumFileIO(io.RawIOBase):
+    """Raw file object that updates 'checksum' with the data read from or written to 'raw'.
+
+    If 'expected' is specified as a hex digest, reaching the end of the file raises IOError unless
+    the data read matches it. The checksum only covers the data passing through the object, so the
+    file can't be seeked. Closing the ChecksumFileIO also closes 'raw'.
+    """
+
+    def __init__(self, raw, checksum, expected=None):
+        super(ChecksumFileIO, self).__init__()
+        self._raw = raw
+        self.checksum = checksum
+        self.expected = None if expected is None else expected.lower()
+        self.verified = False
+
+    @property
+    def name(self):  # pylint: disable=missing-docstring
+        return self._raw.name
+
+    @property
+    def mode(self):  # pylint: disable=missing-docstring
+        return self._raw.mode
+
+    def fileno(self):
+        return self._raw.fileno()
+
+    def isatty(self):
+        return self._raw.isatty()
+
+    def readable(self):
+        return self._raw.readable()
+
+    def writable(self):
+        return self._raw.writable()
+
+    def tell(self):
+        return self._raw.tell()
+
+    def readinto(self, b):  # pylint: disable=invalid-name
+        size = self._raw.readinto(b)
+        if size:
+            self.checksum.update(_util.byte_view(b)[:size])
+        elif size == 0 and len(b) and self.expected is not None and not self.verified:
+            self._verify()
+        return size
+
+    def _verify(self):
+        """Raises IOError if the checksum of the data read doesn't match the expected one."""
+        actual = self.checksum.hexdigest()
+        if actual != self.expected:
+            raise IOError("%s checksum mismatch for %r: expected %s, got %s"
+                          % (self.checksum.name, self.name, self.expected, actual))
+        self.verified = True
+
+    def write(self, data):
+        written = self._raw.write(data)
+        if written:
+            self.checksum.update(_util.byte_view(data)[:written])
+        return written
+
+    def close(self):
+        if self.closed:
+            return
+
+        try:
+            super(ChecksumFileIO, self).close()
+        finally:
+            self._raw.close()
@@ -0,0 +1,176 @@
+"""Module that provides closing file descriptors on a background thread.
+
+Closing a file descriptor can block for milliseconds on network file systems, and on Windows hosts
+where antivirus filters scan the file when its last handle is closed. A DeferredCloser hands the
+already-flushed file descriptors to a background thread so close() returns immediately. The file
+descriptors remain non-inheritable until they are actually closed.
+
+Note that an error reported by closing the file descriptor, such as a deferred write error on NFS,
+can't be raised to the caller. The most recent such error is available as
+DeferredCloser.last_error instead.
+"""
+
+from __future__ import absolute_import
+
+import os
+import threading
+import time
+import weakref
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue  # pylint: disable=import-error
+
+import winnan.os_shim
+
+_CLOSERS = weakref.WeakSet()
+
+
+def _after_fork_in_child():
+    """Restarts the DeferredCloser instances inherited by the child process."""
+    for closer in list(_CLOSERS):
+        closer._reset_after_fork()  # pylint: disable=protected-access
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)  # pylint: disable=no-member
+
+
+class DeferredCloser(object):
+    """Closes file descriptors on a background thread, with at most 'max_in_flight' of them waiting
+    to be closed at any point in time. Submitting another file descriptor while at the limit blocks
+    until one has been closed.
+    """
+
+    def __init__(self, max_in_flight=1024):
+        if max_in_flight < 1:
+            raise ValueError("invalid max_in_flight: %r" % (max_in_flight, ))
+
+        self.max_in_flight = max_in_flight
+        self.last_error = None
+        self._closed_count = 0
+        self._init_state()
+        _CLOSERS.add(self)
+
+    def _init_state(self):
+        """Creates the queue, the background thread's synchronization primitives, and the counters
+        of the file descriptors waiting to be closed.
+        """
+        self._pid = os.getpid()
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._queue = queue.Queue()
+        self._cond = threading.Condition(threading.Lock())
+        self._in_flight = 0
+        self._thread = None
+
+    def _reset_after_fork(self):
+        """Replaces the state inherited from the parent process, whose background thread doesn't
+        exist in the child process, and resubmits the child's copies of the pending file
+        descriptors.
+        """
+        # Only the thread that called fork() exists in the child process, so the queue can't be in
+        # use. Its locks may have been held by the background thread though, hence they're replaced.
+        pending = [fd for fd in list(self._queue.queue) if fd is not None]
+        self._init_state()
+        for fd in pending:  # pylint: disable=invalid-name
+            self.submit(fd)
+
+    def _check_fork(self):
+        """Resets the state if the process forked and os.register_at_fork() isn't available."""
+        if self._pid != os.getpid():
+            self._reset_after_fork()
+
+    @property
+    def in_flight(self):
+        """The number of file descriptors waiting to be closed."""
+        return self._in_flight
+
+    @property
+    def closed_count(self):
+        """The total number of file descriptors closed by the background thread."""
+        return self._closed_count
+
+    def submit(self, fd):  # pylint: disable=invalid-name
+        """Schedules 'fd' to be closed on the background thread."""
+        if not hasattr(os, "register_at_fork"):
+            self._check_fork()
+
+        self._slots.acquire()
+
+        with self._cond:
+            self._in_flight += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="winnan-deferred-closer")
+                self._thread.daemon = True
+                self._thread.start()
+
+        self._queue.put(fd)
+
+    def _run(self):
+        """Closes the submitted file descriptors until shutdown() is called."""
+        while True:
+            fd = self._queue.get()  # pylint: disable=invalid-name
+            if fd is None:
+                return
+
+            try:
+                winnan.os_shim.close(fd)
+            except OSError as err:
+                self.last_error = err
+            finally:
+                with self._cond:
+                    self._in_flight -= 1
+                    self._closed_count += 1
+                    if not self._in_flight:
+                        self._cond.notify_all()
+
+                self._slots.release()
+
+    def drain(self, timeout=None):
+        """Waits until every submitted file descriptor has been closed.
+
+        Returns False if 'timeout' seconds elapsed first and True otherwise.
+        """
+        if not hasattr(os, "register_at_fork"):
+            self._check_fork()
+
+        deadline = None if timeout is None else time.time() + timeout
+
+        with self._cond:
+            while self._in_flight:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+
+                self._cond.wait(remaining)
+
+            return True
+
+    def shutdown(self):
+        """Drains the pending file descriptors and stops the background thread."""
+        self.drain()
+
+        with self._cond:
+            thread = self._thread
+            self._thread = None
+
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+
+_DEFAULT_CLOSER = None
+_DEFAULT_CLOSER_LOCK = threading.Lock()
+
+
+def default_closer():
+    """Returns the DeferredCloser used by winnan.open(..., close_async=True)."""
+    global _DEFAULT_CLOSER  # pylint: disable=global-statement
+
+    with _DEFAULT_CLOSER_LOCK:
+        if _DEFAULT_CLOSER is None:
+            _DEFAULT_CLOSER = DeferredCloser()
+
+        return _DEFAULT_CLOSER
+
@@ -0,0 +1,479 @@
+"""Module that provides the compressed file objects returned by winnan.open(..., compression=...).
+
+Writing compresses the data in independent blocks on a shared pool of threads, in the style of
+pigz, since zlib, bz2, and lzma all release the GIL while compressing. For gzip, each block is
+compressed as raw deflate data primed with the last 32 KiB of the block before it, and the blocks
+are concatenated into a single gzip member. For bz2 and xz, each block becomes its own stream, which
+both formats allow to be concatenated.
+
+Reading decompresses the data on a background thread that stays a few chunks ahead of the caller,
+which overlaps reading and decompressing the file with whatever the caller does with the data.
+"""
+
+from __future__ import absolute_import
+
+import bz2
+import collections
+import io
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue  # pylint: disable=import-error
+
+try:
+    import lzma
+except ImportError:
+    # The lzma module was added in Python 3.3.
+    lzma = None  # pylint: disable=invalid-name
+
+GZIP = "gzip"
+BZ2 = "bz2"
+XZ = "xz"
+AUTO = "auto"
+
+_MAGIC_NUMBERS = ((b"\x1f\x8b", GZIP), (b"BZh", BZ2), (b"\xfd7zXZ\x00", XZ))
+
+_EXTENSIONS = {".gz": GZIP, ".bz2": BZ2, ".xz": XZ}
+
+_BLOCK_SIZES = {GZIP: 128 * 1024, BZ2: 900 * 1000, XZ: 4 * 1024 * 1024}
+
+# The defaults match those of the gzip, bz2, and lzma modules.
+_DEFAULT_LEVELS = {GZIP: 9, BZ2: 9, XZ: 6}
+
+_GZIP_WINDOW_SIZE = 32 * 1024
+
+_READ_SIZE = 256 * 1024
+_READ_AHEAD = 4
+
+# The most decompressed data handed to the reading thread at once, which bounds the memory used by
+# the chunks read ahead even for highly compressible data.
+_MAX_CHUNK_SIZE = 1024 * 1024
+
+
+def check(kind):
+    """Raises ValueError if 'kind' isn't a supported compression format."""
+    if kind not in (GZIP, BZ2, XZ, AUTO):
+        raise ValueError("invalid compression: %r" % (kind, ))
+
+    if kind == XZ and lzma is None:
+        raise ValueError("xz compression requires the lzma module")
+
+
+def detect(data):
+    """Returns the compression format whose magic number 'data' starts with, or None."""
+    for (magic, kind) in _MAGIC_NUMBERS:
+        if data.startswith(magic):
+            return kind
+    return None
+
+
+def from_filename(name):
+    """Returns the compression format implied by the extension of 'name', or None."""
+    if not isinstance(name, (str, type(u""))):
+        return None
+    return _EXTENSIONS.get(os.path.splitext(name)[1].lower())
+
+
+def _cpu_count():
+    """Returns the number of CPUs, defaulting to 1 if it can't be determined."""
+    count = getattr(os, "cpu_count", lambda: None)()
+    if count is None:
+        try:
+            import multiprocessing  # pylint: disable=import-outside-toplevel
+            count = multiprocessing.cpu_count()
+        except (ImportError, NotImplementedError):
+            count = 1
+    return count
+
+
+class _Job(object):
+    """Result of a function run on the _ThreadPool."""
+
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+        self._done = threading.Event()
+        self._result = None
+        self._error = None
+
+    def run(self):  # pylint: disable=missing-docstring
+        try:
+            self._result = self.func(*self.args)
+        except BaseException as err:  # pylint: disable=broad-except
+            self._error = err
+        finally:
+            self._done.set()
+
+    def result(self):
+        """Waits for the function to finish and returns its result or raises its exception."""
+        self._done.wait()
+        if self._error is not None:
+            raise self._error  # pylint: disable=raising-bad-type
+        return self._result
+
+
+class _ThreadPool(object):
+    """Pool of daemon threads shared by every compressing file object."""
+
+    def __init__(self, size):
+        self.size = size
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = 0
+
+    def submit(self, func, *args):
+        """Schedules func(*args) to run on one of the threads and returns a _Job."""
+        job = _Job(func, args)
+        if self.size <= 1:
+            # With a single CPU there's nothing to run in parallel with, and handing the job to
+            # another thread would only add context switches.
+            job.run()
+            return job
+
+        with self._lock:
+            if self._started < self.size:
+                thread = threading.Thread(target=self._run,
+                                          name="winnan-compress-%d" % self._started)
+                thread.daemon = True
+                thread.start()
+                self._started += 1
+
+        self._queue.put(job)
+        return job
+
+    def _run(self):
+        while True:
+            self._queue.get().run()
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def _pool():
+    """Returns the _ThreadPool used for compressing blocks, creating it on first use."""
+    global _POOL  # pylint: disable=global-statement
+
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = _ThreadPool(_cpu_count())
+        return _POOL
+
+
+def _compress_gzip_block(data, level, zdict, final):
+    """Compresses 'data' as raw deflate data, ending on a byte boundary unless 'final' is True."""
+    if zdict and sys.version_info >= (3, 3):
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, zlib.DEF_MEM_LEVEL,
+                                      zlib.Z_DEFAULT_STRATEGY, zdict)
+    else:
+        # The 'zdict' argument was added in Python 3.3. Without it, each block is compressed without
+        # the benefit of the data preceding it.
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if final else
+                                                        zlib.Z_SYNC_FLUSH)
+
+
+def _compress_bz2_block(data, level):  # pylint: disable=missing-docstring
+    return bz2.compress(data, level)
+
+
+def _compress_xz_block(data, level):  # pylint: disable=missing-docstring
+    return lzma.compress(data, preset=level)
+
+
+class CompressingWriter(io.RawIOBase):  # pylint: disable=too-many-instance-attributes
+    """Raw file object that compresses the data written to it before writing it to 'raw'.
+
+    At most two blocks per thread of the pool are compressed or waiting to be written at a time.
+    Closing the CompressingWriter also closes 'raw'.
+    """
+
+    def __init__(self, raw, kind, level=None, block_size=None):
+        super(CompressingWriter, self).__init__()
+
+        if kind == AUTO:
+            kind = from_filename(getattr(raw, "name", None))
+            if kind is None:
+                raise ValueError("can't infer the compression from %r" % (raw.name, ))
+
+        check(kind)
+
+        self._raw = raw
+        self.kind = kind
+        self.level = _DEFAULT_LEVELS[kind] if level is None else level
+        self.block_size = block_size or _BLOCK_SIZES[kind]
+
+        self._block = bytearray()
+        self._pending = collections.deque()
+        self._max_pending = 2 * _pool().size
+        self._blocks_submitted = 0
+
+        # State of the gzip member being written.
+        self._crc = 0
+        self._size = 0
+        self._zdict = b""
+
+    @property
+    def name(self):  # pylint: disable=missing-docstring
+        return self._raw.name
+
+    @property
+    def mode(self):  # pylint: disable=missing-docstring
+        return self._raw.mode
+
+    def fileno(self):
+        return self._raw.fileno()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._check_closed()
+        self._block += data
+        while len(self._block) >= self.block_size:
+            block = bytes(self._block[:self.block_size])
+            del self._block[:self.block_size]
+            self._submit(block, final=False)
+
+        return len(data)
+
+    def _check_closed(self):
+        if self.closed:
+            raise ValueError("I/O operation on closed file")
+
+    def _submit(self, block, final):
+        """Schedules 'block' to be compressed and writes out the blocks compressed so far."""
+        if self.kind == GZIP:
+            if not self._blocks_submitted:
+                self._write_all(b"\x1f\x8b\x08\x00" + struct.pack("<I", int(time.time()))
+                                + b"\x00\xff")
+
+            self._crc = zlib.crc32(block, self._crc)
+            self._size += len(block)
+            job = _pool().submit(_compress_gzip_block, block, self.level, self._zdict, final)
+            if len(block) >= _GZIP_WINDOW_SIZE:
+                self._zdict = block[-_GZIP_WINDOW_SIZE:]
+            else:
+                self._zdict = (self._zdict + block)[-_GZIP_WINDOW_SIZE:]
+        elif self.kind == BZ2:
+            job = _pool().submit(_compress_bz2_block, block, self.level)
+        else:
+            job = _pool().submit(_compress_xz_block, block, self.level)
+
+        self._blocks_submitted += 1
+        self._pending.append(job)
+
+        while len(self._pending) >= self._max_pending:
+            self._write_all(self._pending.popleft().result())
+
+    def _write_all(self, data):
+        """Writes all of 'data' to the underlying file."""
+        view = memoryview(data)
+        while view:
+            view = view[self._raw.write(view):]
+
+    def close(self):
+        if self.closed:
+            return
+
+        try:
+            if self.kind == GZIP or self._block or not self._blocks_submitted:
+                self._submit(bytes(self._block), final=True)
+                del self._block[:]
+
+            while self._pending:
+                self._write_all(self._pending.popleft().result())
+
+            if self.kind == GZIP:
+                self._write_all(struct.pack("<II", self._crc & 0xffffffff,
+                                            self._size & 0xffffffff))
+        finally:
+            try:
+                super(CompressingWriter, self).close()
+            finally:
+                self._raw.close()
+
+
+def _new_decompressor(kind):
+    """Returns a decompressor for a single stream or member of the 'kind' format."""
+    if kind == GZIP:
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if kind == BZ2:
+        return bz2.BZ2Decompressor()
+    return lzma.LZMADecompressor()
+
+
+def _is_finished(decompressor):
+    """Returns True if 'decompressor' reached the end of its stream. Without the 'eof' attribute,
+    e.g. for zlib on Python 2, this is only known once data follows the stream.
+    """
+    return getattr(decompressor, "eof", bool(decompressor.unused_data))
+
+
+def _decompress(kind, decompressor, data):
+    """Yields the output of decompressing 'data' in chunks of at most _MAX_CHUNK_SIZE bytes, or as
+    a single chunk where the decompressor can't limit its output.
+    """
+    if kind == GZIP:
+        while True:
+            output = decompressor.decompress(data, _MAX_CHUNK_SIZE)
+            if output:
+                yield output
+            # The data following the end of the stream is also left in 'unconsumed_tail'.
+            data = decompressor.unconsumed_tail
+            if _is_finished(decompressor) or (not data and len(output) < _MAX_CHUNK_SIZE):
+                return
+    elif hasattr(decompressor, "needs_input"):
+        # The 'max_length' argument of the bz2 and lzma decompressors was added in Python 3.5.
+        while True:
+            output = decompressor.decompress(data, _MAX_CHUNK_SIZE)
+            data = b""
+            if output:
+                yield output
+            if decompressor.eof or decompressor.needs_input:
+                return
+    else:
+        yield decompressor.decompress(data)
+
+
+class DecompressingReader(io.RawIOBase):  # pylint: disable=too-many-instance-attributes
+    """Raw file object that returns the decompressed contents of 'raw'.
+
+    The data is decompressed on a background thread that stays up to 'read_ahead' chunks ahead of
+    the caller. With AUTO, the format is detected from the magic number at the start of the file,
+    and a file that doesn't start with a known magic number is returned as is. Concatenated streams
+    are decompressed one after the other. Closing the DecompressingReader also closes 'raw'.
+    """
+
+    def __init__(self, raw, kind, read_ahead=_READ_AHEAD):
+        super(DecompressingReader, self).__init__()
+        check(kind)
+
+        self._raw = raw
+        self.kind = kind
+        self._chunks = queue.Queue(read_ahead)
+        self._current = b""
+        self._offset = 0
+        self._eof = False
+        self._thread = None
+        self._stopping = False
+
+    @property
+    def name(self):  # pylint: disable=missing-docstring
+        return self._raw.name
+
+    @property
+    def mode(self):  # pylint: disable=missing-docstring
+        return self._raw.mode
+
+    def fileno(self):
+        return self._raw.fileno()
+
+    def readable(self):
+        return True
+
+    def _put(self, item):
+        """Hands 'item' to the reading thread unless close() is called first."""
+        while not self._stopping:
+            try:
+                self._chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _run(self):
+        """Reads and decompresses the file until the end is reached or close() is called."""
+        try:
+            kind = self.kind
+            decompressor = None
+            data = self._raw.read(_READ_SIZE)
+
+            if kind == AUTO:
+                kind = detect(data)
+                if kind == XZ and lzma is None:
+                    raise ValueError("xz compression requires the lzma module")
+
+            while data:
+                if kind is None:
+                    if not self._put(data):
+                        return
+                    data = b""
+
+                while data:
+                    if decompressor is not None and _is_finished(decompressor):
+                        # Another stream or gzip member follows the one that just ended. Like the
+                        # gzip module, the zero bytes padding the end of a gzip file are skipped.
+                        if kind == GZIP:
+                            data = data.lstrip(b"\0")
+                            if not data:
+                                break
+                        decompressor = None
+
+                    if decompressor is None:
+                        decompressor = _new_decompressor(kind)
+
+                    for output in _decompress(kind, decompressor, data):
+                        if not self._put(output):
+                            return
+
+                    data = decompressor.unused_data if _is_finished(decompressor) else b""
+
+                data = self._raw.read(_READ_SIZE)
+
+            if decompressor is not None and not getattr(decompressor, "eof", True):
+                raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+
+            self._put(None)
+        except Exception as err:  # pylint: disable=broad-except
+            self._put(err)
+
+    def readinto(self, b):  # pylint: disable=invalid-name
+        if self.closed:
+            raise ValueError("I/O operation on closed file")
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="winnan-decompress")
+            self._thread.daemon = True
+            self._thread.start()
+
+        while self._offset >= len(self._current):
+            if self._eof:
+                return 0
+
+            item = self._chunks.get()
+            if item is None:
+                self._eof = True
+                return 0
+            if isinstance(item, Exception):
+                self._eof = True
+                raise item
+
+            self._current = item
+            self._offset = 0
+
+        view = memoryview(b)
+        size = min(len(view), len(self._current) - self._offset)
+        view[:size] = self._current[self._offset:self._offset + size]
+        self._offset += size
+        return size
+
+    def close(self):
+        if self.closed:
+            return
+
+        self._stopping = True
+        try:
+            if self._thread is not None:
+                self._thread.join()
+            super(DecompressingReader, self).close()
+        finally:
+            self._raw.close()
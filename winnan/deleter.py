@@ -0,0 +1,297 @@
+"""Module that provides unlinking files on a background thread.
+
+Files opened through winnan can be unlinked while they are still open, but unlinking them inline
+still costs a metadata operation on the calling thread. A DeletionQueue batches the unlinks and
+performs them on a background thread, grouping the paths by their directory so each directory is
+only resolved once per batch.
+
+On Windows, unlinking a file fails with a sharing violation if another process opened it without
+FILE_SHARE_DELETE, and fails with access denied while the file is already pending deletion. Both
+are retried with exponential backoff.
+"""
+
+from __future__ import absolute_import
+
+import collections
+import errno
+import heapq
+import itertools
+import os
+import sys
+import threading
+import time
+import weakref
+
+import winnan.flags
+
+DeletionStats = collections.namedtuple(
+    "DeletionStats", ["depth", "deleted", "failed", "retries", "throughput"])
+
+_HAVE_DIR_FD = (getattr(os, "supports_dir_fd", None) is not None
+                and {os.open, os.unlink} <= os.supports_dir_fd)  # pylint: disable=no-member
+
+_DIR_FLAGS = os.O_RDONLY | getattr(os, "O_DIRECTORY", 0) | winnan.flags.O_CLOEXEC
+
+if sys.platform in ("win32", "cygwin"):
+    import winerror  # pylint: disable=import-error
+
+    _RETRY_WINERRORS = frozenset([winerror.ERROR_ACCESS_DENIED, winerror.ERROR_SHARING_VIOLATION])
+else:
+    _RETRY_WINERRORS = frozenset()
+
+
+# The throughput reported by DeletionQueue.stats() is the rate over this many seconds.
+_THROUGHPUT_WINDOW = 10.0
+
+_QUEUES = weakref.WeakSet()
+
+
+def _after_fork_in_child():
+    """Resets the DeletionQueue instances inherited by the child process."""
+    for deletion_queue in list(_QUEUES):
+        deletion_queue._init_state()  # pylint: disable=protected-access
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)  # pylint: disable=no-member
+
+
+def _should_retry(err):
+    """Returns True if the unlink() may succeed once other handles to the file are closed."""
+    return getattr(err, "winerror", None) in _RETRY_WINERRORS
+
+
+class DeletionQueue(object):  # pylint: disable=too-many-instance-attributes
+    """Unlinks scheduled paths on a background thread in batches of at most 'batch_size' paths.
+
+    A path that can't be unlinked yet is retried up to 'max_retries' times, waiting 'backoff'
+    seconds before the first retry and doubling the wait each time after.
+
+    A child process created by fork() starts with an empty queue. The paths scheduled by the parent
+    process are only unlinked by the parent.
+    """
+
+    def __init__(self, batch_size=256, max_retries=8, backoff=0.05):
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._init_state()
+        _QUEUES.add(self)
+
+    def _init_state(self):
+        """Creates the queue and the background thread's synchronization primitives, and resets
+        the statistics. Called again in a child process because the background thread doesn't
+        exist there.
+        """
+        self.last_error = None
+
+        self._pid = os.getpid()
+        self._cond = threading.Condition(threading.Lock())
+        self._pending = collections.deque()
+        self._retrying = []
+        self._sequence = itertools.count()
+        self._in_progress = 0
+        self._thread = None
+        self._stopping = False
+
+        self._started_at = None
+        self._deleted = 0
+        self._failed = 0
+        self._retries = 0
+        # The (time, count) pairs of the paths unlinked within the last _THROUGHPUT_WINDOW seconds.
+        self._recent = collections.deque()
+
+    def schedule(self, path):
+        """Schedules 'path' to be unlinked on the background thread. A relative 'path' is resolved
+        against the current working directory at the time of the call.
+        """
+        if sys.version_info >= (3, 6):
+            path = os.fspath(path)  # pylint: disable=no-member
+        path = os.path.abspath(path)
+        self._check_fork()
+
+        with self._cond:
+            if self._started_at is None:
+                self._started_at = time.time()
+
+            self._pending.append((path, 0))
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="winnan-deleter")
+                self._thread.daemon = True
+                self._thread.start()
+
+            # flush() waits on the same condition variable, so we must wake every waiter to be sure
+            # the background thread is among them.
+            self._cond.notify_all()
+
+    def _check_fork(self):
+        """Resets the state if the process forked and os.register_at_fork() isn't available."""
+        if not hasattr(os, "register_at_fork") and self._pid != os.getpid():
+            self._init_state()
+
+    def _next_batch(self):
+        """Waits for paths that are ready to be unlinked and returns up to 'batch_size' of them.
+        Returns None once the queue is stopping and empty. The lock must be held.
+        """
+        while True:
+            now = time.time()
+            while self._retrying and self._retrying[0][0] <= now:
+                (_, _, path, attempt) = heapq.heappop(self._retrying)
+                self._pending.append((path, attempt))
+
+            if self._pending:
+                count = min(self.batch_size, len(self._pending))
+                batch = [self._pending.popleft() for _ in range(count)]
+                self._in_progress = len(batch)
+                return batch
+
+            if self._stopping and not self._retrying:
+                return None
+
+            timeout = self._retrying[0][0] - now if self._retrying else None
+            self._cond.wait(timeout)
+
+    def _run(self):
+        """Unlinks batches of paths until shutdown() is called."""
+        while True:
+            with self._cond:
+                batch = self._next_batch()
+
+            if batch is None:
+                return
+
+            deleted_before = self._deleted
+            by_directory = collections.defaultdict(list)
+            for (path, attempt) in batch:
+                (directory, name) = os.path.split(path)
+                by_directory[directory].append((name, path, attempt))
+
+            for (directory, entries) in by_directory.items():
+                self._unlink_entries(directory, entries)
+
+            with self._cond:
+                self._in_progress = 0
+                self._record_deleted(self._deleted - deleted_before)
+                self._cond.notify_all()
+
+    def _record_deleted(self, count):
+        """Records that 'count' paths were just unlinked. The lock must be held."""
+        now = time.time()
+        if count:
+            self._recent.append((now, count))
+
+        while self._recent and self._recent[0][0] <= now - _THROUGHPUT_WINDOW:
+            self._recent.popleft()
+
+    def _unlink_entries(self, directory, entries):
+        """Unlinks each (name, path, attempt) entry contained in 'directory'."""
+        dir_fd = None
+        if _HAVE_DIR_FD and len(entries) > 1:
+            try:
+                dir_fd = os.open(directory or os.curdir, _DIR_FLAGS)
+            except OSError:
+                # We report the error for each of the paths by unlinking them individually.
+                pass
+
+        try:
+            for (name, path, attempt) in entries:
+                try:
+                    if dir_fd is not None:
+                        os.unlink(name, dir_fd=dir_fd)
+                    else:
+                        os.unlink(path)
+                except OSError as err:
+                    self._handle_error(err, path, attempt)
+                else:
+                    with self._cond:
+                        self._deleted += 1
+        finally:
+            if dir_fd is not None:
+                os.close(dir_fd)
+
+    def _handle_error(self, err, path, attempt):
+        """Records the failure to unlink 'path' or schedules it to be retried."""
+        with self._cond:
+            if err.errno == errno.ENOENT:
+                # Someone else already removed the file.
+                self._deleted += 1
+            elif _should_retry(err) and attempt < self.max_retries:
+                self._retries += 1
+                ready_at = time.time() + self.backoff * 2**attempt
+                heapq.heappush(self._retrying,
+                               (ready_at, next(self._sequence), path, attempt + 1))
+            else:
+                self._failed += 1
+                self.last_error = err
+
+    def depth(self):
+        """Returns the number of paths waiting to be unlinked, including those being retried."""
+        with self._cond:
+            return len(self._pending) + len(self._retrying) + self._in_progress
+
+    def stats(self):
+        """Returns a DeletionStats instance. The throughput is the number of paths unlinked per
+        second over the last 10 seconds, or since the first path was scheduled if that was more
+        recent.
+        """
+        with self._cond:
+            self._record_deleted(0)
+            depth = len(self._pending) + len(self._retrying) + self._in_progress
+            now = time.time()
+            elapsed = min(now - self._started_at, _THROUGHPUT_WINDOW) if self._started_at else 0
+            recent = sum(count for (_, count) in self._recent)
+            throughput = recent / elapsed if elapsed > 0 else 0.0
+            return DeletionStats(depth, self._deleted, self._failed, self._retries, throughput)
+
+    def flush(self, timeout=None):
+        """Waits until every scheduled path has been unlinked or has failed.
+
+        Returns False if 'timeout' seconds elapsed first and True otherwise.
+        """
+        self._check_fork()
+        deadline = None if timeout is None else time.time() + timeout
+
+        with self._cond:
+            while self._pending or self._retrying or self._in_progress:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+
+                self._cond.wait(remaining)
+
+            return True
+
+    def shutdown(self):
+        """Flushes the scheduled paths and stops the background thread."""
+        with self._cond:
+            self._stopping = True
+            thread = self._thread
+            self._cond.notify_all()
+
+        if thread is not None:
+            thread.join()
+
+        with self._cond:
+            self._thread = None
+            self._stopping = False
+
+
+_DEFAULT_QUEUE = None
+_DEFAULT_QUEUE_LOCK = threading.Lock()
+
+
+def default_queue():
+    """Returns the DeletionQueue used by winnan.schedule_delete()."""
+    global _DEFAULT_QUEUE  # pylint: disable=global-statement
+
+    with _DEFAULT_QUEUE_LOCK:
+        if _DEFAULT_QUEUE is None:
+            _DEFAULT_QUEUE = DeletionQueue()
+
+        return _DEFAULT_QUEUE
+
+
+def schedule_delete(path):
+    """Schedules 'path' to be unlinked by the default DeletionQueue on a background thread."""
+    default_queue().schedule(path)
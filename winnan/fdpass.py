@@ -0,0 +1,334 @@
+"""Module that provides passing open files to other processes over Unix domain sockets.
+
+The file descriptors are sent as SCM_RIGHTS ancillary data along with a description of each file
+object, which the receiving process uses to rebuild a matching file object with winnan.open(). The
+received file descriptor refers to the same open file description as the sender's, so the two
+processes share the file's position. Processes reading the same file concurrently should therefore
+use winnan.readinto_all(), which doesn't depend on the position. The descriptors are received with
+MSG_CMSG_CLOEXEC where available and are otherwise made non-inheritable immediately.
+
+A SharedFile can be passed as an argument to a task submitted to a ProcessPoolExecutor. Unpickling
+it in the worker process fetches the file descriptor from the process that pickled it.
+
+Passing file descriptors requires socket.sendmsg() and socket.recvmsg(), which were added in Python
+3.3 and aren't available on Windows.
+"""
+
+from __future__ import absolute_import
+
+import array
+import atexit
+import binascii
+import errno
+import io
+import json
+import os
+import shutil
+import socket
+import struct
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # The fcntl module isn't available on Windows.
+    fcntl = None  # pylint: disable=invalid-name
+
+from winnan import _util
+import winnan.io_shim
+
+try:
+    long
+except NameError:
+    integer_types = (int, )  # pylint: disable=invalid-name
+else:
+    integer_types = (int, long)  # pylint: disable=invalid-name
+
+# The most file descriptors Linux accepts in a single SCM_RIGHTS message.
+MAX_FDS = 253
+
+_HEADER = struct.Struct("!I")
+
+_KEY_LENGTH = 32
+
+
+def _check_supported():
+    """Raises OSError with ENOSYS if file descriptors can't be passed on this platform."""
+    if not hasattr(socket.socket, "sendmsg") or not hasattr(socket, "SCM_RIGHTS"):
+        raise OSError(errno.ENOSYS, "passing file descriptors is not supported on this platform")
+
+
+def _set_cloexec(fd):  # pylint: disable=invalid-name
+    """Marks 'fd' as not inherited by child processes."""
+    if hasattr(os, "set_inheritable"):
+        os.set_inheritable(fd, False)  # pylint: disable=no-member
+    else:
+        flags = fcntl.fcntl(fd, fcntl.F_GETFD)
+        fcntl.fcntl(fd, fcntl.F_SETFD, flags | fcntl.FD_CLOEXEC)
+
+
+def _describe(fileobj):
+    """Returns the file descriptor of 'fileobj' and the description used to rebuild it, which is
+    None if 'fileobj' is a file descriptor.
+    """
+    if isinstance(fileobj, integer_types):
+        return (fileobj, None)
+
+    fileobj.flush()
+    if fileobj.seekable():
+        # The shared file position is past the sender's read-ahead buffer. Seeking within the buffer
+        # only moves the buffer's pointer, so moving to the end of the file first makes the second
+        # seek discard the buffer and set the shared file position.
+        position = fileobj.tell()
+        fileobj.seek(0, io.SEEK_END)
+        fileobj.seek(position)
+
+    description = {"mode": fileobj.mode, "name": _util.raw_of(fileobj).name}
+    if isinstance(fileobj, io.TextIOBase):
+        description["encoding"] = fileobj.encoding
+        description["errors"] = fileobj.errors
+    elif isinstance(fileobj, io.RawIOBase):
+        description["buffering"] = 0
+
+    if not isinstance(description["name"], (str, type(u""))):
+        # The name of a file object opened from a file descriptor is the file descriptor itself,
+        # which means nothing in the receiving process.
+        description["name"] = None
+
+    return (fileobj.fileno(), description)
+
+
+def _rebuild(fd, description):  # pylint: disable=invalid-name
+    """Returns the file object described by 'description' for the received file descriptor."""
+    if description is None:
+        return fd
+
+    fileobj = winnan.io_shim.open(fd, description["mode"],
+                                  buffering=description.get("buffering", -1),
+                                  encoding=description.get("encoding"),
+                                  errors=description.get("errors"))
+    try:
+        if description["name"] is not None:
+            _util.raw_of(fileobj).name = description["name"]
+    except:  # pylint: disable=bare-except
+        fileobj.close()
+        raise
+
+    return fileobj
+
+
+def _send(sock, fds, descriptions):
+    """Sends 'fds' and their 'descriptions' as a single message on 'sock'."""
+    _check_supported()
+    if len(fds) > MAX_FDS:
+        raise ValueError("can't send more than %d files at once" % (MAX_FDS, ))
+
+    payload = json.dumps(descriptions).encode("utf-8")
+    message = _HEADER.pack(len(payload)) + payload
+    ancillary = []
+    if fds:
+        ancillary.append((socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array("i", fds)))
+
+    sent = sock.sendmsg([message], ancillary)
+    if sent < len(message):
+        sock.sendall(message[sent:])
+
+
+def _recv_exact(sock, size):
+    """Receives exactly 'size' bytes from 'sock'."""
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise EOFError("connection closed while receiving files")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def send_files(sock, fileobjs):
+    """Sends the file objects or file descriptors in 'fileobjs' over the Unix domain socket 'sock'.
+
+    Each file object is flushed and its read-ahead buffer is discarded, so that the shared file
+    position matches the position of the file object, and its mode and name are sent along with its
+    file descriptor. The files remain open in the sending process.
+    """
+    described = [_describe(fileobj) for fileobj in fileobjs]
+    _send(sock, [fd for (fd, _) in described], [description for (_, description) in described])
+
+
+def recv_files(sock):
+    """Receives the files sent by send_files() over the Unix domain socket 'sock'. Returns a list
+    with a file object opened using winnan.open() for each file object sent, and a file descriptor
+    for each file descriptor sent.
+    """
+    _check_supported()
+    itemsize = array.array("i").itemsize
+    flags = getattr(socket, "MSG_CMSG_CLOEXEC", 0)
+
+    # The ancillary data is delivered along with the first byte of the message, so only the header
+    # is received here to avoid reading into whatever message follows.
+    (header, ancillary, msg_flags, _) = sock.recvmsg(_HEADER.size,
+                                                     socket.CMSG_SPACE(MAX_FDS * itemsize), flags)
+    fds = array.array("i")
+    for (level, kind, data) in ancillary:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(data[:len(data) - len(data) % itemsize])
+
+    files = []
+    try:
+        if not flags:
+            for fd in fds:  # pylint: disable=invalid-name
+                _set_cloexec(fd)
+
+        if msg_flags & getattr(socket, "MSG_CTRUNC", 0):
+            raise OSError(errno.EMSGSIZE, "received more file descriptors than fit")
+        if not header:
+            raise EOFError("connection closed while receiving files")
+
+        header += _recv_exact(sock, _HEADER.size - len(header))
+        (length, ) = _HEADER.unpack(header)
+        descriptions = json.loads(_recv_exact(sock, length).decode("utf-8"))
+        if len(descriptions) != len(fds):
+            raise OSError(errno.EPROTO, "received %d file descriptors for %d files"
+                          % (len(fds), len(descriptions)))
+
+        for (fd, description) in zip(fds, descriptions):  # pylint: disable=invalid-name
+            files.append(_rebuild(fd, description))
+    except:  # pylint: disable=bare-except
+        for fileobj in files:
+            if not isinstance(fileobj, integer_types):
+                fileobj.close()
+        for fd in fds[len(files):]:  # pylint: disable=invalid-name
+            os.close(fd)
+        raise
+
+    return files
+
+
+class _FileServer(object):
+    """Serves registered files to the processes that connect to its Unix domain socket."""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._files = {}
+
+        # Only the current user can connect to a socket within a directory created by mkdtemp().
+        self._directory = tempfile.mkdtemp(prefix="winnan-")
+        self.address = os.path.join(self._directory, "files")
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._listener.bind(self.address)
+            self._listener.listen(socket.SOMAXCONN)
+        except:  # pylint: disable=bare-except
+            self.close()
+            raise
+
+        self._thread = threading.Thread(target=self._run, name="winnan-file-server")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def register(self, fileobj):
+        """Makes 'fileobj' available to be received once and returns the key for receiving it."""
+        (fd, description) = _describe(fileobj)  # pylint: disable=invalid-name
+        key = binascii.hexlify(os.urandom(_KEY_LENGTH // 2)).decode("ascii")
+
+        # The file descriptor is duplicated in case 'fileobj' is closed before it is received.
+        fd = os.dup(fd)  # pylint: disable=invalid-name
+        _set_cloexec(fd)
+        with self._lock:
+            self._files[key] = (fd, description)
+        return key
+
+    def _run(self):
+        """Sends the file registered with the key each connection asks for."""
+        while True:
+            try:
+                (conn, _) = self._listener.accept()
+            except (EnvironmentError, socket.error):
+                # The listening socket was closed.
+                return
+
+            try:
+                key = _recv_exact(conn, _KEY_LENGTH).decode("ascii")
+                with self._lock:
+                    entry = self._files.pop(key, None)
+
+                if entry is None:
+                    _send(conn, [], [])
+                else:
+                    try:
+                        _send(conn, [entry[0]], [entry[1]])
+                    finally:
+                        os.close(entry[0])
+            except (EnvironmentError, EOFError, socket.error, UnicodeDecodeError):
+                pass
+            finally:
+                conn.close()
+
+    def close(self):
+        """Stops serving files and closes the file descriptors that weren't received."""
+        if self.pid != os.getpid():
+            # The socket belongs to the parent process.
+            return
+
+        self._listener.close()
+        shutil.rmtree(self._directory, ignore_errors=True)
+
+        with self._lock:
+            files = self._files
+            self._files = {}
+        for (fd, _) in files.values():  # pylint: disable=invalid-name
+            os.close(fd)
+
+
+_SERVER = None
+_SERVER_LOCK = threading.Lock()
+
+
+def _server():
+    """Returns the _FileServer of the current process, starting it if needed."""
+    global _SERVER  # pylint: disable=global-statement
+
+    with _SERVER_LOCK:
+        if _SERVER is None or _SERVER.pid != os.getpid():
+            _SERVER = _FileServer()
+            atexit.register(_SERVER.close)
+
+        return _SERVER
+
+
+def _receive_shared(address, key):
+    """Returns the file registered with 'key' by the process serving files at 'address'."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(address)
+        sock.sendall(key.encode("ascii"))
+        files = recv_files(sock)
+    finally:
+        sock.close()
+
+    if not files:
+        raise OSError(errno.ENOENT, "the shared file was already received or is no longer open")
+    return files[0]
+
+
+class SharedFile(object):  # pylint: disable=too-few-public-methods
+    """Picklable wrapper around a file object or file descriptor that becomes a matching file object
+    or file descriptor when unpickled in another process, e.g. one of the workers of a
+    ProcessPoolExecutor.
+
+    Each time the SharedFile is pickled, the file is registered with a background thread of the
+    current process that sends it over a Unix domain socket to the process unpickling it. The file
+    can be received once per pickling.
+    """
+
+    def __init__(self, fileobj):
+        _check_supported()
+        self.fileobj = fileobj
+
+    def __reduce__(self):
+        server = _server()
+        return (_receive_shared, (server.address, server.register(self.fileobj)))
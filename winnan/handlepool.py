@@ -0,0 +1,364 @@
+"""Module that provides a pool of open files that remains safe to use after fork().
+
+A child process created by fork() inherits the parent's file descriptors, and with them the file
+positions, which the parent and its children then move underneath each other. The handles returned
+by HandlePool.get() guard against this in one of two ways:
+
+    - With after_fork=REOPEN, the first use of a handle in the child process opens the file again
+      and moves to the position the handle had when the process forked. Buffered writers are flushed
+      before forking so their data isn't written by both processes, and the file is opened again
+      without truncating or creating it, e.g. with "r+b" for a pool of "wb" files.
+    - With after_fork=PREAD, the handles only read the file using pread() at a position kept by the
+      handle itself, so they never depend on the shared file position and need no reopening.
+
+Forks are detected using os.register_at_fork() where available, which was added in Python 3.7.
+Otherwise, a handle compares the process ID and, in the child, resumes from whatever position it
+computes after the fork.
+"""
+
+from __future__ import absolute_import
+
+import errno
+import io
+import os
+import threading
+import weakref
+
+from winnan import _syscalls
+from winnan import _util
+import winnan.io_shim
+
+REOPEN = "reopen"
+PREAD = "pread"
+
+_HANDLES = weakref.WeakSet()
+_POOLS = weakref.WeakSet()
+_HANDLES_LOCK = threading.Lock()
+
+# Incremented in the child process after each fork() when os.register_at_fork() is available.
+_FORK_GENERATION = 0
+
+
+def _before_fork():
+    """Records the position of every handle, and flushes the writers, in the parent process."""
+    with _HANDLES_LOCK:
+        handles = list(_HANDLES)
+
+    for handle in handles:
+        handle._prepare_fork()  # pylint: disable=protected-access
+
+
+def _after_fork_in_child():
+    """Marks the handles inherited by the child process as needing to be reopened."""
+    global _FORK_GENERATION, _HANDLES_LOCK  # pylint: disable=global-statement
+    _FORK_GENERATION += 1
+
+    # Only the thread that called fork() exists in the child process, so a lock held by another
+    # thread would never be released.
+    _HANDLES_LOCK = threading.Lock()
+    for pool in list(_POOLS):
+        pool._lock = threading.Lock()  # pylint: disable=protected-access
+    for handle in list(_HANDLES):
+        handle._lock = threading.RLock()  # pylint: disable=protected-access
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(before=_before_fork, after_in_child=_after_fork_in_child)  # pylint: disable=no-member
+
+    def _generation():
+        """Returns a value that changes whenever the current process is a newly forked child."""
+        return _FORK_GENERATION
+else:
+    _generation = os.getpid  # pylint: disable=invalid-name
+
+
+def _reopen_mode(mode):
+    """Returns the mode that opens the file again without truncating it. Append modes are kept so
+    writes still go to the end of the file atomically.
+    """
+    if "w" in mode or "x" in mode:
+        return "r+" + "".join(char for char in mode if char not in "wx+")
+    return mode
+
+
+def _make_existing_opener(opener):
+    """Returns a wrapper around the 'opener' function that doesn't create the file."""
+
+    def existing_opener(file, flags, mode, share_flags):  # pylint: disable=redefined-builtin,missing-docstring
+        return opener(file, flags & ~os.O_CREAT, mode=mode, share_flags=share_flags)
+
+    return existing_opener
+
+
+class _PositionalFileIO(io.RawIOBase):
+    """Read-only raw file object that reads 'raw' using pread() at its own position."""
+
+    def __init__(self, raw):
+        super(_PositionalFileIO, self).__init__()
+        self._raw = raw
+        self._pos = 0
+
+    @property
+    def name(self):  # pylint: disable=missing-docstring
+        return self._raw.name
+
+    @property
+    def mode(self):  # pylint: disable=missing-docstring
+        return self._raw.mode
+
+    def fileno(self):
+        return self._raw.fileno()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):  # pylint: disable=invalid-name
+        size = _syscalls.pread_into(self._raw.fileno(), _util.byte_view(b), self._pos)
+        self._pos += size
+        return size
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            pos += self._pos
+        elif whence == io.SEEK_END:
+            pos += os.fstat(self._raw.fileno()).st_size
+        elif whence != io.SEEK_SET:
+            raise ValueError("invalid whence (%r, should be 0, 1 or 2)" % (whence, ))
+
+        if pos < 0:
+            raise ValueError("negative seek position %r" % (pos, ))
+
+        self._pos = pos
+        return pos
+
+    def close(self):
+        if self.closed:
+            return
+
+        try:
+            super(_PositionalFileIO, self).close()
+        finally:
+            self._raw.close()
+
+
+class PooledHandle(object):
+    """Handle to a file opened by a HandlePool. Attribute lookups are forwarded to the underlying
+    file object, which is replaced first if the process forked since it was opened.
+    """
+
+    def __init__(self, pool, path):
+        self._pool = pool
+        self.path = path
+        self._fileobj = None
+        self._generation = None
+        self._fork_position = None
+        self._lock = threading.RLock()
+
+    def _open(self, reopen=False):
+        """Returns a newly opened file object for the handle's path. If 'reopen' is True, the file
+        is opened again after a fork, which neither truncates nor creates it.
+        """
+        pool = self._pool
+        if pool.after_fork == PREAD:
+            raw = winnan.io_shim.open(self.path, "rb", buffering=0, **pool.open_kwargs)
+            return winnan.io_shim.wrap_raw(_PositionalFileIO(raw), pool.mode, pool.buffering,
+                                           pool.encoding, pool.errors, pool.newline)
+
+        mode = pool.mode
+        open_kwargs = pool.open_kwargs
+        if reopen:
+            mode = _reopen_mode(mode)
+            open_kwargs = dict(open_kwargs, opener=_make_existing_opener(
+                open_kwargs.get("opener") or winnan.os_shim.open))
+
+        return winnan.io_shim.open(self.path, mode, buffering=pool.buffering,
+                                   encoding=pool.encoding, errors=pool.errors,
+                                   newline=pool.newline, **open_kwargs)
+
+    @property
+    def file(self):
+        """The file object for the current process, opening the file again if needed."""
+        fileobj = self._fileobj
+        if self._generation == _generation() and fileobj is not None and not fileobj.closed:
+            return fileobj
+
+        with self._lock:
+            generation = _generation()
+            if self._fileobj is None or self._fileobj.closed:
+                self._fileobj = self._open()
+            elif self._generation != generation:
+                if self._pool.after_fork == REOPEN:
+                    self._reopen()
+            self._generation = generation
+            return self._fileobj
+
+    def _reopen(self):
+        """Replaces the file object inherited from the parent process."""
+        inherited = self._fileobj
+        position = self._fork_position
+        if position is None and inherited.seekable():
+            position = inherited.tell()
+
+        fileobj = self._open(reopen=True)
+        try:
+            if position is not None:
+                fileobj.seek(position)
+        except:  # pylint: disable=bare-except
+            fileobj.close()
+            raise
+
+        self._fileobj = fileobj
+        self._fork_position = None
+        try:
+            # Closing the child's copy of the file descriptor doesn't affect the parent. Only the
+            # raw file object is closed, which the buffered and text layers then report as closed
+            # too, because whatever the inherited writer still buffers is the parent's to write.
+            _util.raw_of(inherited).close()
+        except EnvironmentError:
+            pass
+
+    def _prepare_fork(self):
+        """Records the position of the file object and flushes it before the process forks."""
+        if self._pool.after_fork != REOPEN or not self._lock.acquire(False):
+            # A handle in use by another thread can't be inspected safely. The child then resumes
+            # from whatever position it finds after the fork.
+            return
+
+        try:
+            fileobj = self._fileobj
+            self._fork_position = None
+            if fileobj is not None and not fileobj.closed:
+                fileobj.flush()
+                if fileobj.seekable():
+                    self._fork_position = fileobj.tell()
+        except (EnvironmentError, ValueError):
+            pass
+        finally:
+            self._lock.release()
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+    # The most frequently called methods are forwarded explicitly because __getattr__() is only
+    # called after the regular attribute lookup has failed, which is comparatively slow.
+    # pylint: disable=missing-docstring
+
+    def read(self, *args):
+        return self.file.read(*args)
+
+    def readinto(self, b):  # pylint: disable=invalid-name
+        return self.file.readinto(b)
+
+    def readline(self, *args):
+        return self.file.readline(*args)
+
+    def write(self, data):
+        return self.file.write(data)
+
+    def seek(self, *args):
+        return self.file.seek(*args)
+
+    def tell(self):
+        return self.file.tell()
+
+    # pylint: enable=missing-docstring
+
+    def __iter__(self):
+        return iter(self.file)
+
+    def close(self):
+        """Closes the file and removes the handle from its pool."""
+        with self._lock:
+            fileobj = self._fileobj
+            self._fileobj = None
+        self._pool._discard(self)  # pylint: disable=protected-access
+        if fileobj is not None:
+            fileobj.close()
+
+    def __repr__(self):
+        return "<PooledHandle path=%r>" % (self.path, )
+
+
+class HandlePool(object):  # pylint: disable=too-many-instance-attributes
+    """Pool of files opened with winnan.open() that are kept open and shared by path, and that can
+    still be used after the process forks. See the module's documentation for 'after_fork'.
+
+    The remaining keyword arguments are passed through to winnan.open(). With after_fork=PREAD, the
+    files can only be opened for reading.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, mode="rb", after_fork=REOPEN, buffering=-1, encoding=None, errors=None,
+                 newline=None, **open_kwargs):
+        if after_fork not in (REOPEN, PREAD):
+            raise ValueError("invalid after_fork: %r" % (after_fork, ))
+
+        if after_fork == PREAD:
+            if winnan.io_shim.raw_mode(mode) != "r":
+                raise ValueError("after_fork=PREAD requires a read-only mode")
+            if not _syscalls.has_pread():
+                raise OSError(errno.ENOSYS, "pread() is not supported on this platform")
+
+        self.mode = mode
+        self.after_fork = after_fork
+        self.buffering = buffering
+        self.encoding = encoding
+        self.errors = errors
+        self.newline = newline
+        self.open_kwargs = open_kwargs
+
+        self._lock = threading.Lock()
+        self._handles = {}
+        with _HANDLES_LOCK:
+            _POOLS.add(self)
+
+    def get(self, path):
+        """Returns the PooledHandle for 'path', opening the file if it isn't open yet."""
+        path = _util.fspath(path)
+        with self._lock:
+            handle = self._handles.get(path)
+            if handle is None:
+                handle = PooledHandle(self, path)
+                self._handles[path] = handle
+                with _HANDLES_LOCK:
+                    _HANDLES.add(handle)
+
+        # Opening the file eagerly reports a missing file to the caller of get().
+        handle.file  # pylint: disable=pointless-statement
+        return handle
+
+    def _discard(self, handle):
+        """Removes 'handle' from the pool."""
+        with self._lock:
+            if self._handles.get(handle.path) is handle:
+                del self._handles[handle.path]
+        with _HANDLES_LOCK:
+            _HANDLES.discard(handle)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._handles)
+
+    def __contains__(self, path):
+        with self._lock:
+            return _util.fspath(path) in self._handles
+
+    def close(self):
+        """Closes every file in the pool."""
+        with self._lock:
+            handles = list(self._handles.values())
+
+        for handle in handles:
+            handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -5,15 +5,27 @@ from __future__ import absolute_import
 import io
 import os
 import sys
+import warnings
 
+import winnan.bufferpool
+import winnan.checksum
+import winnan.closer
+import winnan.compression
 import winnan.flags
 import winnan.os_shim
+import winnan.registry
 
 try:
     basestring
 except NameError:
     basestring = (str, bytes)  # pylint: disable=redefined-builtin,invalid-name
 
+try:
+    ResourceWarning
+except NameError:
+    # Python 2 has no ResourceWarning and never warns about unclosed files.
+    ResourceWarning = None  # pylint: disable=redefined-builtin,invalid-name
+
 try:
     long
 except NameError:
@@ -24,13 +36,188 @@ else:
 
 # pylint: disable=redefined-builtin,too-many-arguments
 def open(file, mode="r", buffering=-1, encoding=None, errors=None, newline=None, closefd=True,
-         opener=None, opener_mode=0o666, share_flags=None):
+         opener=None, opener_mode=0o666, share_flags=None, close_async=False, compression=None,
+         compresslevel=None, checksum=None, expected_checksum=None, buffer_pool=None):
     """Replacement for io.open() allowing moving or unlinking before closing.
 
     The custom opener() function must accept 'mode' and 'share_flags' keyword arguments. Calling
     opener(file, flags, mode=opener_mode, share_flags=share_flags) should return an open file
     descriptor. Specifying 'winnan.os_open' as the opener() function results in functionality
     identical to specifying None.
+
+    If 'close_async' is True, closing the returned file object flushes it and then hands the file
+    descriptor to winnan.closer.default_closer() to be closed on a background thread. A
+    winnan.DeferredCloser instance may also be specified to use it instead.
+
+    When close hooks are installed on winnan.os_shim, the returned file object closes its file
+    descriptor using winnan.os_shim.close() so the hooks are notified.
+
+    If 'compression' is "gzip", "bz2", or "xz", the file is decompressed while reading or compressed
+    while writing using winnan.compression, at the given 'compresslevel' if specified. With "auto",
+    reading detects the format from the start of the file and writing infers it from the file's
+    extension. The file can't be opened for both reading and writing, and isn't seekable.
+
+    If 'checksum' is "crc32", "adler32", or the name of a hashlib algorithm, the returned file
+    object has a 'checksum' attribute holding a hashlib-like object that is updated with the bytes
+    read from or written to the file, which is complete once the end of the file was read or the
+    file object was closed. When compressing, the checksum covers the compressed bytes. If
+    'expected_checksum' is specified as a hex digest, reading up to the end of the file raises
+    IOError unless it matches. The file can't be opened for both reading and writing, and isn't
+    seekable.
+
+    If 'buffer_pool' is True, the returned file object borrows its buffer from
+    winnan.bufferpool.default_pool() only while the buffer holds data, rather than keeping a buffer
+    of its own until it is closed. A winnan.BufferPool instance may also be specified to use it
+    instead. The file can't be opened for both reading and writing.
+    """
+
+    if buffer_pool and "+" in mode:
+        raise ValueError("can't use a buffer pool for both reading and writing")
+
+    if expected_checksum is not None:
+        if checksum is None:
+            raise ValueError("expected_checksum requires a checksum")
+        if "r" not in mode:
+            raise ValueError("expected_checksum can only be used when reading")
+
+    if compression is not None:
+        return _open_compressed(file, mode, buffering, encoding, errors, newline, closefd, opener,
+                                opener_mode, share_flags, close_async, compression, compresslevel,
+                                checksum, expected_checksum, buffer_pool)
+
+    if checksum is not None:
+        return _open_checksummed(file, mode, buffering, encoding, errors, newline, closefd, opener,
+                                 opener_mode, share_flags, close_async, checksum,
+                                 expected_checksum, buffer_pool)
+
+    (file, fd) = _open_fd(file, mode, closefd, opener or winnan.os_shim.open, opener_mode,
+                          share_flags)
+
+    return _wrap_fd(fd, file, mode, buffering, encoding, errors, newline, closefd, close_async,
+                    buffer_pool)
+
+
+def try_open(file, mode="r", buffering=-1, encoding=None, errors=None, newline=None, closefd=True,
+             opener=None, opener_mode=0o666, share_flags=None, close_async=False,
+             compression=None, compresslevel=None, checksum=None, expected_checksum=None,
+             buffer_pool=None):
+    """Variant of open() that returns None rather than raising an exception when the file doesn't
+    exist or, when using mode "x", when the file already exists.
+
+    Raising and catching an exception is comparatively expensive, which makes this variant
+    considerably faster for lookups that frequently miss. A custom opener() function may either
+    return None or raise an exception to indicate a miss.
+    """
+
+    if opener is None:
+        opener = winnan.os_shim.try_open
+    else:
+        opener = _make_try_opener(opener)
+
+    if compression is not None or checksum is not None:
+        # The layers are set up by open(), which has no way of returning None on a miss.
+        try:
+            return open(file, mode, buffering, encoding, errors, newline, closefd,
+                        _make_raising_opener(opener), opener_mode, share_flags, close_async,
+                        compression, compresslevel, checksum, expected_checksum, buffer_pool)
+        except _Miss:
+            return None
+
+    (file, fd) = _open_fd(file, mode, closefd, opener, opener_mode, share_flags)
+    if fd is None:
+        return None
+
+    return _wrap_fd(fd, file, mode, buffering, encoding, errors, newline, closefd, close_async,
+                    buffer_pool)
+
+
+def _open_compressed(file, mode, buffering, encoding, errors, newline, closefd, opener,
+                     opener_mode, share_flags, close_async, compression, compresslevel, checksum,
+                     expected_checksum, buffer_pool):
+    """Returns the file object for open() when a 'compression' is specified."""
+
+    if "+" in mode:
+        raise ValueError("can't open a compressed file for both reading and writing")
+
+    winnan.compression.check(compression)
+    raw = open(file, raw_mode(mode) + "b", buffering=0, closefd=closefd, opener=opener,
+               opener_mode=opener_mode, share_flags=share_flags, close_async=close_async,
+               checksum=checksum, expected_checksum=expected_checksum)
+
+    try:
+        if "r" in mode:
+            stream = winnan.compression.DecompressingReader(raw, compression)
+        else:
+            stream = winnan.compression.CompressingWriter(raw, compression, level=compresslevel)
+    except:  # pylint: disable=bare-except
+        raw.close()
+        raise
+
+    fileobj = wrap_raw(stream, mode, buffering, encoding, errors, newline, buffer_pool)
+    if checksum is not None:
+        fileobj.checksum = raw.checksum
+    return fileobj
+
+
+def _open_checksummed(file, mode, buffering, encoding, errors, newline, closefd, opener,
+                      opener_mode, share_flags, close_async, checksum, expected_checksum,
+                      buffer_pool):
+    """Returns the file object for open() when a 'checksum' is specified."""
+
+    if "+" in mode:
+        raise ValueError("can't checksum a file opened for both reading and writing")
+
+    hasher = winnan.checksum.new(checksum)
+    raw = open(file, raw_mode(mode) + "b", buffering=0, closefd=closefd, opener=opener,
+               opener_mode=opener_mode, share_flags=share_flags, close_async=close_async)
+
+    try:
+        stream = winnan.checksum.ChecksumFileIO(raw, hasher, expected_checksum)
+    except:  # pylint: disable=bare-except
+        raw.close()
+        raise
+
+    fileobj = wrap_raw(stream, mode, buffering, encoding, errors, newline, buffer_pool)
+    if fileobj is not stream:
+        fileobj.checksum = hasher
+    return fileobj
+
+
+def _make_try_opener(opener):
+    """Returns a wrapper around the custom 'opener' function that returns None on a miss."""
+
+    def try_opener(file, flags, mode, share_flags):  # pylint: disable=missing-docstring
+        try:
+            return opener(file, flags, mode=mode, share_flags=share_flags)
+        except EnvironmentError as err:
+            if winnan.os_shim.is_missing_error(err):
+                return None
+            raise
+
+    return try_opener
+
+
+class _Miss(Exception):
+    """Raised through open() to report a miss to try_open()."""
+
+
+def _make_raising_opener(opener):
+    """Returns a wrapper around the 'opener' function returned by _make_try_opener(), or
+    winnan.os_shim.try_open(), that raises _Miss rather than returning None.
+    """
+
+    def raising_opener(file, flags, mode, share_flags):  # pylint: disable=missing-docstring
+        fd = opener(file, flags, mode=mode, share_flags=share_flags)  # pylint: disable=invalid-name
+        if fd is None:
+            raise _Miss()
+        return fd
+
+    return raising_opener
+
+
+def _open_fd(file, mode, closefd, opener, opener_mode, share_flags):
+    """Returns a (file, fd) pair where 'file' is the normalized 'file' argument and 'fd' is the
+    file descriptor to wrap.
     """
 
     if sys.version_info >= (3, 6) and not isinstance(file, integer_types):
@@ -40,23 +227,46 @@ def open(file, mode="r", buffering=-1, encoding=None, errors=None, newline=None,
         raise TypeError("invalid file: %r" % (file, ))
 
     if isinstance(file, integer_types):
-        fd = file  # pylint: disable=invalid-name
-    else:
-        if not closefd:
-            raise ValueError("Cannot use closefd=False with file name")
+        return (file, file)
+
+    if not closefd:
+        raise ValueError("Cannot use closefd=False with file name")
+
+    flags = winnan.flags.mode_to_flags(mode)
+    return (file, opener(file, flags, mode=opener_mode, share_flags=share_flags))
+
 
-        flags = winnan.flags.mode_to_flags(mode)
+def _wrap_fd(fd, file, mode, buffering, encoding, errors, newline, closefd, close_async,  # pylint: disable=invalid-name
+             buffer_pool):
+    """Returns the file object layered on top of 'fd' by io.open()."""
 
-        if opener is None:
-            opener = winnan.os_shim.open
+    if close_async or winnan.os_shim.CLOSE_HOOKS or buffer_pool:
+        if close_async and not closefd:
+            raise ValueError("Cannot use close_async with closefd=False")
 
-        fd = opener(file, flags, mode=opener_mode, share_flags=share_flags)  # pylint: disable=invalid-name
+        if close_async:
+            closer = winnan.closer.default_closer() if close_async is True else close_async
+            close_fd = closer.submit
+        elif closefd:
+            close_fd = winnan.os_shim.close
+        else:
+            close_fd = None
 
-    # io.open() takes responsibility for closing 'fd' when closefd=True. This means for all cases
-    # where winnan.io_shim.open() had opened the file descriptor that io.open() is responsible for
-    # cleaning it up if anything goes wrong.
-    fileobj = io.open(fd, mode=mode, buffering=buffering, encoding=encoding, errors=errors,
-                      newline=newline, closefd=closefd)
+        raw = None
+        try:
+            raw = _CallbackFileIO(fd, raw_mode(mode), close_fd)
+        finally:
+            if raw is None and close_fd is not None:
+                close_fd(fd)
+
+        # wrap_raw() closes 'raw' if anything goes wrong, which hands 'fd' to close_fd().
+        fileobj = wrap_raw(raw, mode, buffering, encoding, errors, newline, buffer_pool)
+    else:
+        # io.open() takes responsibility for closing 'fd' when closefd=True. This means for all
+        # cases where winnan.io_shim.open() had opened the file descriptor that io.open() is
+        # responsible for cleaning it up if anything goes wrong.
+        fileobj = io.open(fd, mode=mode, buffering=buffering, encoding=encoding, errors=errors,
+                          newline=newline, closefd=closefd)
 
     # We overwrite the 'name' attribute of the FileIO instance to be the original 'file' argument to
     # simulate io.open()'s behavior had it been called with the filename and 'opener' as its
@@ -75,4 +285,130 @@ def open(file, mode="r", buffering=-1, encoding=None, errors=None, newline=None,
         # instance.
         fileobj.buffer.raw.name = file
 
+    if winnan.registry.ENABLED:
+        winnan.registry.attach(fileobj, mode)
+
     return fileobj
+
+
+class _CallbackFileIO(io.FileIO):
+    """FileIO subclass that passes its file descriptor to 'close_fd' rather than closing it itself.
+
+    Any buffered file object wrapping the instance has already flushed its data by the time close()
+    is called. The file descriptor is left open if 'close_fd' is None, like with closefd=False.
+    """
+
+    def __init__(self, fd, mode, close_fd):  # pylint: disable=invalid-name
+        self._close_fd = close_fd
+        super(_CallbackFileIO, self).__init__(fd, mode, closefd=False)
+
+    def close(self):
+        if self.closed:
+            return
+
+        fd = self.fileno()  # pylint: disable=invalid-name
+        try:
+            super(_CallbackFileIO, self).close()
+        finally:
+            if self._close_fd is not None:
+                self._close_fd(fd)
+
+    def _dealloc_warn(self, source):
+        """Emits the ResourceWarning for an unclosed file that io.FileIO only emits when it closes
+        the file descriptor itself. The buffered and text objects of the io module call this method
+        when they are garbage collected without having been closed.
+        """
+        if ResourceWarning is None or getattr(self, "_close_fd", None) is None or self.closed:
+            return
+
+        message = "unclosed file %r" % (source, )
+        if sys.version_info >= (3, 6):
+            warnings.warn(message, ResourceWarning, stacklevel=2, source=source)
+        else:
+            warnings.warn(message, ResourceWarning, stacklevel=2)
+
+    if hasattr(io.FileIO, "__del__"):
+        # The __del__() method of io.IOBase was added in Python 3.4.
+        def __del__(self):
+            self._dealloc_warn(self)
+            super(_CallbackFileIO, self).__del__()
+
+
+def raw_mode(mode):
+    """Returns the mode for the io.FileIO instance underlying a file object opened with 'mode'.
+
+    Adapted from the open() function found in Lib/_pyio.py of Python 3.7.0.
+    Copyright (c) 2001-2018 Python Software Foundation; See THIRD-PARTY-NOTICES.
+    """
+    winnan.flags.mode_to_flags(mode)
+
+    return (("x" if "x" in mode else "")
+            + ("r" if "r" in mode or "U" in mode else "")
+            + ("w" if "w" in mode else "")
+            + ("a" if "a" in mode else "")
+            + ("+" if "+" in mode else ""))
+
+
+def wrap_raw(raw, mode, buffering=-1, encoding=None, errors=None, newline=None, buffer_pool=None):
+    """Layers the buffered and text objects that io.open() would on top of the 'raw' FileIO
+    instance. The 'raw' instance is closed if anything goes wrong. If 'buffer_pool' is specified,
+    the buffered object is a winnan.bufferpool.PooledBufferedReader or PooledBufferedWriter.
+
+    Adapted from the open() function found in Lib/_pyio.py of Python 3.7.0.
+    Copyright (c) 2001-2018 Python Software Foundation; See THIRD-PARTY-NOTICES.
+
+    The following modifications were made to the original sources:
+        - Changed to accept an already constructed FileIO instance.
+        - Changed to ignore line buffering in binary mode, matching Python 3.8 without the
+          RuntimeWarning.
+        - Changed to optionally use the buffered objects from winnan.bufferpool.
+    """
+    binary = "b" in mode
+
+    if binary and (encoding is not None or errors is not None or newline is not None):
+        raw.close()
+        raise ValueError("binary mode doesn't take an encoding, errors, or newline argument")
+
+    result = raw
+    try:
+        line_buffering = False
+        if buffering == 1 or buffering < 0 and raw.isatty():
+            buffering = -1
+            line_buffering = not binary
+        if buffering < 0:
+            buffering = io.DEFAULT_BUFFER_SIZE
+            try:
+                blksize = os.fstat(raw.fileno()).st_blksize
+            except (OSError, AttributeError):
+                pass
+            else:
+                if blksize > 1:
+                    buffering = blksize
+        if buffering == 0:
+            if binary:
+                return result
+            raise ValueError("can't have unbuffered text I/O")
+        if buffer_pool:
+            if "+" in mode:
+                raise ValueError("can't use a buffer pool for both reading and writing")
+            pool = None if buffer_pool is True else buffer_pool
+            if "w" in mode or "a" in mode or "x" in mode:
+                buffer = winnan.bufferpool.PooledBufferedWriter(raw, buffering, pool)
+            else:
+                buffer = winnan.bufferpool.PooledBufferedReader(raw, buffering, pool)
+        elif "+" in mode:
+            buffer = io.BufferedRandom(raw, buffering)
+        elif "w" in mode or "a" in mode or "x" in mode:
+            buffer = io.BufferedWriter(raw, buffering)
+        else:
+            buffer = io.BufferedReader(raw, buffering)
+        result = buffer
+        if binary:
+            return result
+        text = io.TextIOWrapper(buffer, encoding, errors, newline, line_buffering)
+        result = text
+        text.mode = mode
+        return result
+    except:  # pylint: disable=bare-except
+        result.close()
+        raise
@@ -0,0 +1,218 @@
+"""Module that provides locking a byte range of a file so that processes writing to different
+ranges of the same file don't have to wait for each other.
+
+The locks are open file description locks (F_OFD_SETLK) on Linux 3.15 and later. These belong to
+the file object that acquired them, so they also exclude other threads of the same process that
+opened the file separately, and closing another file descriptor for the file doesn't release them.
+
+Other POSIX systems use fcntl() record locks instead. These belong to the process rather than the
+file object, so they don't exclude other threads of the same process, and closing any file
+descriptor for the file in the process releases all of its locks on the file.
+
+Windows uses LockFileEx(). Its locks are mandatory, so a locked range can't be read or written
+through another handle until the lock is released.
+"""
+
+from __future__ import absolute_import
+
+import errno
+import struct
+import sys
+
+if sys.platform in ("win32", "cygwin"):
+    import msvcrt  # pylint: disable=import-error
+
+    import pywintypes  # pylint: disable=import-error
+    import win32file  # pylint: disable=import-error
+    import winerror  # pylint: disable=import-error
+
+    fcntl = None  # pylint: disable=invalid-name
+else:
+    import fcntl
+
+try:
+    long
+except NameError:
+    integer_types = (int, )  # pylint: disable=invalid-name
+else:
+    integer_types = (int, long)  # pylint: disable=invalid-name
+
+# The F_OFD_* commands were added to the fcntl module in Python 3.9.
+_F_OFD_SETLK = getattr(fcntl, "F_OFD_SETLK", 37)
+_F_OFD_SETLKW = getattr(fcntl, "F_OFD_SETLKW", 38)
+
+# Whether the kernel supports open file description locks. This is only known after first trying
+# to use them, so a lock is always released using the mechanism that acquired it.
+_OFD_SUPPORTED = sys.platform.startswith("linux")
+
+_LOCKFILE_FAIL_IMMEDIATELY = 0x1
+_LOCKFILE_EXCLUSIVE_LOCK = 0x2
+
+_MAX_RANGE = 0xFFFFFFFFFFFFFFFF
+
+# File offsets are signed 64-bit integers, so a byte range must end before this offset.
+_OFFSET_LIMIT = 1 << 63
+
+# The struct flock argument of fcntl() on Linux with a 64-bit off_t. The trailing "0q" pads the
+# structure to the alignment of its largest member, as the C compiler does.
+_FLOCK = struct.Struct("@hhqqi0q")
+
+
+def _would_block(err):
+    """Returns the exception to raise when a non-blocking lock is held by someone else."""
+    return OSError(errno.EAGAIN, "the byte range is locked by another file object: %s" % (err, ))
+
+
+def _fcntl_ofd(fd, lock_type, offset, length, blocking):  # pylint: disable=invalid-name
+    """Changes an open file description lock using fcntl(). Returns False if the kernel doesn't
+    support open file description locks.
+    """
+    global _OFD_SUPPORTED  # pylint: disable=global-statement
+
+    arg = _FLOCK.pack(lock_type, 0, offset, length, 0)
+    while True:
+        try:
+            fcntl.fcntl(fd, _F_OFD_SETLKW if blocking else _F_OFD_SETLK, arg)
+            return True
+        except EnvironmentError as err:
+            if err.errno == errno.EINTR:
+                # Python 3.5 and later retry fcntl() themselves, see PEP 475.
+                continue
+            if err.errno == errno.EINVAL:
+                _OFD_SUPPORTED = False
+                return False
+            if err.errno in (errno.EACCES, errno.EAGAIN):
+                raise _would_block(err)
+            raise
+
+
+def _lock_posix(fd, offset, length, shared, blocking):  # pylint: disable=invalid-name
+    """Locks the byte range using fcntl(). Returns the function that unlocks it."""
+    lock_type = fcntl.F_RDLCK if shared else fcntl.F_WRLCK
+    if _OFD_SUPPORTED and _fcntl_ofd(fd, lock_type, offset, length, blocking):
+        return _unlock_ofd
+
+    cmd = (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if blocking else fcntl.LOCK_NB)
+    while True:
+        try:
+            fcntl.lockf(fd, cmd, length, offset)
+            return _unlock_record
+        except EnvironmentError as err:
+            if err.errno == errno.EINTR:
+                continue
+            if err.errno in (errno.EACCES, errno.EAGAIN):
+                raise _would_block(err)
+            raise
+
+
+def _unlock_ofd(fd, offset, length):  # pylint: disable=invalid-name
+    """Releases an open file description lock on the byte range."""
+    fcntl.fcntl(fd, _F_OFD_SETLK, _FLOCK.pack(fcntl.F_UNLCK, 0, offset, length, 0))
+
+
+def _unlock_record(fd, offset, length):  # pylint: disable=invalid-name
+    """Releases an fcntl() record lock on the byte range."""
+    fcntl.lockf(fd, fcntl.LOCK_UN, length, offset)
+
+
+def _overlapped(offset):
+    """Returns an OVERLAPPED structure that specifies 'offset' for LockFileEx()."""
+    overlapped = pywintypes.OVERLAPPED()
+    overlapped.Offset = offset & 0xFFFFFFFF
+    overlapped.OffsetHigh = offset >> 32
+    return overlapped
+
+
+def _windows_length(offset, length):
+    """Returns the low and high parts of 'length', where 0 means to the end of the largest file."""
+    if not length:
+        length = _MAX_RANGE - offset
+    return (length & 0xFFFFFFFF, length >> 32)
+
+
+def _lock_windows(fd, offset, length, shared, blocking):  # pylint: disable=invalid-name
+    """Locks the byte range using LockFileEx(). Returns the function that unlocks it."""
+    flags = ((0 if shared else _LOCKFILE_EXCLUSIVE_LOCK)
+             | (0 if blocking else _LOCKFILE_FAIL_IMMEDIATELY))
+    (length_low, length_high) = _windows_length(offset, length)
+    try:
+        win32file.LockFileEx(msvcrt.get_osfhandle(fd), flags, length_low, length_high,
+                             _overlapped(offset))
+    except pywintypes.error as err:
+        if err.winerror == winerror.ERROR_LOCK_VIOLATION:
+            raise _would_block(err)
+        raise
+
+    return _unlock_windows
+
+
+def _unlock_windows(fd, offset, length):  # pylint: disable=invalid-name
+    """Unlocks the byte range using UnlockFileEx()."""
+    (length_low, length_high) = _windows_length(offset, length)
+    win32file.UnlockFileEx(msvcrt.get_osfhandle(fd), length_low, length_high, _overlapped(offset))
+
+
+if fcntl is None:
+    _lock = _lock_windows  # pylint: disable=invalid-name
+else:
+    _lock = _lock_posix  # pylint: disable=invalid-name
+
+
+class RangeLock(object):
+    """Lock held on a byte range of a file. Releasing the lock, either explicitly or by leaving the
+    'with' statement, flushes the file object first so the data written to the range reaches the
+    file before another process can lock it.
+    """
+
+    def __init__(self, fileobj, offset, length, shared, unlock):  # pylint: disable=too-many-arguments
+        self.fileobj = fileobj
+        self.offset = offset
+        self.length = length
+        self.shared = shared
+        self.locked = True
+        self._unlock = unlock
+
+    def release(self):
+        """Flushes the file object and releases the lock. Does nothing if already released."""
+        if not self.locked:
+            return
+
+        self.locked = False
+        if isinstance(self.fileobj, integer_types):
+            self._unlock(self.fileobj, self.offset, self.length)
+        elif not self.fileobj.closed:
+            # Closing the file already released the lock otherwise.
+            try:
+                self.fileobj.flush()
+            finally:
+                self._unlock(self.fileobj.fileno(), self.offset, self.length)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    def __repr__(self):
+        return "<RangeLock offset=%d length=%d shared=%r locked=%r>" % (
+            self.offset, self.length, self.shared, self.locked)
+
+
+def lock_range(fileobj, offset, length, shared=False, blocking=True):  # pylint: disable=too-many-arguments
+    """Locks 'length' bytes of the file object or file descriptor 'fileobj' starting at 'offset',
+    and returns a RangeLock to be used as a context manager. A 'length' of 0 locks everything from
+    'offset' onwards, including the bytes beyond the current end of the file.
+
+    A shared lock requires the file to be open for reading and an exclusive lock requires it to be
+    open for writing. If 'blocking' is False and another file object holds a conflicting lock,
+    raises OSError with EAGAIN instead of waiting for it to be released. Raises OverflowError if the
+    byte range doesn't end before offset 2**63.
+    """
+    if offset < 0 or length < 0:
+        raise ValueError("the offset and length must not be negative")
+    if offset + length > _OFFSET_LIMIT or offset >= _OFFSET_LIMIT:
+        raise OverflowError("the byte range must end before offset 2**63")
+
+    fd = fileobj if isinstance(fileobj, integer_types) else fileobj.fileno()  # pylint: disable=invalid-name
+    unlock = _lock(fd, offset, length, shared, blocking)
+    return RangeLock(fileobj, offset, length, shared, unlock)
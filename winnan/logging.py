@@ -0,0 +1,216 @@
+"""Replacements for the rotating file handlers in the logging.handlers module.
+
+The log file is opened using winnan.open(), so rotating it succeeds on Windows even while another
+process, such as a log viewer, has the file open through winnan. The handlers also never write to
+the file on the thread doing the logging. Each record is formatted on the calling thread and then
+handed to a background thread that writes the records in batches and performs the rotations.
+"""
+
+from __future__ import absolute_import
+
+import logging
+import logging.handlers
+import os
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue  # pylint: disable=import-error
+
+import winnan.io_shim
+
+_MAX_BATCH_SIZE = 1024
+
+
+class _QueuedWriterMixin(object):
+    """Mixin for a logging.FileHandler subclass that moves the writing of records and any rollover
+    to a background thread.
+
+    Subclasses implement _should_rollover(message).
+    """
+
+    def _init_writer(self, max_queued):
+        """Initializes the state of the background thread. Must be called before the base class's
+        constructor.
+        """
+        self._max_queued = max_queued
+        self._queue = queue.Queue(max_queued)
+        self._writer_lock = threading.Lock()
+        self._writer = None
+        self._writer_pid = None
+
+    def _open(self):
+        return winnan.io_shim.open(self.baseFilename, self.mode, encoding=self.encoding,
+                                   errors=getattr(self, "errors", None))
+
+    def _ensure_writer(self):
+        """Starts the background thread if it isn't running in this process yet."""
+        with self._writer_lock:
+            if self._writer is not None and self._writer_pid == os.getpid():
+                return
+
+            if self._writer is not None:
+                # The background thread doesn't survive fork(), and neither can the records that
+                # were queued in the parent process when it forked.
+                self._queue = queue.Queue(self._max_queued)
+
+            self._writer = threading.Thread(target=self._run, name="winnan-log-writer")
+            self._writer.daemon = True
+            self._writer_pid = os.getpid()
+            self._writer.start()
+
+    def emit(self, record):
+        """Formats 'record' and queues it to be written by the background thread."""
+        try:
+            message = self.format(record)
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
+            return
+
+        self._ensure_writer()
+        self._queue.put((record, message))
+
+    def _run(self):
+        """Writes the queued records in batches until close() is called."""
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while batch[-1] is not None and len(batch) < _MAX_BATCH_SIZE:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            stopping = batch[-1] is None
+            if stopping:
+                batch.pop()
+
+            try:
+                self._write_batch(batch)
+            finally:
+                for _ in range(len(batch) + stopping):
+                    self._queue.task_done()
+
+            if stopping:
+                return
+
+    def _write_batch(self, batch):
+        """Writes the (record, message) pairs in 'batch', rolling the file over as needed."""
+        terminator = getattr(self, "terminator", "\n")
+        for (record, message) in batch:
+            try:
+                if self._should_rollover(message):
+                    self.doRollover()
+
+                if self.stream is None:
+                    self.stream = self._open()
+
+                self.stream.write(message + terminator)
+            except Exception:  # pylint: disable=broad-except
+                self.handleError(record)
+
+        if self.stream is not None:
+            try:
+                self.stream.flush()
+            except Exception:  # pylint: disable=broad-except
+                self.handleError(batch[-1][0])
+
+    def flush(self):
+        """Waits until the background thread has written every queued record."""
+        if self._writer is not None and self._writer_pid == os.getpid():
+            self._queue.join()
+
+    def close(self):
+        """Writes the queued records, stops the background thread, and closes the file."""
+        with self._writer_lock:
+            writer = self._writer
+            self._writer = None
+
+        if writer is not None and self._writer_pid == os.getpid():
+            self._queue.put(None)
+            writer.join()
+
+        super(_QueuedWriterMixin, self).close()
+
+
+class RotatingFileHandler(_QueuedWriterMixin, logging.handlers.RotatingFileHandler):
+    """Replacement for logging.handlers.RotatingFileHandler that opens the log file using
+    winnan.open() and writes and rotates it on a background thread.
+
+    At most 'max_queued' records wait to be written before logging blocks, unless it is 0.
+    """
+
+    # pylint: disable=invalid-name,too-many-arguments
+    def __init__(self, filename, mode="a", maxBytes=0, backupCount=0, encoding=None, delay=False,
+                 max_queued=0):
+        self._init_writer(max_queued)
+        self._size = None
+        super(RotatingFileHandler, self).__init__(filename, mode=mode, maxBytes=maxBytes,
+                                                  backupCount=backupCount, encoding=encoding,
+                                                  delay=delay)
+
+    def _open(self):
+        # The size of the file is determined again the next time it is needed.
+        self._size = None
+        return super(RotatingFileHandler, self)._open()
+
+    def doRollover(self):
+        self._size = None
+        super(RotatingFileHandler, self).doRollover()
+
+    def _should_rollover(self, message):
+        """Returns True if writing 'message' would make the file exceed 'maxBytes'."""
+        if self.maxBytes <= 0:
+            return False
+
+        if self.stream is None:
+            self.stream = self._open()
+
+        if self._size is None:
+            # Calling tell() on a text file is expensive, so we only ask for the size of the file
+            # once after opening it and keep track of how much we've written since.
+            self._size = self.stream.seek(0, os.SEEK_END)
+
+        size = self._encoded_size(message + getattr(self, "terminator", "\n"))
+        if self._size + size >= self.maxBytes:
+            return True
+
+        self._size += size
+        return False
+
+
+    def _encoded_size(self, text):
+        """Returns the number of bytes the stream writes to the file for 'text'."""
+        if isinstance(text, bytes):
+            return len(text)
+
+        # The stream is opened with newline=None, which translates "\n" to os.linesep.
+        if os.linesep != "\n":
+            text = text.replace("\n", os.linesep)
+        return len(text.encode(self.stream.encoding, self.stream.errors or "strict"))
+
+
+class TimedRotatingFileHandler(_QueuedWriterMixin, logging.handlers.TimedRotatingFileHandler):
+    """Replacement for logging.handlers.TimedRotatingFileHandler that opens the log file using
+    winnan.open() and writes and rotates it on a background thread.
+
+    At most 'max_queued' records wait to be written before logging blocks, unless it is 0.
+    """
+
+    # pylint: disable=invalid-name,too-many-arguments
+    def __init__(self, filename, when="h", interval=1, backupCount=0, encoding=None, delay=False,
+                 utc=False, atTime=None, max_queued=0):
+        self._init_writer(max_queued)
+
+        kwargs = {}
+        if atTime is not None:
+            # The 'atTime' argument was added in Python 3.4.
+            kwargs["atTime"] = atTime
+
+        super(TimedRotatingFileHandler, self).__init__(filename, when=when, interval=interval,
+                                                       backupCount=backupCount, encoding=encoding,
+                                                       delay=delay, utc=utc, **kwargs)
+
+    def _should_rollover(self, message):  # pylint: disable=unused-argument
+        """Returns True if the current rotation interval has elapsed."""
+        return self.shouldRollover(None)
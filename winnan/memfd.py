@@ -0,0 +1,112 @@
+"""Module that provides anonymous in-memory files backed by memfd_create() on Linux.
+
+The files are returned as the same layered io objects as winnan.open() but never have a directory
+entry. The underlying file descriptor is non-inheritable, so a child process only receives it when
+it is explicitly listed in the 'pass_fds' argument of subprocess.Popen(). See pass_fds().
+"""
+
+from __future__ import absolute_import
+
+import ctypes
+import errno
+import os
+import sys
+
+try:
+    import fcntl
+except ImportError:
+    # The fcntl module isn't available on Windows.
+    fcntl = None  # pylint: disable=invalid-name
+
+import winnan.io_shim
+
+# Constants from <linux/memfd.h> and <linux/fcntl.h>. The os and fcntl modules only define them
+# starting in Python 3.8.
+MFD_CLOEXEC = getattr(os, "MFD_CLOEXEC", 0x0001)
+MFD_ALLOW_SEALING = getattr(os, "MFD_ALLOW_SEALING", 0x0002)
+
+F_ADD_SEALS = getattr(fcntl, "F_ADD_SEALS", 1033)
+F_GET_SEALS = getattr(fcntl, "F_GET_SEALS", 1034)
+F_SEAL_SEAL = getattr(fcntl, "F_SEAL_SEAL", 0x0001)
+F_SEAL_SHRINK = getattr(fcntl, "F_SEAL_SHRINK", 0x0002)
+F_SEAL_GROW = getattr(fcntl, "F_SEAL_GROW", 0x0004)
+F_SEAL_WRITE = getattr(fcntl, "F_SEAL_WRITE", 0x0008)
+
+
+def _memfd_create(name, flags):
+    """Wrapper around os.memfd_create() that calls into libc directly on older versions of Python."""
+    if hasattr(os, "memfd_create"):
+        return os.memfd_create(name, flags)  # pylint: disable=no-member
+
+    func = None
+    if sys.platform.startswith("linux"):
+        # The memfd_create() wrapper was added in glibc 2.27.
+        func = getattr(ctypes.CDLL(None, use_errno=True), "memfd_create", None)
+
+    if func is None:
+        raise OSError(errno.ENOSYS, "memfd_create() is not supported on this platform")
+
+    if not isinstance(name, bytes):
+        name = name.encode(sys.getfilesystemencoding())
+
+    fd = func(name, flags)  # pylint: disable=invalid-name
+    if fd < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+
+    return fd
+
+
+# pylint: disable=too-many-arguments
+def memfd_open(name, mode="w+b", buffering=-1, encoding=None, errors=None, newline=None,
+               allow_sealing=False):
+    """Creates an anonymous in-memory file and returns it as a file object like winnan.open().
+
+    The 'name' is only used for debugging purposes and appears as the target of the symbolic link
+    in /proc/self/fd. Unlike with winnan.open(), 'mode' doesn't affect whether a file is created
+    because a new, empty file is always created. If 'allow_sealing' is True, seals can later be
+    applied to the file using add_seals().
+    """
+    flags = MFD_CLOEXEC
+    if allow_sealing:
+        flags |= MFD_ALLOW_SEALING
+
+    def opener(file, flags_, mode=None, share_flags=None):  # pylint: disable=redefined-builtin,unused-argument
+        """Ignores the flags derived from 'mode' because the file is always opened read-write."""
+        return _memfd_create(file, flags)
+
+    return winnan.io_shim.open(name, mode, buffering=buffering, encoding=encoding, errors=errors,
+                               newline=newline, opener=opener)
+
+
+def _fileno(fileobj):
+    """Returns the file descriptor of 'fileobj', flushing it first if it is a file object."""
+    if isinstance(fileobj, int):
+        return fileobj
+
+    fileobj.flush()
+    return fileobj.fileno()
+
+
+def add_seals(fileobj, seals):
+    """Applies the F_SEAL_* 'seals' to the file created by memfd_open(allow_sealing=True).
+
+    Any data buffered by the file object is flushed first so it isn't rejected by an F_SEAL_WRITE
+    seal.
+    """
+    fcntl.fcntl(_fileno(fileobj), F_ADD_SEALS, seals)
+
+
+def get_seals(fileobj):
+    """Returns the F_SEAL_* seals applied to the file."""
+    return fcntl.fcntl(_fileno(fileobj), F_GET_SEALS)
+
+
+def pass_fds(*fileobjs):
+    """Flushes each file object and returns a tuple of their file descriptors suitable for the
+    'pass_fds' argument of subprocess.Popen().
+
+    The file descriptors stay non-inheritable in the parent and are only made inheritable in the
+    particular child process being spawned. The child can open the file through /dev/fd/N.
+    """
+    return tuple(_fileno(fileobj) for fileobj in fileobjs)
@@ -0,0 +1,330 @@
+"""Module that provides an opt-in cache of the paths that winnan.os_shim.open() failed to find.
+
+When enabled, an open() of a path that recently failed with ENOENT raises FileNotFoundError again
+without asking the operating system, as long as the entry hasn't expired and the parent directory
+hasn't changed. Changes to the parent directory are detected either by comparing its modification
+time or, on Linux when requested, through inotify events. The modification time of a directory is
+checked at most once every 'recheck_interval' seconds, so a file created by another program may
+still be reported as missing for that long.
+
+Only opens without O_CREAT are answered from the cache. Any successful open() of a path discards
+its entry.
+"""
+
+from __future__ import absolute_import
+
+import collections
+import errno
+import functools
+import os
+import sys
+import threading
+import time
+
+from winnan import _inotify
+import winnan.os_shim
+
+CacheStats = collections.namedtuple("CacheStats", ["hits", "misses", "entries", "invalidations"])
+
+_DIRECTORY_EVENTS = (_inotify.IN_CREATE | _inotify.IN_MOVED_TO | _inotify.IN_DELETE_SELF
+                     | _inotify.IN_MOVE_SELF | _inotify.IN_ONLYDIR)
+
+_ENOENT_MESSAGE = os.strerror(errno.ENOENT)
+
+if sys.platform in ("win32", "cygwin"):
+    import winerror  # pylint: disable=import-error
+
+    _NOT_FOUND_WINERRORS = frozenset([winerror.ERROR_FILE_NOT_FOUND, winerror.ERROR_PATH_NOT_FOUND])
+else:
+    _NOT_FOUND_WINERRORS = frozenset()
+
+
+def _is_not_found(err):
+    """Returns True if the exception raised by open() means the file doesn't exist. Unlike
+    winnan.os_shim.is_missing_error(), ENOTDIR and EEXIST don't count because they can be caused by
+    the flags of that particular open() rather than by the path.
+    """
+    return err.errno == errno.ENOENT or getattr(err, "winerror", None) in _NOT_FOUND_WINERRORS
+
+
+def _move_to_end(entries, key):
+    """Marks the entry for 'key' as the most recently used one in the OrderedDict 'entries'."""
+    entries[key] = entries.pop(key)
+
+
+def _mtime_ns(path):
+    """Returns the modification time of 'path' in nanoseconds, or None if it can't be determined."""
+    try:
+        stat_info = os.stat(path)
+    except OSError:
+        return None
+
+    mtime_ns = getattr(stat_info, "st_mtime_ns", None)
+    if mtime_ns is None:
+        # The st_mtime_ns attribute was added in Python 3.3.
+        mtime_ns = int(stat_info.st_mtime * 1e9)
+
+    return mtime_ns
+
+
+class NegativeCache(object):  # pylint: disable=too-many-instance-attributes
+    """Least-recently-used cache of paths that don't exist, each expiring after 'ttl' seconds."""
+
+    def __init__(self, ttl=1.0, max_entries=4096, use_inotify=False, recheck_interval=0.01):
+        if use_inotify and not _inotify.is_supported():
+            raise ValueError("inotify is not supported on this platform")
+
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.recheck_interval = recheck_interval
+
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        # The OrderedDict.move_to_end() method was added in Python 3.2.
+        self._move_to_end = getattr(self._entries, "move_to_end",
+                                    functools.partial(_move_to_end, self._entries))
+
+        # These are read and written without holding the lock. Each is cleared once it grows past
+        # 'max_entries' because they're only used to avoid repeating work.
+        self._keys = {}
+        self._parent_checks = {}
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+        # With inotify, each directory containing a cached path is watched. The watch is removed
+        # once no cached path refers to the directory anymore.
+        self._inotify = None
+        self._watches = {}
+        self._watched_dirs = {}
+        self._thread = None
+        self._stopping = False
+
+        if use_inotify:
+            self._inotify = _inotify.Inotify()
+            self._thread = threading.Thread(target=self._read_inotify_events,
+                                            name="winnan-negative-cache")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def open_hook(self, next_open, file, flags, mode, share_flags):  # pylint: disable=redefined-builtin,too-many-arguments
+        """Hook for winnan.os_shim.add_open_hook() that answers repeated misses from the cache."""
+        if flags & os.O_CREAT:
+            fd = next_open(file, flags, mode, share_flags)  # pylint: disable=invalid-name
+            self.invalidate(file)
+            return fd
+
+        key = self._key(file)
+        if self.contains(key):
+            raise OSError(errno.ENOENT, _ENOENT_MESSAGE, file)
+
+        try:
+            return next_open(file, flags, mode, share_flags)
+        except EnvironmentError as err:
+            if _is_not_found(err):
+                self.add(key)
+            raise
+
+    def _key(self, file):  # pylint: disable=redefined-builtin
+        """Returns the absolute path used as the key for 'file'."""
+        key = self._keys.get(file)
+        if key is None:
+            key = os.path.abspath(file)
+            if os.path.isabs(file):
+                # A relative path is resolved again each time because the working directory may
+                # have changed.
+                if len(self._keys) >= self.max_entries:
+                    self._keys.clear()
+                self._keys[file] = key
+        return key
+
+    def _check_parent(self, parent, now):
+        """Returns the (mtime_ns, checked_at) pair for 'parent' after checking it again."""
+        check = (_mtime_ns(parent), now)
+        if len(self._parent_checks) >= self.max_entries:
+            self._parent_checks.clear()
+        self._parent_checks[parent] = check
+        return check
+
+    def contains(self, key):
+        """Returns True if the absolute path 'key' is cached as not existing."""
+        # Reading a single entry is atomic, so the lock isn't needed until the statistics and the
+        # order of the entries are updated.
+        entry = self._entries.get(key)
+        if entry is None:
+            with self._lock:
+                self._misses += 1
+            return False
+
+        (expires_at, parent, parent_mtime_ns) = entry
+        now = time.time()
+        valid = now < expires_at
+        if valid and self._inotify is None:
+            # The directory is only checked again once 'recheck_interval' seconds have passed.
+            check = self._parent_checks.get(parent)
+            if check is None or now - check[1] >= self.recheck_interval:
+                check = self._check_parent(parent, now)
+            valid = check[0] == parent_mtime_ns
+
+        with self._lock:
+            if not valid:
+                self._misses += 1
+                self._discard(key)
+                return False
+
+            self._hits += 1
+            try:
+                self._move_to_end(key)
+            except KeyError:
+                # The entry was discarded after it was read.
+                pass
+
+        return True
+
+    def add(self, key):
+        """Records that the absolute path 'key' doesn't exist."""
+        parent = os.path.dirname(key)
+        parent_mtime_ns = None
+
+        if self._inotify is None:
+            # The check is forced because the directory may have changed since it was last checked.
+            (parent_mtime_ns, _) = self._check_parent(parent, time.time())
+            if parent_mtime_ns is None:
+                # The parent directory itself doesn't exist. We don't cache the miss because there's
+                # no directory whose changes we could observe.
+                return
+        elif not self._watch(parent):
+            return
+
+        # A file created between the failed open() and the directory being watched or stat'ed isn't
+        # noticed until the entry expires, which is why entries have a TTL even with inotify.
+
+        with self._lock:
+            # The directory watch was already counted for the new entry by _watch().
+            self._discard(key)
+            self._entries[key] = (time.time() + self.ttl, parent, parent_mtime_ns)
+
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+
+    def _discard(self, key):
+        """Removes the entry for 'key' and releases its directory watch. The lock must be held."""
+        if self._entries.pop(key, None) is None:
+            return
+
+        if self._inotify is not None:
+            parent = os.path.dirname(key)
+            watch = self._watched_dirs.get(parent)
+            if watch is not None:
+                watch[1] -= 1
+                if watch[1] == 0:
+                    del self._watched_dirs[parent]
+                    del self._watches[watch[0]]
+                    self._inotify.rm_watch(watch[0])
+
+    def _watch(self, directory):
+        """Ensures 'directory' is watched, counting one more cached path within it."""
+        with self._lock:
+            watch = self._watched_dirs.get(directory)
+            if watch is not None:
+                watch[1] += 1
+                return True
+
+            try:
+                wd = self._inotify.add_watch(directory, _DIRECTORY_EVENTS)  # pylint: disable=invalid-name
+            except OSError:
+                return False
+
+            self._watched_dirs[directory] = [wd, 1]
+            self._watches[wd] = directory
+            return True
+
+    def _read_inotify_events(self):
+        """Invalidates the cached entries of each directory in which a file is created."""
+        while not self._stopping:
+            for event in self._inotify.read_events(timeout=0.5):
+                if event.mask & _inotify.IN_Q_OVERFLOW:
+                    self.invalidate()
+                    continue
+
+                with self._lock:
+                    directory = self._watches.get(event.wd)
+
+                if directory is None:
+                    continue
+
+                if event.name:
+                    self.invalidate(os.path.join(directory, event.name))
+                else:
+                    self.invalidate_directory(directory)
+
+    def invalidate(self, path=None):
+        """Discards the entry for 'path', or every entry if 'path' is None."""
+        with self._lock:
+            if path is None:
+                self._parent_checks.clear()
+                for key in list(self._entries):
+                    self._discard(key)
+                self._invalidations += 1
+                return
+
+            key = os.path.abspath(path)
+            if key in self._entries:
+                self._discard(key)
+                self._invalidations += 1
+
+    def invalidate_directory(self, directory):
+        """Discards the entries for every path within 'directory'."""
+        with self._lock:
+            for key in [key for key in self._entries if os.path.dirname(key) == directory]:
+                self._discard(key)
+                self._invalidations += 1
+
+    def stats(self):
+        """Returns a CacheStats instance describing the hits, misses, and current size."""
+        with self._lock:
+            return CacheStats(self._hits, self._misses, len(self._entries), self._invalidations)
+
+    def close(self):
+        """Stops the inotify thread, if any, and discards every entry."""
+        self._stopping = True
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        with self._lock:
+            self._entries.clear()
+            self._watched_dirs.clear()
+            self._watches.clear()
+
+        if self._inotify is not None:
+            self._inotify.close()
+
+
+_CACHE = None
+
+
+def enable(ttl=1.0, max_entries=4096, use_inotify=False, recheck_interval=0.01):
+    """Installs a NegativeCache on winnan.os_shim.open() and returns it."""
+    global _CACHE  # pylint: disable=global-statement
+
+    disable()
+    _CACHE = NegativeCache(ttl=ttl, max_entries=max_entries, use_inotify=use_inotify,
+                           recheck_interval=recheck_interval)
+    winnan.os_shim.add_open_hook(_CACHE.open_hook)
+    return _CACHE
+
+
+def disable():
+    """Uninstalls the NegativeCache installed by enable(), if any."""
+    global _CACHE  # pylint: disable=global-statement
+
+    if _CACHE is not None:
+        winnan.os_shim.remove_open_hook(_CACHE.open_hook)
+        _CACHE.close()
+        _CACHE = None
+
+
+def stats():
+    """Returns the CacheStats of the installed NegativeCache, or None if it isn't enabled."""
+    return _CACHE.stats() if _CACHE is not None else None
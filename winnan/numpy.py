@@ -0,0 +1,103 @@
+"""Module that provides replacements for numpy.fromfile() and numpy.memmap() using winnan.
+
+Importing this module requires NumPy, which isn't otherwise a dependency of winnan.
+
+Rather than reading the file into a bytes object and converting it with numpy.frombuffer(), which
+copies the data a second time, fromfile() allocates the array first and reads the file directly
+into it using winnan.readinto_all().
+"""
+
+from __future__ import absolute_import
+
+import os
+
+import numpy
+
+from winnan import _util
+import winnan.flags
+import winnan.io_shim
+import winnan.oneshot
+import winnan.os_shim
+
+try:
+    long
+except NameError:
+    integer_types = (int, )  # pylint: disable=invalid-name
+else:
+    integer_types = (int, long)  # pylint: disable=invalid-name
+
+# Maps the modes accepted by numpy.memmap() to the mode the file is opened with.
+_MEMMAP_MODES = {
+    "r": "rb",
+    "c": "rb",
+    "r+": "r+b",
+    "w+": "w+b",
+    "readonly": "rb",
+    "copyonwrite": "rb",
+    "readwrite": "r+b",
+    "write": "w+b",
+}
+
+
+# pylint: disable=redefined-builtin,too-many-arguments
+def fromfile(file, dtype=float, count=-1, offset=0, threads=1):
+    """Replacement for numpy.fromfile() that reads 'count' items of type 'dtype' starting at byte
+    'offset' of the file directly into a new array. All of the remaining items are read if 'count'
+    is negative.
+
+    The 'file' may be a path, which is opened through winnan.os_shim.open(), a file descriptor, or a
+    file object. Unlike numpy.fromfile(), 'offset' is always relative to the start of the file and
+    the position of a file descriptor or file object isn't changed. With 'threads' greater than 1,
+    a large array is filled by that many threads concurrently.
+    """
+    dtype = numpy.dtype(dtype)
+    if isinstance(file, integer_types) or hasattr(file, "fileno"):
+        return _read_array(file, dtype, count, offset, threads)
+
+    fd = winnan.os_shim.open(_util.fspath(file), os.O_RDONLY | winnan.flags.O_BINARY)  # pylint: disable=invalid-name
+    try:
+        return _read_array(fd, dtype, count, offset, threads)
+    finally:
+        winnan.os_shim.close(fd)
+
+
+def _read_array(file, dtype, count, offset, threads):
+    """Implements fromfile() for a file descriptor or file object."""
+    if count < 0:
+        if isinstance(file, integer_types):
+            fd = file  # pylint: disable=invalid-name
+        else:
+            writable = getattr(file, "writable", None)
+            if writable is not None and writable():
+                file.flush()
+            fd = file.fileno()  # pylint: disable=invalid-name
+        count = max(0, os.fstat(fd).st_size - offset) // dtype.itemsize
+
+    array = numpy.empty(count, dtype=dtype)
+    size = winnan.oneshot.readinto_all(file, array.view(numpy.uint8), offset, threads=threads)
+    if size < array.nbytes:
+        # The file was shorter than expected, so only the items read completely are returned.
+        array = array[:size // dtype.itemsize]
+
+    return array
+
+
+def memmap(file, dtype=numpy.uint8, mode="r+", offset=0, shape=None, order="C"):
+    """Replacement for numpy.memmap() that opens the file using winnan.open(), so it is opened with
+    the same share flags and open hooks as the other files opened through winnan.
+
+    The arguments are the same as for numpy.memmap(). The file is closed again once it has been
+    mapped, so only the returned array keeps the mapping open.
+    """
+    if hasattr(file, "fileno"):
+        return numpy.memmap(file, dtype=dtype, mode=mode, offset=offset, shape=shape, order=order)
+
+    if mode not in _MEMMAP_MODES:
+        raise ValueError("mode must be one of %s" % (sorted(_MEMMAP_MODES), ))
+
+    if _MEMMAP_MODES[mode] == "w+b" and shape is None:
+        raise ValueError("shape must be given if mode == 'w+'")
+
+    with winnan.io_shim.open(file, _MEMMAP_MODES[mode]) as fileobj:
+        return numpy.memmap(fileobj, dtype=dtype, mode=mode, offset=offset, shape=shape,
+                            order=order)
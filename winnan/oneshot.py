@@ -0,0 +1,238 @@
+"""Module that provides functions for reading or writing a whole file in a single call.
+
+These functions work directly with the file descriptor returned by winnan.os_shim.open() rather
+than constructing the layered io objects returned by winnan.open(), which makes them considerably
+cheaper for small files.
+"""
+
+from __future__ import absolute_import
+
+import io
+import locale
+import os
+import threading
+
+from winnan import _syscalls
+from winnan import _util
+import winnan.flags
+import winnan.os_shim
+
+try:
+    long
+except NameError:
+    integer_types = (int, )  # pylint: disable=invalid-name
+else:
+    integer_types = (int, long)  # pylint: disable=invalid-name
+
+_CHUNK_SIZE = 64 * 1024
+
+# The most data read by a single system call. Linux never returns more than about 2 GiB from one
+# read() call, and macOS fails with EINVAL when asked for more than that.
+_MAX_READ_SIZE = 1024 * 1024 * 1024
+
+# The least data each thread is given when readinto_all() reads in parallel.
+_MIN_PARALLEL_SIZE = 16 * 1024 * 1024
+
+
+def _read_fd(fd):  # pylint: disable=invalid-name
+    """Reads the remaining contents of 'fd'."""
+    size = os.fstat(fd).st_size
+
+    # os.read() allocates a bytes object of the requested size and reads directly into it, which
+    # avoids both the repeated reallocations of growing a buffer and the copy of converting a
+    # bytearray to bytes. Asking for one more byte than the file's size lets us detect that we've
+    # reached the end of the file without needing another read() call in the common case.
+    data = os.read(fd, size + 1)
+    if len(data) == size:
+        return data
+
+    # The file changed size after we called os.fstat(), it is a file like those in /proc that
+    # report a size of zero, or it is larger than what the operating system returns from a single
+    # read() call.
+    chunks = [data]
+    while True:
+        chunk = os.read(fd, _CHUNK_SIZE)
+        if not chunk:
+            return b"".join(chunks)
+        chunks.append(chunk)
+
+
+def _write_fd(fd, data):  # pylint: disable=invalid-name
+    """Writes all of 'data' to 'fd', retrying after partial writes."""
+    written = os.write(fd, data)
+    if written == len(data):
+        return
+
+    view = memoryview(data)
+    while written < len(view):
+        written += os.write(fd, view[written:])
+
+
+def _decode(data, encoding, errors):
+    """Decodes 'data' and translates newlines the same way as winnan.open() in text mode."""
+    if encoding is None:
+        encoding = locale.getpreferredencoding(False)
+
+    text = data.decode(encoding, errors or "strict")
+    if u"\r" in text:
+        text = text.replace(u"\r\n", u"\n").replace(u"\r", u"\n")
+
+    return text
+
+
+def _encode(text, encoding, errors, newline):
+    """Encodes 'text' and translates newlines the same way as winnan.open() in text mode."""
+    if encoding is None:
+        encoding = locale.getpreferredencoding(False)
+
+    if newline is None:
+        newline = os.linesep
+
+    if newline and newline != u"\n":
+        text = text.replace(u"\n", newline)
+
+    return text.encode(encoding, errors or "strict")
+
+
+def read_bytes(path):
+    """Returns the contents of 'path' as bytes."""
+    fd = winnan.os_shim.open(_util.fspath(path), os.O_RDONLY | winnan.flags.O_BINARY)  # pylint: disable=invalid-name
+    try:
+        return _read_fd(fd)
+    finally:
+        winnan.os_shim.close(fd)
+
+
+def read_text(path, encoding=None, errors=None):
+    """Returns the contents of 'path' decoded as text with universal newlines."""
+    return _decode(read_bytes(path), encoding, errors)
+
+
+def write_bytes(path, data):
+    """Replaces the contents of 'path' with 'data' and returns the number of bytes written."""
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | winnan.flags.O_BINARY
+    fd = winnan.os_shim.open(_util.fspath(path), flags, 0o666)  # pylint: disable=invalid-name
+    try:
+        _write_fd(fd, data)
+    finally:
+        winnan.os_shim.close(fd)
+
+    return len(data)
+
+
+def write_text(path, data, encoding=None, errors=None, newline=None):
+    """Replaces the contents of 'path' with the encoded 'data' and returns the number of characters
+    written.
+    """
+    write_bytes(path, _encode(data, encoding, errors, newline))
+    return len(data)
+
+
+def _pread_all(fd, view, offset):  # pylint: disable=invalid-name
+    """Reads from 'fd' at 'offset' until 'view' is full or the end of the file is reached. Returns
+    the number of bytes read.
+    """
+    total = 0
+    while total < len(view):
+        size = _syscalls.pread_into(fd, view[total:total + _MAX_READ_SIZE], offset + total)
+        if not size:
+            break
+        total += size
+    return total
+
+
+def _seek_read_all(fd, view, offset):  # pylint: disable=invalid-name
+    """Variant of _pread_all() for platforms without pread(), which restores the position of 'fd'
+    afterwards.
+    """
+    position = os.lseek(fd, 0, os.SEEK_CUR)
+    os.lseek(fd, offset, os.SEEK_SET)
+    try:
+        total = 0
+        with io.FileIO(fd, "r", closefd=False) as raw:
+            while total < len(view):
+                size = raw.readinto(view[total:total + _MAX_READ_SIZE])
+                if not size:
+                    break
+                total += size
+        return total
+    finally:
+        os.lseek(fd, position, os.SEEK_SET)
+
+
+def _parallel_read_all(fd, view, offset, threads):  # pylint: disable=invalid-name
+    """Variant of _pread_all() that reads 'threads' consecutive parts of 'view' concurrently."""
+    part_size = -(-len(view) // threads)
+    parts = [(start, min(start + part_size, len(view)))
+             for start in range(0, len(view), part_size)]
+    results = [None] * len(parts)
+
+    def read_part(index):  # pylint: disable=missing-docstring
+        (start, end) = parts[index]
+        try:
+            results[index] = _pread_all(fd, view[start:end], offset + start)
+        except BaseException as err:  # pylint: disable=broad-except
+            results[index] = err
+
+    workers = [threading.Thread(target=read_part, args=(index, )) for index in range(1, len(parts))]
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+
+    # The calling thread reads the first part itself.
+    read_part(0)
+    for worker in workers:
+        worker.join()
+
+    total = 0
+    for ((start, end), result) in zip(parts, results):
+        if isinstance(result, BaseException):
+            raise result
+        total += result
+        if start + result < end:
+            # The file ended within this part, so the parts after it are empty.
+            break
+    return total
+
+
+def readinto_all(path_or_file, buffer, offset=0, threads=1):  # pylint: disable=redefined-builtin
+    """Fills the writable 'buffer' with the contents of 'path_or_file' starting at 'offset' and
+    returns the number of bytes read, which is less than the size of 'buffer' only if the end of the
+    file was reached first.
+
+    The 'path_or_file' may be a path, which is opened through winnan.os_shim.open(), a file
+    descriptor, or a file object with a fileno() method. The data is read directly into 'buffer'
+    using pread() where available, which leaves the position of a file descriptor or file object
+    unchanged. With 'threads' greater than 1, large buffers are split into that many parts that are
+    read concurrently.
+    """
+    view = _util.byte_view(buffer)
+    if view.readonly:
+        raise TypeError("readinto_all() requires a writable buffer")
+
+    if isinstance(path_or_file, integer_types):
+        return _readinto_fd(path_or_file, view, offset, threads)
+
+    if hasattr(path_or_file, "fileno"):
+        writable = getattr(path_or_file, "writable", None)
+        if writable is not None and writable():
+            # Data written to the file object but still buffered wouldn't be seen otherwise.
+            path_or_file.flush()
+        return _readinto_fd(path_or_file.fileno(), view, offset, threads)
+
+    fd = winnan.os_shim.open(_util.fspath(path_or_file), os.O_RDONLY | winnan.flags.O_BINARY)  # pylint: disable=invalid-name
+    try:
+        return _readinto_fd(fd, view, offset, threads)
+    finally:
+        winnan.os_shim.close(fd)
+
+
+def _readinto_fd(fd, view, offset, threads):  # pylint: disable=invalid-name
+    """Implements readinto_all() for the file descriptor 'fd'."""
+    if not _syscalls.has_pread():
+        return _seek_read_all(fd, view, offset)
+
+    threads = min(threads, len(view) // _MIN_PARALLEL_SIZE)
+    if threads > 1:
+        return _parallel_read_all(fd, view, offset, threads)
+    return _pread_all(fd, view, offset)
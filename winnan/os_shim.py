@@ -16,9 +16,11 @@ The following modifications were made to the original sources:
 from __future__ import absolute_import
 
 import errno
+import functools
 import os
 import stat
 import sys
+import threading
 
 if sys.platform in ("win32", "cygwin"):
     import msvcrt  # pylint: disable=import-error
@@ -55,8 +57,15 @@ if sys.platform in ("win32", "cygwin"):
         os.O_CREAT | os.O_TRUNC:             win32file.CREATE_ALWAYS,
     }  # yapf: disable
 
-    def open(file, flags, mode=0o777, share_flags=None):  # pylint: disable=redefined-builtin,too-many-branches
+    def open(file, flags, mode=0o777, share_flags=None):  # pylint: disable=redefined-builtin
         """Replacement for os.open() allowing moving or unlinking before closing."""
+        if _open_hook is not None:
+            return _open_hook(file, flags, mode, share_flags)
+
+        return _create_file(file, flags, mode, share_flags)
+
+    def _create_file(file, flags, mode, share_flags):  # pylint: disable=too-many-branches
+        """Opens 'file' using win32file.CreateFileW() and returns a C runtime file descriptor."""
         if isinstance(file, bytes):
             file = file.decode("mbcs")
 
@@ -110,4 +119,119 @@ else:
 
     def open(file, flags, mode=0o777, share_flags=None):  # pylint: disable=redefined-builtin,unused-argument
         """Wrapper around os.open() that ignores the 'share_flags' argument."""
+        if _open_hook is not None:
+            return _open_hook(file, flags, mode, share_flags)
+
+        return os.open(file, flags | winnan.flags.O_CLOEXEC, mode)
+
+    def _create_file(file, flags, mode, share_flags):  # pylint: disable=unused-argument
+        """Opens 'file' using os.open() with the O_CLOEXEC flag set."""
         return os.open(file, flags | winnan.flags.O_CLOEXEC, mode)
+
+if sys.platform in ("win32", "cygwin"):
+    _MISSING_WINERRORS = frozenset([
+        winerror.ERROR_FILE_NOT_FOUND,
+        winerror.ERROR_PATH_NOT_FOUND,
+        winerror.ERROR_FILE_EXISTS,
+    ])
+else:
+    _MISSING_WINERRORS = frozenset()
+
+
+def is_missing_error(err):
+    """Returns True if the exception raised by open() indicates the file doesn't exist or, when
+    using O_CREAT | O_EXCL, that the file already exists.
+
+    ENOTDIR is also treated as the file not existing because it means one of the leading path
+    components is a file rather than a directory.
+    """
+    if getattr(err, "errno", None) in (errno.ENOENT, errno.ENOTDIR, errno.EEXIST):
+        return True
+
+    return getattr(err, "winerror", None) in _MISSING_WINERRORS
+
+
+def try_open(file, flags, mode=0o777, share_flags=None):  # pylint: disable=redefined-builtin
+    """Variant of open() that returns None rather than raising an exception when the file doesn't
+    exist or, when using O_CREAT | O_EXCL, when the file already exists. See is_missing_error().
+    Any other error, e.g. EACCES or ELOOP, is raised as it is by open().
+    """
+    try:
+        return open(file, flags, mode=mode, share_flags=share_flags)
+    except EnvironmentError as err:
+        if is_missing_error(err):
+            return None
+        raise
+
+
+# The open hooks are kept as a list so they can be removed individually, but open() only ever looks
+# at '_open_hook'. It is None when no hooks are installed, which keeps the cost of the hook machinery
+# to a single branch on the common path.
+_OPEN_HOOKS = []
+_OPEN_HOOKS_LOCK = threading.Lock()
+_open_hook = None  # pylint: disable=invalid-name
+
+
+def _rebuild_open_hook():
+    """Composes the installed open hooks into the single callable that open() dispatches to."""
+    global _open_hook  # pylint: disable=global-statement,invalid-name
+
+    if not _OPEN_HOOKS:
+        _open_hook = None
+        return
+
+    chained = _create_file
+    for hook in _OPEN_HOOKS:
+        chained = functools.partial(hook, chained)
+
+    _open_hook = chained
+
+
+def add_open_hook(hook):
+    """Installs 'hook' around every call to open().
+
+    The hook is called as hook(next_open, file, flags, mode, share_flags) and must return an open
+    file descriptor, usually by calling next_open(file, flags, mode, share_flags). Hooks installed
+    later wrap the hooks installed earlier.
+    """
+    with _OPEN_HOOKS_LOCK:
+        _OPEN_HOOKS.append(hook)
+        _rebuild_open_hook()
+
+
+def remove_open_hook(hook):
+    """Uninstalls a hook previously installed with add_open_hook()."""
+    with _OPEN_HOOKS_LOCK:
+        _OPEN_HOOKS.remove(hook)
+        _rebuild_open_hook()
+
+
+# Close hooks are called with the file descriptor after it has been closed by close(). Like with the
+# open hooks, the list is empty in the common case.
+CLOSE_HOOKS = []
+
+
+def add_close_hook(hook):
+    """Installs 'hook' to be called as hook(fd) after close() closes a file descriptor."""
+    with _OPEN_HOOKS_LOCK:
+        CLOSE_HOOKS.append(hook)
+
+
+def remove_close_hook(hook):
+    """Uninstalls a hook previously installed with add_close_hook()."""
+    with _OPEN_HOOKS_LOCK:
+        CLOSE_HOOKS.remove(hook)
+
+
+def close(fd):  # pylint: disable=invalid-name
+    """Wrapper around os.close() that notifies the installed close hooks.
+
+    File descriptors returned by open() should be closed using this function so that features like
+    winnan.FdBudget can account for them. The file objects returned by winnan.open() do so
+    automatically.
+    """
+    try:
+        os.close(fd)
+    finally:
+        for hook in CLOSE_HOOKS:
+            hook(fd)
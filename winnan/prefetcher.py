@@ -0,0 +1,317 @@
+"""Module that provides warming the page cache for files shortly before they are opened.
+
+A batch job that knows which files it will read next can iterate over them through prefetch(). While
+the caller works on one file, the next few are opened through winnan.os_shim.open() on background
+threads and their contents are read ahead into the page cache, overlapping the I/O latency with the
+caller's computation.
+
+With keep_open=True, the file descriptors opened by the background threads are also handed to the
+caller's own winnan.open() calls in mode "r" or "rb" for the same paths, which saves opening the
+file a second time. A file descriptor is only handed over if the path still refers to the file that
+was opened.
+"""
+
+from __future__ import absolute_import
+
+import collections
+import errno
+import itertools
+import os
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue  # pylint: disable=import-error
+
+from winnan import _syscalls
+from winnan import _util
+import winnan.flags
+import winnan.os_shim
+
+# Only an open() with exactly these flags is handed a prefetched file descriptor. Any other flags,
+# e.g. O_NOFOLLOW or O_DIRECTORY, may have made the open() fail or return a different file.
+# winnan.os_shim.open() always adds O_CLOEXEC, so it is ignored when comparing the flags.
+_READ_FLAGS = winnan.flags.mode_to_flags("rb") | winnan.flags.O_CLOEXEC
+
+_CHUNK_SIZE = 1024 * 1024
+
+_UNSUPPORTED_ERRNOS = frozenset([errno.ENOSYS, errno.EINVAL, errno.ESPIPE])
+
+
+def warm(fd):  # pylint: disable=invalid-name
+    """Reads the contents of 'fd' ahead into the page cache without changing its file position.
+
+    Uses readahead() on Linux and posix_fadvise(WILLNEED) where available, and otherwise reads
+    through the file.
+    """
+    size = os.fstat(fd).st_size
+
+    for (func, args) in ((_syscalls.readahead, (fd, 0, size)),
+                         (_syscalls.posix_fadvise, (fd, 0, size, _syscalls.POSIX_FADV_WILLNEED))):
+        try:
+            func(*args)
+            return
+        except OSError as err:
+            if err.errno not in _UNSUPPORTED_ERRNOS:
+                raise
+
+    position = os.lseek(fd, 0, os.SEEK_CUR)
+    try:
+        os.lseek(fd, 0, os.SEEK_SET)
+        while os.read(fd, _CHUNK_SIZE):
+            pass
+    finally:
+        os.lseek(fd, position, os.SEEK_SET)
+
+
+class _Entry(object):  # pylint: disable=too-few-public-methods
+    """A path submitted to a Prefetcher and, once opened, its file descriptor."""
+
+    __slots__ = ("path", "fd", "done", "cancelled")
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None  # pylint: disable=invalid-name
+        self.done = threading.Event()
+        self.cancelled = False
+
+
+class Prefetcher(object):  # pylint: disable=too-many-instance-attributes
+    """Opens and warms the submitted paths on 'workers' background threads.
+
+    If 'keep_open' is True, each file descriptor is kept open until it is claimed by a read-only
+    winnan.open() of the same path or the path is discarded.
+    """
+
+    def __init__(self, workers=4, keep_open=False):
+        if workers < 1:
+            raise ValueError("invalid workers: %r" % (workers, ))
+
+        self.keep_open = keep_open
+        self.last_error = None
+
+        self._lock = threading.Lock()
+        self._entries = collections.defaultdict(collections.deque)
+        self._queue = queue.Queue()
+        self._threads = []
+        self._closed = False
+
+        for i in range(workers):
+            thread = threading.Thread(target=self._run, name="winnan-prefetch-%d" % i)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+        if keep_open:
+            _add_handoff(self)
+
+    def submit(self, path):
+        """Schedules 'path' to be opened and warmed on a background thread and returns a handle
+        that can be passed to discard().
+        """
+        path = _util.fspath(path)
+        entry = _Entry(path)
+
+        with self._lock:
+            if self._closed:
+                raise ValueError("Prefetcher is closed")
+            self._entries[os.path.abspath(path)].append(entry)
+
+        self._queue.put(entry)
+        return entry
+
+    def _run(self):
+        """Opens and warms the submitted paths until close() is called."""
+        while True:
+            entry = self._queue.get()
+            if entry is None:
+                return
+
+            if not entry.cancelled:
+                self._prefetch(entry)
+
+            entry.done.set()
+
+    def _prefetch(self, entry):
+        """Opens and warms the path of 'entry', keeping the file descriptor if requested."""
+        # Our own open() must not be handed the file descriptor we're in the middle of opening.
+        _LOCAL.prefetching = True
+        try:
+            fd = winnan.os_shim.open(entry.path, _READ_FLAGS)  # pylint: disable=invalid-name
+        except EnvironmentError as err:
+            # The caller's own open() reports the error if the file is really needed.
+            self.last_error = err
+            return
+        finally:
+            _LOCAL.prefetching = False
+
+        try:
+            warm(fd)
+        except OSError as err:
+            self.last_error = err
+
+        with self._lock:
+            if self.keep_open and not entry.cancelled:
+                entry.fd = fd
+                return
+
+        winnan.os_shim.close(fd)
+
+    def claim(self, path):
+        """Returns the prefetched file descriptor for 'path', waiting for it to be opened if it is
+        still in progress. Returns None if 'path' wasn't submitted or couldn't be opened.
+        """
+        key = os.path.abspath(path)
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                return None
+
+            entry = entries.popleft()
+            if not entries:
+                del self._entries[key]
+
+        entry.done.wait()
+        return entry.fd
+
+    def discard(self, handle):
+        """Closes the file descriptor prefetched for the handle returned by submit() unless it was
+        already claimed.
+        """
+        key = os.path.abspath(handle.path)
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries or handle not in entries:
+                return
+
+            entries.remove(handle)
+            if not entries:
+                del self._entries[key]
+
+            handle.cancelled = True
+            fd = handle.fd  # pylint: disable=invalid-name
+            handle.fd = None
+
+        if fd is not None:
+            winnan.os_shim.close(fd)
+
+    def close(self):
+        """Stops the background threads and closes every unclaimed file descriptor."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+
+            entries = [entry for entries in self._entries.values() for entry in entries]
+            self._entries.clear()
+
+            fds = []
+            for entry in entries:
+                # A thread that is still opening the file closes it once it notices the
+                # cancellation.
+                entry.cancelled = True
+                if entry.fd is not None:
+                    fds.append(entry.fd)
+                    entry.fd = None
+
+        if self.keep_open:
+            _remove_handoff(self)
+
+        for fd in fds:  # pylint: disable=invalid-name
+            winnan.os_shim.close(fd)
+
+        for _ in self._threads:
+            self._queue.put(None)
+
+        for thread in self._threads:
+            thread.join()
+
+        self._threads = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+_HANDOFFS = []
+_HANDOFFS_LOCK = threading.Lock()
+_LOCAL = threading.local()
+
+
+def _handoff_hook(next_open, file, flags, mode, share_flags):  # pylint: disable=redefined-builtin,too-many-arguments
+    """Hook for winnan.os_shim.add_open_hook() that returns a prefetched file descriptor for
+    read-only opens of a prefetched path with the same flags.
+    """
+    if ((flags | winnan.flags.O_CLOEXEC) == _READ_FLAGS and share_flags is None
+            and not getattr(_LOCAL, "prefetching", False)):
+        for prefetcher in list(_HANDOFFS):
+            fd = prefetcher.claim(file)  # pylint: disable=invalid-name
+            if fd is None:
+                continue
+
+            if _is_same_file(fd, file):
+                return fd
+
+            # The path was replaced or removed after the file was prefetched.
+            winnan.os_shim.close(fd)
+            break
+
+    return next_open(file, flags, mode, share_flags)
+
+
+def _is_same_file(fd, path):  # pylint: disable=invalid-name
+    """Returns True if 'path' still refers to the file open as 'fd'."""
+    try:
+        path_stat = os.stat(path)
+    except OSError:
+        return False
+
+    fd_stat = os.fstat(fd)
+    return (fd_stat.st_dev, fd_stat.st_ino) == (path_stat.st_dev, path_stat.st_ino)
+
+
+def _add_handoff(prefetcher):
+    """Starts handing the file descriptors of 'prefetcher' to winnan.os_shim.open()."""
+    with _HANDOFFS_LOCK:
+        _HANDOFFS.append(prefetcher)
+        if len(_HANDOFFS) == 1:
+            winnan.os_shim.add_open_hook(_handoff_hook)
+
+
+def _remove_handoff(prefetcher):
+    """Stops handing the file descriptors of 'prefetcher' to winnan.os_shim.open()."""
+    with _HANDOFFS_LOCK:
+        _HANDOFFS.remove(prefetcher)
+        if not _HANDOFFS:
+            winnan.os_shim.remove_open_hook(_handoff_hook)
+
+
+def prefetch(paths, depth=4, keep_open=False):
+    """Yields each of 'paths' in order while the next 'depth' paths are opened and warmed on
+    background threads.
+
+    The 'paths' may be any iterable, including a generator reading from a work queue, and are only
+    consumed 'depth' items ahead of the caller. If 'keep_open' is True, a read-only winnan.open() of
+    the yielded path reuses the prefetched file descriptor. A prefetched file descriptor that isn't
+    claimed before the caller advances to the next path is closed.
+    """
+    if depth < 1:
+        raise ValueError("invalid depth: %r" % (depth, ))
+
+    iterator = iter(paths)
+    window = collections.deque()
+
+    with Prefetcher(workers=depth, keep_open=keep_open) as prefetcher:
+        for path in itertools.islice(iterator, depth):
+            window.append((path, prefetcher.submit(path)))
+
+        while window:
+            (path, handle) = window.popleft()
+            for upcoming in itertools.islice(iterator, 1):
+                window.append((upcoming, prefetcher.submit(upcoming)))
+
+            yield path
+            prefetcher.discard(handle)
@@ -0,0 +1,135 @@
+"""Module that provides a cache of file contents keyed by the identity of the file on disk.
+
+Entries are validated with a single os.stat() call per lookup. The (st_dev, st_ino, st_size,
+st_mtime_ns) tuple changes whenever a file is atomically replaced or modified in place, so a stale
+entry is never returned for a file that is written using the usual write-then-rename pattern.
+"""
+
+from __future__ import absolute_import
+
+import collections
+import os
+import sys
+import threading
+
+import winnan.io_shim
+
+CacheInfo = collections.namedtuple("CacheInfo", ["hits", "misses", "entries", "nbytes"])
+
+
+def _file_key(stat_info):
+    """Returns the tuple identifying a particular version of a file."""
+    mtime_ns = getattr(stat_info, "st_mtime_ns", None)
+    if mtime_ns is None:
+        # The st_mtime_ns attribute was added in Python 3.3.
+        mtime_ns = int(stat_info.st_mtime * 1e9)
+
+    return (stat_info.st_dev, stat_info.st_ino, stat_info.st_size, mtime_ns)
+
+
+class ReadCache(object):
+    """Least-recently-used cache of file contents or of the values parsed from them.
+
+    The cache is bounded both by the number of entries and by the total size of the files whose
+    contents or parsed values it holds.
+    """
+
+    def __init__(self, max_entries=128, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._nbytes = 0
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, path, loader=None):
+        """Returns the contents of 'path' as bytes or, if 'loader' is specified, the result of
+        calling loader(contents).
+
+        A cached value is returned if the file hasn't changed since it was last read. Otherwise,
+        the file is read through winnan.open() so a concurrent rename or unlink of the file doesn't
+        cause the read to fail.
+        """
+        if sys.version_info >= (3, 6):
+            path = os.fspath(path)  # pylint: disable=no-member
+
+        cache_key = (path, loader)
+        file_key = _file_key(os.stat(path))
+
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and entry[0] == file_key:
+                self._touch(cache_key, entry)
+                self._hits += 1
+                return entry[1]
+
+            self._misses += 1
+
+        with winnan.io_shim.open(path, "rb") as fileobj:
+            # The file may have been replaced since os.stat() was called, so we key the entry on
+            # the version of the file we actually read.
+            file_key = _file_key(os.fstat(fileobj.fileno()))
+            contents = fileobj.read()
+
+        value = contents if loader is None else loader(contents)
+        self._store(cache_key, (file_key, value, len(contents)))
+        return value
+
+    def _touch(self, cache_key, entry):
+        """Marks the entry as the most recently used."""
+        if hasattr(self._entries, "move_to_end"):
+            self._entries.move_to_end(cache_key)
+        else:
+            del self._entries[cache_key]
+            self._entries[cache_key] = entry
+
+    def _store(self, cache_key, entry):
+        """Inserts 'entry' and evicts the least recently used entries until the limits are met."""
+        nbytes = entry[2]
+        if nbytes > self.max_bytes:
+            # Caching the entry would evict everything else, so we don't bother.
+            return
+
+        with self._lock:
+            previous = self._entries.pop(cache_key, None)
+            if previous is not None:
+                self._nbytes -= previous[2]
+
+            self._entries[cache_key] = entry
+            self._nbytes += nbytes
+
+            while len(self._entries) > self.max_entries or self._nbytes > self.max_bytes:
+                (_, evicted) = self._entries.popitem(last=False)
+                self._nbytes -= evicted[2]
+
+    def invalidate(self, path=None):
+        """Discards the cached entries for 'path', or every entry if 'path' is None."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self._nbytes = 0
+                return
+
+            for cache_key in [key for key in self._entries if key[0] == path]:
+                self._nbytes -= self._entries.pop(cache_key)[2]
+
+    def info(self):
+        """Returns a CacheInfo instance describing the hits, misses, and current size."""
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, len(self._entries), self._nbytes)
+
+
+_DEFAULT_CACHE = ReadCache()
+
+
+def read_cached(path, loader=None, cache=None):
+    """Returns the contents of 'path', or loader(contents), memoized until the file changes.
+
+    The module-level cache is used unless a ReadCache instance is specified as 'cache'.
+    """
+    if cache is None:
+        cache = _DEFAULT_CACHE
+
+    return cache.get(path, loader)
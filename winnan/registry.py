@@ -0,0 +1,287 @@
+"""Module that provides an opt-in registry of the file descriptors opened through winnan.
+
+The registry is disabled by default. When it is enabled, every file descriptor returned by
+winnan.os_shim.open() is recorded along with its path, mode, and the time it was opened. File
+objects returned by winnan.io_shim.open() are additionally tracked using a weak reference so their
+entries disappear as soon as they are garbage collected.
+
+Entries are keyed by file descriptor number. A file descriptor number that is reused by a later
+open() therefore replaces the stale entry for the earlier one. Entries are removed as soon as their
+file descriptor is closed using winnan.os_shim.close(), which the file objects returned by
+winnan.open() do. File descriptors closed directly with os.close() are only detected as stale, and
+removed, by prune() and oldest().
+"""
+
+from __future__ import absolute_import
+
+import collections
+import os
+import random
+import threading
+import time
+import traceback
+import weakref
+
+import winnan.os_shim
+
+Handle = collections.namedtuple("Handle", ["fd", "path", "mode", "opened_at", "stack"])
+
+ENABLED = False
+
+# The lock is reentrant because the weakref callbacks that remove entries may be run by the garbage
+# collector while the same thread already holds it.
+_LOCK = threading.RLock()
+_HANDLES = {}
+# The number of entries in _HANDLES for each mode string, kept up to date so counting is cheap.
+_MODE_COUNTS = collections.Counter()
+_STACK_SAMPLE_RATE = 0.0
+_STACK_LIMIT = None
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class _Entry(object):  # pylint: disable=too-few-public-methods
+    """Mutable record for a single live file descriptor."""
+
+    __slots__ = ("fd", "path", "mode", "opened_at", "stack", "identity", "fileobj_ref")
+
+    def __init__(self, fd, path, mode, opened_at, stack, identity):  # pylint: disable=invalid-name,too-many-arguments
+        self.fd = fd  # pylint: disable=invalid-name
+        self.path = path
+        self.mode = mode
+        self.opened_at = opened_at
+        self.stack = stack
+        self.identity = identity
+        self.fileobj_ref = None
+
+    def is_alive(self):
+        """Returns True if the file descriptor still refers to the file that was opened."""
+        if self.fileobj_ref is not None:
+            fileobj = self.fileobj_ref()
+            return fileobj is not None and not fileobj.closed
+
+        try:
+            return _identity(os.fstat(self.fd)) == self.identity
+        except OSError:
+            return False
+
+    def to_handle(self):
+        """Returns an immutable snapshot of the entry."""
+        return Handle(self.fd, self.path, self.mode, self.opened_at, self.stack)
+
+
+def _identity(stat_info):
+    """Returns the (st_dev, st_ino) pair used to detect file descriptor reuse."""
+    return (stat_info.st_dev, stat_info.st_ino)
+
+
+def _flags_to_mode(flags):
+    """Returns a mode string approximating the access mode of the os.open() 'flags'."""
+    access = flags & (os.O_RDONLY | os.O_WRONLY | os.O_RDWR)
+
+    if access == os.O_RDWR:
+        mode = "r+"
+    elif access == os.O_WRONLY:
+        mode = "a" if flags & os.O_APPEND else "w"
+    else:
+        mode = "r"
+
+    return mode
+
+
+def _sample_stack():
+    """Returns the caller's stack with the configured probability, or None otherwise."""
+    if _STACK_SAMPLE_RATE and random.random() < _STACK_SAMPLE_RATE:
+        # Drop the frames belonging to winnan itself so the stack ends at the caller of open().
+        stack = traceback.extract_stack(limit=_STACK_LIMIT)
+        return [frame for frame in stack if os.path.dirname(frame[0]) != _PACKAGE_DIR]
+
+    return None
+
+
+def _add(fd, entry):  # pylint: disable=invalid-name
+    """Registers 'entry' for 'fd', replacing any stale entry. Must be called with _LOCK held."""
+    previous = _HANDLES.get(fd)
+    if previous is not None:
+        _discard(fd, previous)
+
+    _HANDLES[fd] = entry
+    _MODE_COUNTS[entry.mode] += 1
+
+
+def _discard(fd, entry):  # pylint: disable=invalid-name
+    """Removes 'entry' if it is still registered for 'fd'. Must be called with _LOCK held."""
+    if _HANDLES.get(fd) is not entry:
+        return False
+
+    del _HANDLES[fd]
+    _MODE_COUNTS[entry.mode] -= 1
+    if not _MODE_COUNTS[entry.mode]:
+        del _MODE_COUNTS[entry.mode]
+    return True
+
+
+def _open_hook(next_open, file, flags, mode, share_flags):  # pylint: disable=redefined-builtin
+    """Hook installed on winnan.os_shim.open() that records each file descriptor it returns."""
+    fd = next_open(file, flags, mode, share_flags)  # pylint: disable=invalid-name
+
+    try:
+        identity = _identity(os.fstat(fd))
+    except OSError:
+        identity = None
+
+    entry = _Entry(fd, file, _flags_to_mode(flags), time.time(), _sample_stack(), identity)
+
+    with _LOCK:
+        _add(fd, entry)
+
+    return fd
+
+
+def _close_hook(fd):  # pylint: disable=invalid-name
+    """Hook installed on winnan.os_shim.close() that removes the entry for the closed 'fd'."""
+    with _LOCK:
+        entry = _HANDLES.get(fd)
+        if entry is None:
+            return
+
+        if entry.fileobj_ref is not None:
+            # Another thread may have reused the file descriptor number for a new file object
+            # since the file descriptor was closed.
+            fileobj = entry.fileobj_ref()
+            if fileobj is not None and not fileobj.closed:
+                return
+
+        _discard(fd, entry)
+
+
+def _on_fileobj_collected(fd, entry):
+    """Returns a weakref callback that removes 'entry' if it is still registered for 'fd'."""
+
+    def callback(_ref):  # pylint: disable=missing-docstring
+        with _LOCK:
+            _discard(fd, entry)
+
+    return callback
+
+
+def attach(fileobj, mode):
+    """Associates the file object returned by winnan.io_shim.open() with its registry entry.
+
+    This function is called by winnan.io_shim.open() when the registry is enabled.
+    """
+    fd = fileobj.fileno()  # pylint: disable=invalid-name
+
+    with _LOCK:
+        entry = _HANDLES.get(fd)
+        if entry is None:
+            # The file descriptor was opened by a custom opener or passed in directly.
+            entry = _Entry(fd, fileobj.name, mode, time.time(), _sample_stack(), None)
+            _add(fd, entry)
+        elif entry.mode != mode:
+            _MODE_COUNTS[entry.mode] -= 1
+            if not _MODE_COUNTS[entry.mode]:
+                del _MODE_COUNTS[entry.mode]
+            entry.mode = mode
+            _MODE_COUNTS[mode] += 1
+
+        entry.fileobj_ref = weakref.ref(fileobj, _on_fileobj_collected(fd, entry))
+
+
+def enable(stack_sample_rate=0.0, stack_limit=None):
+    """Starts recording the file descriptors opened through winnan.
+
+    A 'stack_sample_rate' between 0.0 and 1.0 controls the fraction of open() calls for which the
+    caller's stack is captured. Capturing stacks is comparatively expensive and is therefore
+    disabled by default. 'stack_limit' bounds the number of frames captured.
+    """
+    global ENABLED, _STACK_SAMPLE_RATE, _STACK_LIMIT  # pylint: disable=global-statement,invalid-name
+
+    if not 0.0 <= stack_sample_rate <= 1.0:
+        raise ValueError("invalid stack_sample_rate: %r" % (stack_sample_rate, ))
+
+    _STACK_SAMPLE_RATE = stack_sample_rate
+    _STACK_LIMIT = stack_limit
+
+    if not ENABLED:
+        winnan.os_shim.add_open_hook(_open_hook)
+        winnan.os_shim.add_close_hook(_close_hook)
+        ENABLED = True
+
+
+def disable():
+    """Stops recording file descriptors and forgets all of the ones recorded so far."""
+    global ENABLED  # pylint: disable=global-statement,invalid-name
+
+    if ENABLED:
+        winnan.os_shim.remove_open_hook(_open_hook)
+        winnan.os_shim.remove_close_hook(_close_hook)
+        ENABLED = False
+
+    with _LOCK:
+        _HANDLES.clear()
+        _MODE_COUNTS.clear()
+
+
+def count(prefix=None, mode=None):
+    """Returns the number of registered file descriptors, optionally filtered by path prefix and by
+    mode string. File descriptors closed with os.close() are still counted until prune() is called.
+    """
+    with _LOCK:
+        if prefix is None:
+            return len(_HANDLES) if mode is None else _MODE_COUNTS[mode]
+        entries = list(_HANDLES.values())
+
+    return sum(1 for entry in entries
+               if (prefix is None or _has_prefix(entry.path, prefix))
+               and (mode is None or entry.mode == mode))
+
+
+def counts_by_mode(prefix=None):
+    """Returns a dict mapping each mode string to the number of registered file descriptors, with
+    the same caveat as count().
+    """
+    counts = collections.Counter()
+
+    with _LOCK:
+        if prefix is None:
+            return dict(_MODE_COUNTS)
+        entries = list(_HANDLES.values())
+
+    for entry in entries:
+        if prefix is None or _has_prefix(entry.path, prefix):
+            counts[entry.mode] += 1
+
+    return dict(counts)
+
+
+def _has_prefix(path, prefix):
+    """Returns True if 'path' is a string starting with 'prefix'."""
+    return isinstance(path, type(prefix)) and path.startswith(prefix)
+
+
+def prune():
+    """Removes the entries for file descriptors that have since been closed and returns how many
+    were removed.
+    """
+    with _LOCK:
+        items = list(_HANDLES.items())
+
+    stale = [(fd, entry) for (fd, entry) in items if not entry.is_alive()]
+
+    with _LOCK:
+        for (fd, entry) in stale:  # pylint: disable=invalid-name
+            _discard(fd, entry)
+
+    return len(stale)
+
+
+def oldest(limit=10):
+    """Returns a list of up to 'limit' Handle instances for the longest-lived file descriptors that
+    are still open.
+    """
+    prune()
+
+    with _LOCK:
+        entries = sorted(_HANDLES.values(), key=lambda entry: entry.opened_at)
+
+    return [entry.to_handle() for entry in entries[:limit]]
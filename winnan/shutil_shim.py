@@ -0,0 +1,428 @@
+"""Replacements for functions in the shutil module that cope with files opened through winnan."""
+
+from __future__ import absolute_import
+
+import errno
+import io
+import multiprocessing
+import os
+import shutil
+import sys
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # The fcntl module isn't available on Windows.
+    fcntl = None  # pylint: disable=invalid-name
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue  # pylint: disable=import-error
+
+import winnan.flags
+import winnan.os_shim
+
+_DIR_FLAGS = (os.O_RDONLY | getattr(os, "O_DIRECTORY", 0) | getattr(os, "O_NOFOLLOW", 0)
+              | winnan.flags.O_CLOEXEC)
+
+# Walking the tree relative to open directory file descriptors avoids re-resolving every path
+# component for each entry and guards against a directory being swapped out for a symbolic link
+# while it is being removed. os.scandir() only accepts a file descriptor starting in Python 3.7 and
+# the 'dir_fd' arguments are unavailable on Windows, so we fall back to walking by path there.
+_HAVE_DIR_FD = (hasattr(os, "scandir") and getattr(os, "supports_fd", None) is not None
+                and os.scandir in os.supports_fd  # pylint: disable=no-member
+                and {os.open, os.unlink, os.rmdir} <= os.supports_dir_fd)  # pylint: disable=no-member
+
+# On Windows, a file that was unlinked while still open elsewhere remains in its directory in a
+# "delete pending" state until the last handle to it is closed. Removing the containing directory
+# fails until then, so we retry for a short while before reporting an error.
+_DELETE_PENDING_RETRIES = 5 if sys.platform in ("win32", "cygwin") else 0
+_DELETE_PENDING_BACKOFF = 0.01
+
+# Strategies returned by clone().
+CLONE = "clone"
+COPY_FILE_RANGE = "copy_file_range"
+COPY = "copy"
+
+# The FICLONE ioctl is _IOW(0x94, 9, int) from <linux/fs.h>. It asks the filesystem to share the
+# source file's extents with the destination file, which btrfs, XFS, and OCFS2 do without copying
+# any data.
+_FICLONE = 0x40049409 if sys.platform.startswith("linux") else None
+
+# The errno values for which cloning or copy_file_range() are unsupported for the given pair of
+# files, rather than indicating a real I/O error.
+_UNSUPPORTED_ERRNOS = frozenset(
+    getattr(errno, name) for name in ("EBADF", "EINVAL", "ENOSYS", "ENOTSUP", "ENOTTY",
+                                      "EOPNOTSUPP", "EPERM", "ETXTBSY", "EXDEV")
+    if hasattr(errno, name))
+
+_COPY_BUFSIZE = 1024 * 1024
+
+# The shutil.SameFileError exception class was added in Python 3.4.
+_SameFileError = getattr(shutil, "SameFileError", shutil.Error)  # pylint: disable=invalid-name
+
+
+class _Directory(object):  # pylint: disable=too-few-public-methods
+    """State for a directory whose removal is in progress."""
+
+    __slots__ = ("parent", "name", "path", "fd", "pending", "failed")
+
+    def __init__(self, parent, name, path):
+        self.parent = parent
+        self.name = name
+        self.path = path
+        self.fd = None  # pylint: disable=invalid-name
+
+        # The directory can only be removed once it has been scanned and all of its subdirectories
+        # have been removed. 'pending' counts the outstanding scan and subdirectories.
+        self.pending = 1
+        self.failed = False
+
+
+class _TreeRemover(object):
+    """Removes a directory tree using a pool of worker threads."""
+
+    def __init__(self, path, workers, onerror, progress):
+        self._root = _Directory(None, None, path)
+        self._workers = workers
+        self._onerror = onerror
+        self._progress = progress
+
+        self._lock = threading.Lock()
+        self._queue = queue.LifoQueue()
+        self._open = set()
+        self._exception = None
+        self.errors = []
+
+    def run(self):
+        """Removes the tree, returning once every entry has either been removed or failed. Raises
+        the first exception raised by a callback, after stopping the rest of the work.
+        """
+        self._queue.put(self._root)
+
+        if self._workers <= 1:
+            self._work()
+        else:
+            threads = [threading.Thread(target=self._work) for _ in range(self._workers)]
+            for thread in threads:
+                thread.daemon = True
+                thread.start()
+
+            for thread in threads:
+                thread.join()
+
+        if self._exception is not None:
+            # The directories that were still being worked on are left behind.
+            for directory in self._open:
+                os.close(directory.fd)
+            self._open.clear()
+            raise self._exception
+
+    def _work(self):
+        """Processes directories from the queue until the whole tree has been handled or an
+        exception stopped the work.
+        """
+        while True:
+            directory = self._queue.get()
+            if directory is None or self._exception is not None:
+                return
+
+            try:
+                self._scan(directory)
+            except BaseException as err:  # pylint: disable=broad-except
+                with self._lock:
+                    if self._exception is None:
+                        self._exception = err
+                # Wake up the other workers, which return upon seeing the exception.
+                for _ in range(self._workers):
+                    self._queue.put(None)
+                return
+
+    def _error(self, func, path, exc_info):
+        """Records the error or reports it to the 'onerror' callback."""
+        with self._lock:
+            if self._onerror is not None:
+                self._onerror(func, path, exc_info)
+            else:
+                self.errors.append((path, str(exc_info[1])))
+
+    def _report(self, path):
+        """Notifies the 'progress' callback that 'path' was removed."""
+        if self._progress is not None:
+            with self._lock:
+                self._progress(path)
+
+    def _scan(self, directory):
+        """Unlinks the non-directory entries and queues the subdirectories of 'directory'."""
+        try:
+            if not _HAVE_DIR_FD:
+                entries = _list_entries(directory.path)
+            else:
+                if directory.parent is None:
+                    directory.fd = os.open(directory.path, _DIR_FLAGS)
+                else:
+                    directory.fd = os.open(directory.name, _DIR_FLAGS,
+                                           dir_fd=directory.parent.fd)
+                with self._lock:
+                    self._open.add(directory)
+                entries = _list_entries(directory.fd)
+        except OSError as err:
+            if directory.parent is None and self._onerror is None:
+                # Matches shutil.rmtree(), which raises the original error for the top directory.
+                raise
+
+            # A subdirectory that was removed concurrently doesn't need to be removed by us.
+            if err.errno != errno.ENOENT or directory.parent is None:
+                self._error(os.open if _HAVE_DIR_FD else os.listdir, directory.path,
+                            sys.exc_info())
+                directory.failed = True
+
+            self._release(directory)
+            return
+
+        for (name, is_dir) in entries:
+            path = os.path.join(directory.path, name)
+
+            if is_dir:
+                with self._lock:
+                    directory.pending += 1
+                self._queue.put(_Directory(directory, name, path))
+                continue
+
+            try:
+                if _HAVE_DIR_FD:
+                    os.unlink(name, dir_fd=directory.fd)
+                else:
+                    os.unlink(path)
+            except OSError as err:
+                if err.errno == errno.ENOENT or (_DELETE_PENDING_RETRIES
+                                                 and err.errno == errno.EACCES):
+                    # The entry was removed concurrently or is already pending deletion. In the
+                    # latter case, the error surfaces when removing the containing directory.
+                    continue
+
+                self._error(os.unlink, path, sys.exc_info())
+                directory.failed = True
+            else:
+                self._report(path)
+
+        self._release(directory)
+
+    def _release(self, directory):
+        """Marks one outstanding piece of work for 'directory' as done and removes the directory and
+        any of its ancestors that have become empty.
+        """
+        while directory is not None:
+            with self._lock:
+                directory.pending -= 1
+                if directory.pending:
+                    return
+
+            parent = directory.parent
+
+            if directory.fd is not None:
+                with self._lock:
+                    self._open.discard(directory)
+                os.close(directory.fd)
+                directory.fd = None
+
+            if directory.failed:
+                # The directory can't be empty, so we skip removing it and its ancestors to avoid
+                # reporting a cascade of "Directory not empty" errors.
+                if parent is not None:
+                    parent.failed = True
+            elif not self._remove_directory(directory) and parent is not None:
+                parent.failed = True
+
+            if parent is None:
+                for _ in range(self._workers):
+                    self._queue.put(None)
+
+            directory = parent
+
+    def _remove_directory(self, directory):
+        """Removes the now-empty 'directory' and returns True if it succeeded."""
+        for attempt in range(_DELETE_PENDING_RETRIES + 1):
+            try:
+                if _HAVE_DIR_FD and directory.parent is not None:
+                    os.rmdir(directory.name, dir_fd=directory.parent.fd)
+                else:
+                    os.rmdir(directory.path)
+            except OSError as err:
+                if err.errno == errno.ENOENT:
+                    return True
+
+                if attempt < _DELETE_PENDING_RETRIES and err.errno in (errno.ENOTEMPTY,
+                                                                       errno.EACCES):
+                    time.sleep(_DELETE_PENDING_BACKOFF * 2**attempt)
+                    continue
+
+                self._error(os.rmdir, directory.path, sys.exc_info())
+                return False
+            else:
+                self._report(directory.path)
+                return True
+
+        return False
+
+
+def _list_entries(directory):
+    """Returns a list of (name, is_dir) pairs for the entries of 'directory' without following
+    symbolic links.
+    """
+    if hasattr(os, "scandir"):
+        iterator = os.scandir(directory)  # pylint: disable=no-member
+        try:
+            return [(entry.name, entry.is_dir(follow_symlinks=False)) for entry in iterator]
+        finally:
+            if hasattr(iterator, "close"):
+                iterator.close()
+
+    return [(name, os.path.isdir(os.path.join(directory, name))
+             and not os.path.islink(os.path.join(directory, name)))
+            for name in os.listdir(directory)]
+
+
+def rmtree(path, workers=None, onerror=None, progress=None):
+    """Replacement for shutil.rmtree() that removes independent subtrees in parallel.
+
+    Files opened through winnan can be unlinked while they are still open. On Windows, such files
+    linger in a "delete pending" state until they are closed, and removing their directory is
+    retried briefly before the failure is reported.
+
+    An error removing one entry doesn't stop the rest of the tree from being removed. If 'onerror'
+    is specified, it is called as onerror(function, path, exc_info) for each error, similar to
+    shutil.rmtree(). Otherwise, a shutil.Error exception listing every (path, message) pair is
+    raised after the rest of the tree has been removed, except that an error opening 'path' itself
+    is raised as is. If 'progress' is specified, it is called with the path of each file and
+    directory after it has been removed. Both callbacks may be called from worker threads but are
+    never called concurrently. An exception raised by either callback stops the removal and is
+    raised by rmtree().
+    """
+    if sys.version_info >= (3, 6):
+        path = os.fspath(path)  # pylint: disable=no-member
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+
+    if os.path.islink(path):
+        # Matches the behavior of shutil.rmtree(), which refuses to remove a symbolic link.
+        try:
+            raise OSError("Cannot call rmtree on a symbolic link")
+        except OSError:
+            if onerror is None:
+                raise
+            onerror(os.path.islink, path, sys.exc_info())
+            return
+
+    remover = _TreeRemover(path, max(workers, 1), onerror, progress)
+    remover.run()
+
+    if remover.errors:
+        raise shutil.Error(remover.errors)
+
+
+def _clone_fd(src_fd, dst_fd):
+    """Shares the extents of 'src_fd' with 'dst_fd' and returns True, or returns False if the
+    filesystem doesn't support it.
+    """
+    if fcntl is None or _FICLONE is None:
+        return False
+
+    try:
+        fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+    except (IOError, OSError) as err:
+        if err.errno in _UNSUPPORTED_ERRNOS:
+            return False
+        raise
+
+    return True
+
+
+def _copy_file_range_fd(src_fd, dst_fd, size):
+    """Copies 'src_fd' to 'dst_fd' inside the kernel, in requests of at least 'size' bytes, and
+    returns True, or returns False if copy_file_range() isn't supported for the two files.
+    """
+    copy_file_range = getattr(os, "copy_file_range", None)
+    if copy_file_range is None:
+        return False
+
+    # Files in procfs and sysfs report a size of 0, so the copy continues until the end of the file
+    # rather than stopping after 'size' bytes, like shutil.copyfile() does.
+    size = max(size, _COPY_BUFSIZE)
+    copied = 0
+    while True:
+        try:
+            count = copy_file_range(src_fd, dst_fd, size)
+        except OSError as err:
+            if copied == 0 and err.errno in _UNSUPPORTED_ERRNOS:
+                return False
+            raise
+
+        if count == 0:
+            # Nothing being copied from the start of the file either means the file is empty or
+            # that copy_file_range() doesn't support it, which the buffered copy finds out.
+            return copied > 0
+
+        copied += count
+
+
+def _copy_fd(src_fd, dst_fd):
+    """Copies 'src_fd' to 'dst_fd' through a single reusable buffer."""
+    buf = bytearray(_COPY_BUFSIZE)
+    view = memoryview(buf)
+
+    with io.FileIO(src_fd, "rb", closefd=False) as src:
+        while True:
+            count = src.readinto(buf)
+            if not count:
+                break
+
+            written = 0
+            while written < count:
+                written += os.write(dst_fd, view[written:count])
+
+
+def clone(src, dst):
+    """Copies the contents of 'src' to 'dst', sharing the underlying storage when possible.
+
+    Both files are opened through winnan.os_shim.open(). The copy is first attempted with the
+    FICLONE ioctl, which is an O(1) metadata operation on filesystems supporting reflinks, such as
+    btrfs and XFS. If the files can't be cloned, the contents are copied using copy_file_range()
+    and finally with a buffered copy. Returns the strategy that was used, one of CLONE,
+    COPY_FILE_RANGE, or COPY.
+
+    Like shutil.copyfile(), the permission bits and other metadata of 'src' aren't copied, and
+    shutil.SameFileError is raised if 'src' and 'dst' are the same file.
+    """
+    src_fd = winnan.os_shim.open(src, os.O_RDONLY | winnan.flags.O_BINARY)
+    try:
+        # Opening 'dst' truncates it, which would destroy 'src' if they were the same file.
+        try:
+            dst_stat = os.stat(dst)
+        except OSError as err:
+            if err.errno != errno.ENOENT:
+                raise
+        else:
+            src_stat = os.fstat(src_fd)
+            if (src_stat.st_dev, src_stat.st_ino) == (dst_stat.st_dev, dst_stat.st_ino):
+                raise _SameFileError("%r and %r are the same file" % (src, dst))
+
+        dst_fd = winnan.os_shim.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+                                     | winnan.flags.O_BINARY, 0o666)
+        try:
+            if _clone_fd(src_fd, dst_fd):
+                return CLONE
+
+            if _copy_file_range_fd(src_fd, dst_fd, os.fstat(src_fd).st_size):
+                return COPY_FILE_RANGE
+
+            _copy_fd(src_fd, dst_fd)
+            return COPY
+        finally:
+            winnan.os_shim.close(dst_fd)
+    finally:
+        winnan.os_shim.close(src_fd)
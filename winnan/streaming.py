@@ -0,0 +1,185 @@
+"""Module that provides a file writer for streaming large amounts of data that won't be read back.
+
+Data written through a regular file object sits in the page cache as dirty pages until the kernel
+decides to write it back, which evicts pages other processes still need and causes the writer to
+stall once the dirty limits are reached. A StreamingWriter instead starts the writeback of each
+window of the file as soon as it has been written, waits for the writeback of the window before
+it, and then tells the kernel the pages of that window won't be needed again. This bounds the
+amount of dirty memory to roughly two windows per file and keeps the throughput steady.
+
+The approach is described in https://lkml.org/lkml/2010/4/28/201. On platforms without
+sync_file_range(), each completed window is flushed with fdatasync() instead.
+"""
+
+from __future__ import absolute_import
+
+import errno
+import io
+import os
+
+from winnan import _syscalls
+import winnan.io_shim
+
+DEFAULT_WINDOW_SIZE = 8 * 1024 * 1024
+
+_WAIT_AND_WRITE = (_syscalls.SYNC_FILE_RANGE_WAIT_BEFORE | _syscalls.SYNC_FILE_RANGE_WRITE
+                   | _syscalls.SYNC_FILE_RANGE_WAIT_AFTER)
+
+# The errors indicating the file descriptor refers to something sync_file_range() or
+# posix_fadvise() can't be used with, such as a pipe, or that the platform doesn't support them.
+_UNSUPPORTED_ERRNOS = frozenset([errno.ENOSYS, errno.EINVAL, errno.ESPIPE])
+
+
+class _WritebackFileIO(io.RawIOBase):
+    """Raw file object that wraps the FileIO instance returned by winnan.io_shim.open() and
+    manages the writeback of each 'window_size' window written through it.
+    """
+
+    def __init__(self, raw, window_size):
+        super(_WritebackFileIO, self).__init__()
+        self._raw = raw
+        self.window_size = window_size
+        self.windows_written = 0
+
+        self._use_sync_file_range = True
+        self._use_fadvise = True
+        self._enabled = raw.seekable()
+        self._offset = raw.tell() if self._enabled else 0
+
+        # The offset where the window currently being written starts, and the offset up to which
+        # the data is known to have been written back and dropped from the page cache.
+        self._window_start = self._offset
+        self._clean_end = self._offset
+
+    @property
+    def name(self):  # pylint: disable=missing-docstring
+        return self._raw.name
+
+    @property
+    def mode(self):  # pylint: disable=missing-docstring
+        return self._raw.mode
+
+    def fileno(self):
+        return self._raw.fileno()
+
+    def isatty(self):
+        return self._raw.isatty()
+
+    def readable(self):
+        return False
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return self._raw.seekable()
+
+    def tell(self):
+        return self._raw.tell()
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        pos = self._raw.seek(pos, whence)
+        if self._enabled:
+            # Whatever was written before the seek is left for the kernel to write back normally.
+            self._offset = self._window_start = self._clean_end = pos
+        return pos
+
+    def truncate(self, size=None):
+        return self._raw.truncate(size)
+
+    def write(self, data):
+        written = self._raw.write(data)
+        if self._enabled and written:
+            self._offset += written
+            while self._offset - self._window_start >= self.window_size:
+                self._complete_window(self._window_start)
+                self._window_start += self.window_size
+
+        return written
+
+    def _complete_window(self, start):
+        """Starts the writeback of the window at 'start' and drops the window before it from the
+        page cache once its writeback finishes.
+        """
+        fd = self._raw.fileno()  # pylint: disable=invalid-name
+        previous = start - self.window_size
+        self.windows_written += 1
+
+        if self._use_sync_file_range:
+            try:
+                _syscalls.sync_file_range(fd, start, self.window_size,
+                                          _syscalls.SYNC_FILE_RANGE_WRITE)
+                if previous >= self._clean_end:
+                    _syscalls.sync_file_range(fd, previous, self.window_size, _WAIT_AND_WRITE)
+            except OSError as err:
+                if err.errno not in _UNSUPPORTED_ERRNOS:
+                    raise
+                self._use_sync_file_range = False
+
+        if not self._use_sync_file_range:
+            # Without sync_file_range() we can't wait for only part of the file to be written back.
+            # Flushing the whole file each window still bounds the amount of dirty memory.
+            getattr(os, "fdatasync", os.fsync)(fd)
+            previous = start
+
+        if previous >= self._clean_end and self._use_fadvise:
+            try:
+                _syscalls.posix_fadvise(fd, previous, self.window_size,
+                                        _syscalls.POSIX_FADV_DONTNEED)
+            except OSError as err:
+                if err.errno not in _UNSUPPORTED_ERRNOS:
+                    raise
+                self._use_fadvise = False
+
+            self._clean_end = previous + self.window_size
+
+    def close(self):
+        if self.closed:
+            return
+
+        try:
+            super(_WritebackFileIO, self).close()
+        finally:
+            self._raw.close()
+
+
+class StreamingWriter(io.BufferedWriter):
+    """Buffered binary writer opened with winnan.open() that bounds the amount of dirty page cache
+    by writing back and dropping each completed 'window_size' window of the file.
+
+    The 'mode' must be one of "wb", "ab", or "xb". The remaining arguments are passed through to
+    winnan.open(). Data written out of order using seek() isn't counted towards a window.
+    """
+
+    # pylint: disable=redefined-builtin,too-many-arguments
+    def __init__(self, file, mode="wb", buffering=-1, window_size=DEFAULT_WINDOW_SIZE, opener=None,
+                 share_flags=None, close_async=False):
+        if mode not in ("wb", "ab", "xb"):
+            raise ValueError("invalid mode for StreamingWriter: %r" % (mode, ))
+
+        if window_size <= 0:
+            raise ValueError("invalid window_size: %r" % (window_size, ))
+
+        raw = winnan.io_shim.open(file, mode, buffering=0, opener=opener, share_flags=share_flags,
+                                  close_async=close_async)
+        try:
+            writeback = _WritebackFileIO(raw, window_size)
+            if buffering < 0:
+                buffering = io.DEFAULT_BUFFER_SIZE
+                try:
+                    blksize = os.fstat(raw.fileno()).st_blksize
+                except OSError:
+                    pass
+                else:
+                    if blksize > 1:
+                        buffering = blksize
+
+            super(StreamingWriter, self).__init__(writeback, buffering or 1)
+        except:  # pylint: disable=bare-except
+            raw.close()
+            raise
+
+    @property
+    def windows_written(self):
+        """The number of windows whose writeback has been started."""
+        return self.raw.windows_written
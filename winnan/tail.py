@@ -0,0 +1,218 @@
+"""Module that provides following a file as it grows, like `tail -F`.
+
+The file is opened through winnan.os_shim.open(), so holding it open doesn't prevent it from being
+renamed or unlinked by a log rotation, even on Windows. When the path starts referring to a
+different file, the remainder of the old file is read before switching to the new one. A file that
+is truncated in place is read again from its beginning.
+
+On Linux, inotify is used to wake up only once the file or its directory changes. Elsewhere, the
+file is polled every 'poll_interval' seconds.
+"""
+
+from __future__ import absolute_import
+
+import os
+import sys
+import time
+
+from winnan import _inotify
+import winnan.flags
+import winnan.os_shim
+
+_READ_FLAGS = os.O_RDONLY | winnan.flags.O_BINARY
+
+_CHUNK_SIZE = 64 * 1024
+
+_FILE_EVENTS = (_inotify.IN_MODIFY | _inotify.IN_ATTRIB | _inotify.IN_MOVE_SELF
+                | _inotify.IN_DELETE_SELF)
+_DIRECTORY_EVENTS = _inotify.IN_CREATE | _inotify.IN_MOVED_TO | _inotify.IN_ONLYDIR
+
+
+def _identity(stat_info):
+    """Returns the (device, inode) pair identifying the file described by 'stat_info'."""
+    return (stat_info.st_dev, stat_info.st_ino)
+
+
+class _Follower(object):
+    """Tracks the file currently referred to by 'path' and waits for it to change."""
+
+    def __init__(self, path, poll_interval, use_inotify):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.fd = None  # pylint: disable=invalid-name
+        self.identity = None
+
+        self._inotify = None
+        self._file_wd = None
+        self._directory_wd = None
+
+        if use_inotify:
+            self._inotify = _inotify.Inotify()
+            try:
+                self._directory_wd = self._inotify.add_watch(
+                    os.path.dirname(os.path.abspath(path)), _DIRECTORY_EVENTS)
+            except OSError:
+                # Without a watch on the directory we'd never notice the file being created again.
+                self._inotify.close()
+                self._inotify = None
+
+        self.reopen()
+
+    def reopen(self):
+        """Switches to the file currently referred to by the path. Returns False and keeps the
+        current file if the path doesn't exist.
+        """
+        try:
+            fd = winnan.os_shim.open(self.path, _READ_FLAGS)  # pylint: disable=invalid-name
+        except EnvironmentError as err:
+            if winnan.os_shim.is_missing_error(err):
+                return False
+            raise
+
+        if self.fd is not None:
+            winnan.os_shim.close(self.fd)
+
+        self.fd = fd
+        self.identity = _identity(os.fstat(fd))
+
+        if self._inotify is not None:
+            if self._file_wd is not None:
+                self._inotify.rm_watch(self._file_wd)
+            try:
+                self._file_wd = self._inotify.add_watch(self.path, _FILE_EVENTS)
+            except OSError:
+                # The file was already replaced again, which the directory watch reports.
+                self._file_wd = None
+
+        return True
+
+    def read(self):
+        """Returns the data appended to the current file since the last call."""
+        if self.fd is None:
+            return b""
+
+        chunks = []
+        while True:
+            chunk = os.read(self.fd, _CHUNK_SIZE)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+    def was_truncated(self):
+        """Returns True if the current file is now smaller than the offset we've read up to."""
+        if self.fd is None:
+            return False
+        return os.fstat(self.fd).st_size < os.lseek(self.fd, 0, os.SEEK_CUR)
+
+    def was_replaced(self):
+        """Returns True if the path refers to a file other than the one being read."""
+        try:
+            stat_info = os.stat(self.path)
+        except OSError:
+            # The file was renamed or unlinked and nothing has taken its place yet.
+            return False
+
+        return self.fd is None or _identity(stat_info) != self.identity
+
+    def wait(self, timeout):
+        """Waits up to 'timeout' seconds, or indefinitely if None, for the file to change."""
+        if self._inotify is None:
+            time.sleep(self.poll_interval if timeout is None else min(self.poll_interval, timeout))
+            return
+
+        deadline = None if timeout is None else time.time() + timeout
+        name = os.path.basename(self.path)
+
+        while True:
+            remaining = None if deadline is None else max(0, deadline - time.time())
+            for event in self._inotify.read_events(timeout=remaining):
+                if (event.wd != self._directory_wd or event.name == name
+                        or event.mask & _inotify.IN_Q_OVERFLOW):
+                    return
+
+            if remaining is not None and remaining <= 0:
+                return
+
+    def close(self):
+        """Closes the current file and the inotify instance, if any."""
+        if self.fd is not None:
+            winnan.os_shim.close(self.fd)
+            self.fd = None
+
+        if self._inotify is not None:
+            self._inotify.close()
+
+
+# pylint: disable=too-many-branches
+def follow(path, start_at_end=False, poll_interval=1.0, use_inotify=None, idle_timeout=None):
+    """Yields the lines of 'path' as bytes, including their newline, waiting for more lines to be
+    appended once the end of the file is reached.
+
+    If 'start_at_end' is True, only the lines appended after follow() is first called are yielded.
+    If the file doesn't exist yet, follow() waits for it to be created. Following stops once no
+    data has arrived for 'idle_timeout' seconds, or when the generator is closed. An incomplete last
+    line is yielded once the file is replaced or, without a newline, when 'idle_timeout' expires.
+
+    Using inotify, where supported, can be disabled with use_inotify=False, e.g. for network file
+    systems that don't deliver inotify events for changes made by other hosts.
+    """
+    if sys.version_info >= (3, 6):
+        path = os.fspath(path)  # pylint: disable=no-member
+
+    if use_inotify is None:
+        use_inotify = _inotify.is_supported()
+
+    follower = _Follower(path, poll_interval, use_inotify)
+    try:
+        if start_at_end and follower.fd is not None:
+            os.lseek(follower.fd, 0, os.SEEK_END)
+
+        pending = b""
+        last_data_at = time.time()
+
+        while True:
+            data = follower.read()
+
+            replaced = follower.was_replaced()
+            if replaced:
+                # The old file won't grow anymore once it was rotated away, so what's left of it is
+                # read before switching.
+                data += follower.read()
+            elif not data and follower.was_truncated():
+                os.lseek(follower.fd, 0, os.SEEK_SET)
+                pending = b""
+                continue
+
+            if data:
+                last_data_at = time.time()
+                buf = pending + data
+                start = 0
+                while True:
+                    end = buf.find(b"\n", start)
+                    if end < 0:
+                        break
+                    yield buf[start:end + 1]
+                    start = end + 1
+                pending = buf[start:]
+
+            if replaced:
+                if pending:
+                    yield pending
+                    pending = b""
+                if follower.reopen():
+                    continue
+
+            if data:
+                continue
+
+            timeout = None
+            if idle_timeout is not None:
+                timeout = idle_timeout - (time.time() - last_data_at)
+                if timeout <= 0:
+                    if pending:
+                        yield pending
+                    return
+
+            follower.wait(timeout)
+    finally:
+        follower.close()
@@ -0,0 +1,272 @@
+"""Replacements for classes in the tempfile module that spill to anonymous winnan files."""
+
+from __future__ import absolute_import
+
+import binascii
+import errno
+import io
+import os
+import tempfile
+import threading
+
+import winnan.flags
+import winnan.io_shim
+import winnan.os_shim
+
+# O_TMPFILE may be rejected by filesystems that don't support it, in which case we fall back to
+# creating a named file and immediately unlinking it.
+_TMPFILE_UNSUPPORTED_ERRNOS = frozenset(
+    getattr(errno, name) for name in ("EINVAL", "EISDIR", "ENOTSUP", "EOPNOTSUPP")
+    if hasattr(errno, name))
+
+
+class _MemoryBudget(object):
+    """Process-wide limit on the number of bytes held in memory by all SpooledTemporaryFile
+    instances.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.limit = None
+        self.used = 0
+
+    def reserve(self, nbytes):
+        """Attempts to account for 'nbytes' more bytes and returns True if they fit the budget."""
+        with self._lock:
+            if self.limit is not None and self.used + nbytes > self.limit:
+                return False
+
+            self.used += nbytes
+            return True
+
+    def release(self, nbytes):
+        """Returns 'nbytes' bytes previously reserved to the budget."""
+        with self._lock:
+            self.used -= nbytes
+
+
+_BUDGET = _MemoryBudget()
+
+
+def set_memory_budget(limit):
+    """Limits the total number of bytes held in memory by all SpooledTemporaryFile instances.
+
+    A file whose growth would exceed the budget is rolled over to disk early. Specifying None
+    removes the limit.
+    """
+    if limit is not None and limit < 0:
+        raise ValueError("invalid memory budget: %r" % (limit, ))
+
+    _BUDGET.limit = limit
+
+
+def memory_in_use():
+    """Returns the number of bytes currently held in memory by all SpooledTemporaryFile
+    instances.
+    """
+    return _BUDGET.used
+
+
+def _open_anonymous(dir, prefix, suffix):  # pylint: disable=redefined-builtin
+    """Returns a read-write file descriptor for a file that no longer has a directory entry."""
+    if dir is None:
+        dir = tempfile.gettempdir()
+
+    flags = os.O_RDWR | winnan.flags.O_BINARY
+
+    if hasattr(os, "O_TMPFILE"):
+        try:
+            return winnan.os_shim.open(dir, flags | os.O_TMPFILE, 0o600)  # pylint: disable=no-member
+        except OSError as err:
+            if err.errno not in _TMPFILE_UNSUPPORTED_ERRNOS:
+                raise
+
+    # O_TEMPORARY marks the file as delete-on-close on Windows. We unlink the file immediately
+    # regardless because winnan.os_shim.open() permits doing so while it is still open.
+    flags |= os.O_CREAT | os.O_EXCL | getattr(os, "O_TEMPORARY", 0)
+
+    for _ in range(tempfile.TMP_MAX):
+        name = os.path.join(dir, prefix + binascii.hexlify(os.urandom(8)).decode() + suffix)
+
+        try:
+            fd = winnan.os_shim.open(name, flags, 0o600)  # pylint: disable=invalid-name
+        except OSError as err:
+            if err.errno == errno.EEXIST:
+                continue
+            raise
+
+        os.unlink(name)
+        return fd
+
+    raise OSError(errno.EEXIST, "No usable temporary file name found")
+
+
+def _write_all(fd, data):  # pylint: disable=invalid-name
+    """Writes all of 'data' to 'fd', retrying after partial writes."""
+    view = memoryview(data)
+    written = 0
+
+    while written < len(view):
+        written += os.write(fd, view[written:])
+
+
+class SpooledTemporaryFile(object):  # pylint: disable=too-many-instance-attributes
+    """Replacement for tempfile.SpooledTemporaryFile that spills to an anonymous winnan file.
+
+    Data is held in memory until it exceeds 'max_size' bytes or the process-wide budget set with
+    set_memory_budget(), at which point it is written out in a single call to a file opened through
+    winnan.os_shim.open() with O_TMPFILE, or to a file that is unlinked as soon as it is created
+    where O_TMPFILE is unsupported.
+    """
+
+    # pylint: disable=too-many-arguments,redefined-builtin
+    def __init__(self, max_size=0, mode="w+b", buffering=-1, encoding=None, newline=None,
+                 suffix=None, prefix=None, dir=None, errors=None):
+        self._bytes = io.BytesIO()
+
+        if "b" in mode:
+            self._file = self._bytes
+        else:
+            self._file = io.TextIOWrapper(self._bytes, encoding=encoding, errors=errors,
+                                          newline=newline)
+
+        self._max_size = max_size
+        self._rolled = False
+        self._reserved = 0
+        self._args = dict(mode=mode, buffering=buffering, encoding=encoding, newline=newline,
+                          errors=errors)
+        self._tmp_args = dict(suffix=suffix or "", prefix=prefix or tempfile.gettempprefix(),
+                              dir=dir)
+
+    def _check(self):
+        """Rolls the file over to disk if it has grown beyond 'max_size' or the memory budget."""
+        if self._rolled:
+            return
+
+        size = self._file.tell()
+        if self._max_size and size > self._max_size:
+            self.rollover()
+        elif size > self._reserved:
+            if _BUDGET.reserve(size - self._reserved):
+                self._reserved = size
+            else:
+                self.rollover()
+
+    def _release(self):
+        """Returns the memory reserved by this file to the process-wide budget."""
+        if self._reserved:
+            _BUDGET.release(self._reserved)
+            self._reserved = 0
+
+    def rollover(self):
+        """Moves the contents of the file from memory to an anonymous file on disk."""
+        if self._rolled:
+            return
+
+        fd = _open_anonymous(**self._tmp_args)  # pylint: disable=invalid-name
+        newfile = None
+
+        try:
+            self._file.flush()
+            pos = self._file.tell()
+
+            if hasattr(self._bytes, "getbuffer"):
+                view = self._bytes.getbuffer()
+                try:
+                    _write_all(fd, view)
+                finally:
+                    view.release()
+            else:
+                _write_all(fd, self._bytes.getvalue())
+
+            newfile = winnan.io_shim.open(fd, **self._args)
+        finally:
+            if newfile is None:
+                winnan.os_shim.close(fd)
+
+        newfile.seek(pos, 0)
+
+        self._file = newfile
+        self._bytes = None
+        self._rolled = True
+        self._release()
+
+    @property
+    def closed(self):  # pylint: disable=missing-docstring
+        return self._file.closed
+
+    @property
+    def encoding(self):  # pylint: disable=missing-docstring
+        return self._args["encoding"] if "b" not in self._args["mode"] else None
+
+    @property
+    def mode(self):  # pylint: disable=missing-docstring
+        return self._args["mode"]
+
+    @property
+    def name(self):  # pylint: disable=missing-docstring
+        return self._file.name if self._rolled else None
+
+    def close(self):  # pylint: disable=missing-docstring
+        self._file.close()
+        self._release()
+
+    def fileno(self):  # pylint: disable=missing-docstring
+        self.rollover()
+        return self._file.fileno()
+
+    def flush(self):  # pylint: disable=missing-docstring
+        self._file.flush()
+
+    def isatty(self):  # pylint: disable=missing-docstring
+        return self._file.isatty()
+
+    def read(self, *args):  # pylint: disable=missing-docstring
+        return self._file.read(*args)
+
+    def readline(self, *args):  # pylint: disable=missing-docstring
+        return self._file.readline(*args)
+
+    def readlines(self, *args):  # pylint: disable=missing-docstring
+        return self._file.readlines(*args)
+
+    def seek(self, *args):  # pylint: disable=missing-docstring
+        return self._file.seek(*args)
+
+    def tell(self):  # pylint: disable=missing-docstring
+        return self._file.tell()
+
+    def truncate(self, size=None):  # pylint: disable=missing-docstring
+        if size is None:
+            return self._file.truncate()
+
+        if self._max_size and size > self._max_size:
+            self.rollover()
+
+        return self._file.truncate(size)
+
+    def write(self, data):  # pylint: disable=missing-docstring
+        result = self._file.write(data)
+        self._check()
+        return result
+
+    def writelines(self, lines):  # pylint: disable=missing-docstring
+        result = self._file.writelines(lines)
+        self._check()
+        return result
+
+    def __enter__(self):
+        if self._file.closed:
+            raise ValueError("Cannot enter context with closed file")
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __iter__(self):
+        return self._file.__iter__()
+
+    def __del__(self):
+        # The memory reservation must be returned even if the file was never explicitly closed.
+        if getattr(self, "_reserved", 0):
+            self._release()
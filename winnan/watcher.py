@@ -0,0 +1,347 @@
+"""Module that provides batched notifications for changes to files and directories.
+
+A Watcher reports the files that were created, modified, or deleted as batches of Event tuples.
+Repeated events for the same path are coalesced, and a batch is only returned once no new event has
+arrived for 'debounce' seconds, so a file being written in many small pieces is reported once.
+
+On Linux, inotify watches are placed on directories rather than on individual files, which keeps
+the number of watches proportional to the number of distinct directories. Elsewhere, the paths are
+compared against their previous os.stat() results every 'poll_interval' seconds. The same polling is
+used for the paths inotify can't watch, e.g. because their directory doesn't exist yet or the limit
+on the number of inotify watches was reached.
+
+At most 'max_pending' distinct paths are held between batches. If more paths change than that, or
+the kernel's inotify queue overflows, the pending events are discarded and a single OVERFLOW event
+is reported instead, after which the caller should rescan the paths it cares about.
+"""
+
+from __future__ import absolute_import
+
+import collections
+import os
+import stat
+import time
+
+from winnan import _inotify
+from winnan import _util
+
+CREATED = "created"
+MODIFIED = "modified"
+DELETED = "deleted"
+OVERFLOW = "overflow"
+
+Event = collections.namedtuple("Event", ["path", "kind"])
+
+_EVENTS = (_inotify.IN_CREATE | _inotify.IN_MOVED_TO | _inotify.IN_MODIFY | _inotify.IN_CLOSE_WRITE
+           | _inotify.IN_ATTRIB | _inotify.IN_DELETE | _inotify.IN_MOVED_FROM
+           | _inotify.IN_DELETE_SELF | _inotify.IN_MOVE_SELF | _inotify.IN_ONLYDIR)
+
+# How two events for the same path combine into one. Keys are (previous kind, new kind) and a value
+# of None means the path is dropped from the batch, e.g. a file created and deleted again.
+_COALESCE = {
+    (CREATED, MODIFIED): CREATED,
+    (CREATED, DELETED): None,
+    (DELETED, CREATED): MODIFIED,
+    (MODIFIED, CREATED): MODIFIED,
+}
+
+
+def _signature(stat_info):
+    """Returns the parts of 'stat_info' that change when a file is modified or replaced."""
+    mtime = getattr(stat_info, "st_mtime_ns", None)
+    if mtime is None:
+        # The st_mtime_ns attribute was added in Python 3.3.
+        mtime = stat_info.st_mtime
+    return (mtime, stat_info.st_size, stat_info.st_ino)
+
+
+class _InotifyBackend(object):
+    """Reports changes using inotify watches on the directories containing the paths, and falls back
+    to a _StatBackend for the paths that can't be watched.
+    """
+
+    def __init__(self, paths, poll_interval):
+        self._inotify = _inotify.Inotify()
+        # Maps each watch descriptor to (directory, names), where 'names' is the set of names within
+        # the directory being watched, or None if every name is.
+        self._watches = {}
+        self._directories = {}
+        self._fallback = None
+
+        unwatched = []
+        try:
+            for path in paths:
+                try:
+                    if os.path.isdir(path):
+                        self._watch(path, None)
+                    else:
+                        (directory, name) = os.path.split(path)
+                        self._watch(directory or os.curdir, name)
+                except OSError:
+                    # The _StatBackend tolerates missing paths, and doesn't need a watch per
+                    # directory when the limit (ENOSPC) was reached.
+                    unwatched.append(path)
+
+            if unwatched:
+                self._fallback = _StatBackend(unwatched, poll_interval)
+        except:  # pylint: disable=bare-except
+            self._inotify.close()
+            raise
+
+    def _watch(self, directory, name):
+        """Watches 'name' within 'directory', or all of its contents if 'name' is None."""
+        directory = os.path.abspath(directory)
+        wd = self._directories.get(directory)  # pylint: disable=invalid-name
+        if wd is None:
+            wd = self._inotify.add_watch(directory, _EVENTS)  # pylint: disable=invalid-name
+            self._directories[directory] = wd
+            self._watches[wd] = (directory, set())
+
+        names = self._watches[wd][1]
+        if name is None:
+            self._watches[wd] = (directory, None)
+        elif names is not None:
+            names.add(name)
+
+    def poll(self, timeout):
+        """Returns the (path, kind) changes observed within 'timeout' seconds."""
+        if self._fallback is None:
+            return self._read(timeout)
+
+        delay = self._fallback.time_until_scan()
+        changes = self._read(delay if timeout is None else min(timeout, delay))
+        changes.extend(self._fallback.poll(0))
+        return changes
+
+    def _read(self, timeout):
+        """Returns the (path, kind) changes reported by inotify within 'timeout' seconds."""
+        changes = []
+        for event in self._inotify.read_events(timeout=timeout):
+            if event.mask & _inotify.IN_Q_OVERFLOW:
+                changes.append((None, OVERFLOW))
+                continue
+
+            watch = self._watches.get(event.wd)
+            if watch is None:
+                continue
+
+            (directory, names) = watch
+            if event.mask & (_inotify.IN_DELETE_SELF | _inotify.IN_MOVE_SELF):
+                changes.append((directory, DELETED))
+                continue
+
+            if not event.name or (names is not None and event.name not in names):
+                continue
+
+            path = os.path.join(directory, event.name)
+            if event.mask & (_inotify.IN_CREATE | _inotify.IN_MOVED_TO):
+                changes.append((path, CREATED))
+            elif event.mask & (_inotify.IN_DELETE | _inotify.IN_MOVED_FROM):
+                changes.append((path, DELETED))
+            else:
+                changes.append((path, MODIFIED))
+
+        return changes
+
+    def close(self):  # pylint: disable=missing-docstring
+        self._inotify.close()
+        if self._fallback is not None:
+            self._fallback.close()
+
+
+class _StatBackend(object):
+    """Reports changes by comparing os.stat() results every 'poll_interval' seconds."""
+
+    def __init__(self, paths, poll_interval):
+        self.poll_interval = poll_interval
+        self._files = []
+        self._directories = []
+        for path in paths:
+            path = os.path.abspath(path)
+            (self._directories if os.path.isdir(path) else self._files).append(path)
+
+        self._signatures = self._scan()
+        self._next_scan = time.time() + poll_interval
+
+    def _scan(self):
+        """Returns a dict mapping each watched path that exists to its signature."""
+        signatures = {}
+        for path in self._files:
+            try:
+                signatures[path] = _signature(os.stat(path))
+            except OSError:
+                pass
+
+        for directory in self._directories:
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                continue
+
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    stat_info = os.lstat(path)
+                except OSError:
+                    continue
+                # The contents of subdirectories aren't watched, only the directory entries.
+                signatures[path] = (None if stat.S_ISDIR(stat_info.st_mode)
+                                    else _signature(stat_info))
+
+        return signatures
+
+    def time_until_scan(self):
+        """Returns the number of seconds until the paths are compared again."""
+        return max(0, self._next_scan - time.time())
+
+    def poll(self, timeout):
+        """Returns the (path, kind) changes observed within 'timeout' seconds."""
+        delay = self.time_until_scan()
+        if timeout is not None and timeout < delay:
+            time.sleep(timeout)
+            return []
+
+        time.sleep(delay)
+        self._next_scan = time.time() + self.poll_interval
+
+        previous = self._signatures
+        self._signatures = current = self._scan()
+
+        changes = []
+        for (path, signature) in current.items():
+            old = previous.pop(path, False)
+            if old is False:
+                changes.append((path, CREATED))
+            elif old != signature:
+                changes.append((path, MODIFIED))
+
+        changes.extend((path, DELETED) for path in previous)
+        return changes
+
+    def close(self):  # pylint: disable=missing-docstring
+        self._signatures = {}
+
+
+class Watcher(object):  # pylint: disable=too-many-instance-attributes
+    """Reports changes to the files in 'paths', and to the entries of the directories in 'paths',
+    as batches of Event tuples. Iterating over a Watcher yields batches until it is closed.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, paths, debounce=0.05, max_latency=1.0, max_pending=10000, use_inotify=None,
+                 poll_interval=1.0):
+        if isinstance(paths, (str, bytes, type(u""))) or hasattr(paths, "__fspath__"):
+            paths = [paths]
+        paths = [_util.fspath(path) for path in paths]
+
+        if use_inotify is None:
+            use_inotify = _inotify.is_supported()
+
+        self.debounce = debounce
+        self.max_latency = max_latency
+        self.max_pending = max_pending
+
+        self._pending = collections.OrderedDict()
+        self._overflowed = False
+        self._first_event_at = None
+        self._last_event_at = None
+        self._closed = False
+
+        if use_inotify:
+            self._backend = _InotifyBackend(paths, poll_interval)
+        else:
+            self._backend = _StatBackend(paths, poll_interval)
+
+    def _add(self, path, kind):
+        """Coalesces the change to 'path' into the pending batch."""
+        now = time.time()
+        if self._first_event_at is None:
+            self._first_event_at = now
+        self._last_event_at = now
+
+        if self._overflowed:
+            return
+
+        if kind == OVERFLOW or (path not in self._pending
+                                and len(self._pending) >= self.max_pending):
+            self._pending.clear()
+            self._overflowed = True
+            return
+
+        previous = self._pending.pop(path, None)
+        if previous is not None:
+            kind = _COALESCE.get((previous, kind), previous if kind == MODIFIED else kind)
+            if kind is None:
+                return
+
+        self._pending[path] = kind
+
+    def _take(self):
+        """Returns the pending batch and starts a new one."""
+        if self._overflowed:
+            batch = [Event(None, OVERFLOW)]
+        else:
+            batch = [Event(path, kind) for (path, kind) in self._pending.items()]
+
+        self._pending.clear()
+        self._overflowed = False
+        self._first_event_at = None
+        self._last_event_at = None
+        return batch
+
+    def read(self, timeout=None):
+        """Returns the next batch of events, waiting up to 'timeout' seconds or indefinitely if None.
+        Returns an empty list if the timeout elapsed first.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+
+        while not self._closed:
+            now = time.time()
+            if self._first_event_at is not None:
+                ready_at = min(self._last_event_at + self.debounce,
+                               self._first_event_at + self.max_latency)
+                if now >= ready_at:
+                    batch = self._take()
+                    if batch:
+                        return batch
+                    # Every change cancelled out, e.g. a temporary file created and deleted again.
+                    continue
+
+                # Once the first event arrived, the batch is returned after the debounce period even
+                # if that is past the deadline.
+                wait = ready_at - now
+            elif deadline is not None:
+                wait = max(0, deadline - now)
+            else:
+                wait = None
+
+            for (path, kind) in self._backend.poll(wait):
+                self._add(path, kind)
+
+            if deadline is not None and time.time() >= deadline and self._first_event_at is None:
+                break
+
+        return []
+
+    def __iter__(self):
+        while not self._closed:
+            batch = self.read()
+            if batch:
+                yield batch
+
+    def close(self):
+        """Stops watching and releases the inotify instance, if any."""
+        if not self._closed:
+            self._closed = True
+            self._backend.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def watch(paths, **kwargs):
+    """Returns a Watcher reporting changes to 'paths'. See Watcher for the keyword arguments."""
+    return Watcher(paths, **kwargs)
@@ -0,0 +1,232 @@
+"""Module that provides copying data from a file to a socket or pipe without a userspace copy.
+
+On Linux, transfer() uses sendfile() when the destination is a socket and splice() when it is a
+pipe, so the data goes from the page cache to the destination without passing through a Python
+bytes object. Other destinations, and platforms without those system calls, fall back to copying
+through a reusable buffer.
+"""
+
+from __future__ import absolute_import
+
+import errno
+import io
+import os
+import select
+import stat
+import sys
+
+from winnan import _syscalls
+import winnan.bufferpool
+import winnan.flags
+import winnan.os_shim
+
+try:
+    long
+except NameError:
+    integer_types = (int, )  # pylint: disable=invalid-name
+else:
+    integer_types = (int, long)  # pylint: disable=invalid-name
+
+# The most data sendfile() and splice() are asked to transfer per call, which keeps each call short
+# enough to notice a non-blocking destination filling up.
+_MAX_CHUNK_SIZE = 8 * 1024 * 1024
+
+_BUFFER_SIZE = 256 * 1024
+
+# The errors indicating sendfile() or splice() can't be used with this pair of file descriptors, in
+# which case we fall back to copying through a buffer.
+_UNSUPPORTED_ERRNOS = frozenset(
+    getattr(errno, name) for name in ("ENOSYS", "EINVAL", "ENOTSUP", "EOPNOTSUPP", "EXDEV")
+    if hasattr(errno, name))
+
+_BLOCKING_ERRNOS = frozenset([errno.EAGAIN, errno.EWOULDBLOCK])
+
+
+def _fileno(fileobj):
+    """Returns the file descriptor for 'fileobj', which may be an integer or have a fileno()."""
+    if isinstance(fileobj, integer_types):
+        return fileobj
+    return fileobj.fileno()
+
+
+def _wait_writable(fd, timeout):  # pylint: disable=invalid-name
+    """Waits up to 'timeout' seconds for 'fd' to become writable and returns True if it did."""
+    if hasattr(select, "poll"):
+        poller = select.poll()
+        poller.register(fd, select.POLLOUT)
+        return bool(poller.poll(None if timeout is None else timeout * 1000))
+
+    (_, writable, _) = select.select([], [fd], [], timeout)
+    return bool(writable)
+
+
+def _pread_into(fd, view, offset):  # pylint: disable=invalid-name
+    """Reads from 'fd' at 'offset' into 'view' without changing the position of 'fd', and returns
+    the number of bytes read.
+    """
+    if _syscalls.has_pread():
+        return _syscalls.pread_into(fd, view, offset)
+
+    # Without pread(), e.g. on Windows, the position is moved and then restored.
+    position = os.lseek(fd, 0, os.SEEK_CUR)
+    try:
+        os.lseek(fd, offset, os.SEEK_SET)
+        with io.FileIO(fd, "r", closefd=False) as raw:
+            return raw.readinto(view)
+    finally:
+        os.lseek(fd, position, os.SEEK_SET)
+
+
+def _write_all(fd, view, timeout):  # pylint: disable=invalid-name
+    """Writes all of 'view' to 'fd', waiting for a non-blocking 'fd' to become writable. Returns the
+    number of bytes written, which is less than len(view) only if 'timeout' seconds elapsed.
+    """
+    written = 0
+    while written < len(view):
+        try:
+            written += os.write(fd, view[written:])
+        except OSError as err:
+            if err.errno not in _BLOCKING_ERRNOS:
+                raise
+            if not _wait_writable(fd, timeout):
+                break
+
+    return written
+
+
+class _Transfer(object):  # pylint: disable=too-few-public-methods
+    """State of a single transfer() call."""
+
+    def __init__(self, src_fd, dest_fd, offset, count, timeout):  # pylint: disable=too-many-arguments
+        self.src_fd = src_fd
+        self.dest_fd = dest_fd
+        self.offset = offset
+        self.remaining = count
+        self.timeout = timeout
+        self.sent = 0
+
+    def _advance(self, nbytes):
+        """Records that 'nbytes' more bytes were transferred."""
+        self.sent += nbytes
+        self.offset += nbytes
+        if self.remaining is not None:
+            self.remaining -= nbytes
+
+    def _chunk_size(self, limit):
+        """Returns how many bytes to ask for in the next call."""
+        return limit if self.remaining is None else min(limit, self.remaining)
+
+    def run_syscall(self, func):
+        """Transfers using 'func', which is sendfile() or splice(). Returns False if 'func' can't be
+        used with these file descriptors and nothing was transferred by it yet.
+        """
+        while self.remaining is None or self.remaining > 0:
+            try:
+                nbytes = func(self._chunk_size(_MAX_CHUNK_SIZE))
+            except OSError as err:
+                if err.errno in _BLOCKING_ERRNOS:
+                    if not _wait_writable(self.dest_fd, self.timeout):
+                        return True
+                    continue
+                if err.errno in _UNSUPPORTED_ERRNOS and not self.sent:
+                    return False
+                raise
+
+            if not nbytes:
+                break
+
+            self._advance(nbytes)
+
+        return True
+
+    def run_sendfile(self):  # pylint: disable=missing-docstring
+        return self.run_syscall(
+            lambda size: _syscalls.sendfile(self.dest_fd, self.src_fd, self.offset, size))
+
+    def run_splice(self):  # pylint: disable=missing-docstring
+        return self.run_syscall(
+            lambda size: _syscalls.splice(self.src_fd, self.dest_fd, size, offset_src=self.offset))
+
+    def run_buffered(self):
+        """Transfers by reading into a pooled buffer and writing it to the destination."""
+        pool = winnan.bufferpool.default_pool()
+        buf = pool.acquire(_BUFFER_SIZE)
+        pooled = buf is not None
+        if not pooled:
+            # The pool is at its limit, so a small buffer is used for this transfer only.
+            buf = bytearray(io.DEFAULT_BUFFER_SIZE)
+
+        try:
+            view = memoryview(buf)
+            while self.remaining is None or self.remaining > 0:
+                nread = _pread_into(self.src_fd, view[:self._chunk_size(len(view))], self.offset)
+                if not nread:
+                    break
+
+                written = _write_all(self.dest_fd, view[:nread], self.timeout)
+                self._advance(written)
+                if written < nread:
+                    break
+        finally:
+            if pooled:
+                pool.release(buf)
+
+
+# pylint: disable=too-many-arguments
+def transfer(src, dest, offset=None, count=None, timeout=None):
+    """Copies 'count' bytes starting at 'offset' from 'src' to 'dest' and returns the number of
+    bytes copied. The whole remainder of 'src' is copied if 'count' is None.
+
+    The 'src' may be a path, which is opened through winnan.os_shim.open(), a file descriptor, or a
+    file object returned by winnan.open(). When 'src' is a file object, 'offset' defaults to its
+    current position and, like socket.sendfile(), its position is advanced by the number of bytes
+    copied. The 'dest' may be a file descriptor or any object with a fileno() method.
+
+    When 'dest' is non-blocking, transfer() waits for it to become writable, for at most 'timeout'
+    seconds each time. If the timeout elapses, fewer than 'count' bytes are copied.
+    """
+    if count is not None and count < 0:
+        raise ValueError("invalid count: %r" % (count, ))
+
+    fileobj = None
+    close_src = False
+
+    if isinstance(src, integer_types):
+        src_fd = src
+    elif hasattr(src, "fileno"):
+        fileobj = src
+        # Anything sitting in the file object's write buffer must reach the file first.
+        fileobj.flush()
+        src_fd = fileobj.fileno()
+        if offset is None:
+            offset = fileobj.tell()
+    else:
+        if sys.version_info >= (3, 6):
+            src = os.fspath(src)  # pylint: disable=no-member
+        src_fd = winnan.os_shim.open(src, os.O_RDONLY | winnan.flags.O_BINARY)
+        close_src = True
+
+    if offset is None:
+        offset = 0
+
+    try:
+        dest_fd = _fileno(dest)
+        state = _Transfer(src_fd, dest_fd, offset, count, timeout)
+
+        dest_mode = os.fstat(dest_fd).st_mode
+        done = False
+        if stat.S_ISSOCK(dest_mode):
+            done = state.run_sendfile()
+        elif stat.S_ISFIFO(dest_mode):
+            done = state.run_splice()
+
+        if not done:
+            state.run_buffered()
+    finally:
+        if close_src:
+            winnan.os_shim.close(src_fd)
+
+    if fileobj is not None:
+        fileobj.seek(state.offset)
+
+    return state.sent